@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from config import Config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Mode keputusan admission control
+MODE_FULL = "full"          # Layanan penuh
+MODE_REDUCED = "reduced"    # LLM dengan max_tokens dikurangi
+MODE_SHED = "shed"          # Tidak memanggil LLM, pakai fallback lokal
+
+
+class Admission:
+    """Decision from AdmissionController.admit(), holding a reserved in-flight slot unless shed"""
+
+    __slots__ = ('controller', 'mode', 'priority', '_reserved')
+
+    def __init__(self, controller: 'AdmissionController', mode: str, reserved: bool, priority: Optional[int] = None):
+        self.controller = controller
+        self.mode = mode
+        self.priority = priority
+        self._reserved = reserved
+
+    def release(self):
+        """Free the reserved slot (idempotent, call from a finally)"""
+        if self._reserved:
+            self._reserved = False
+            self.controller._release()
+
+
+class AdmissionController:
+    """Admission control for LLM calls based on in-flight count and latency"""
+
+    def __init__(self, max_inflight: int = 16, degrade_inflight: int = 8,
+                 shed_latency: float = 20.0, degrade_latency: float = 10.0,
+                 shed_queue_delay: float = 30.0, reduced_token_ratio: float = 0.5,
+                 protected_priority: int = 2, latency_window: float = 60.0):
+        self.max_inflight = max_inflight
+        self.degrade_inflight = degrade_inflight
+        self.shed_latency = shed_latency
+        self.degrade_latency = degrade_latency
+        self.shed_queue_delay = shed_queue_delay
+        self.reduced_token_ratio = reduced_token_ratio
+        self.protected_priority = protected_priority
+        self.latency_window = latency_window
+
+        self.inflight = 0
+        # token -> (waktu mulai, priority); priority None = tanpa admit(), dihitung untuk semua priority
+        self._started = {}
+        self._recent = deque(maxlen=256)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Config = None) -> 'AdmissionController':
+        """Build controller from Config thresholds"""
+        config = config or Config
+        return cls(
+            max_inflight=config.SHED_MAX_INFLIGHT,
+            degrade_inflight=config.SHED_DEGRADE_INFLIGHT,
+            shed_latency=config.SHED_LATENCY_SECONDS,
+            degrade_latency=config.SHED_DEGRADE_LATENCY_SECONDS,
+            shed_queue_delay=config.SHED_QUEUE_DELAY_SECONDS,
+            reduced_token_ratio=config.SHED_REDUCED_TOKEN_RATIO,
+            protected_priority=config.SHED_PROTECTED_PRIORITY
+        )
+
+    def upstream_latency(self, priority: Optional[int] = None) -> float:
+        """Recent p90 latency of LLM calls in seconds, including calls still running.
+
+        Dengan priority, panggilan yang masih berjalan hanya dihitung jika
+        prioritasnya sama atau lebih rendah: satu request VIP/premium yang lambat
+        tidak boleh membuat semua trafik basic di-shed saat upstream sehat.
+        """
+        now = time.monotonic()
+        with self._lock:
+            # Hanya sampel dalam latency_window, supaya shedding tidak "lengket"
+            # setelah upstream pulih
+            values = [latency for ended, latency in self._recent if now - ended <= self.latency_window]
+            oldest = min((started for started, running_priority in self._started.values()
+                          if priority is None or running_priority is None or running_priority >= priority),
+                         default=now)
+        values.sort()
+        if not values:
+            return now - oldest
+        index = min(len(values) - 1, int(0.9 * len(values)))
+        return max(values[index], now - oldest)
+
+    def decide(self, priority: int, queue_delay: float = 0.0, role: Optional[str] = None) -> str:
+        """Decide how to serve a request: full, reduced or shed (no slot reserved, see admit())"""
+        latency = self.upstream_latency(priority)
+        with self._lock:
+            inflight = self.inflight
+        return self._record(self._mode(priority, inflight, latency, queue_delay),
+                            priority, inflight, latency, queue_delay, role)
+
+    def admit(self, priority: int, queue_delay: float = 0.0, role: Optional[str] = None) -> Admission:
+        """Decide and, unless shed, reserve an in-flight slot in one locked step.
+
+        Tanpa reservasi, request paralel (thread gunicorn, worker media, recovery)
+        bisa lolos cek max_inflight bersamaan sebelum slot diambil track().
+        Slot harus dilepas dengan Admission.release() di blok finally.
+        """
+        latency = self.upstream_latency(priority)
+        with self._lock:
+            inflight = self.inflight
+            mode = self._mode(priority, inflight, latency, queue_delay)
+            if mode != MODE_SHED:
+                self.inflight += 1
+                metrics.set_gauge('llm.inflight', self.inflight)
+        self._record(mode, priority, inflight, latency, queue_delay, role)
+        return Admission(self, mode, mode != MODE_SHED, priority)
+
+    def _release(self):
+        with self._lock:
+            self.inflight -= 1
+            metrics.set_gauge('llm.inflight', self.inflight)
+
+    def _mode(self, priority: int, inflight: int, latency: float, queue_delay: float) -> str:
+        # Admin/VIP (priority kecil = lebih tinggi) selalu mendapat layanan penuh
+        if priority <= self.protected_priority:
+            mode = MODE_FULL
+        elif (inflight >= self.max_inflight or latency >= self.shed_latency
+              or queue_delay >= self.shed_queue_delay):
+            mode = MODE_SHED
+        elif inflight >= self.degrade_inflight or latency >= self.degrade_latency:
+            mode = MODE_REDUCED
+        else:
+            mode = MODE_FULL
+        return mode
+
+    def _record(self, mode: str, priority: int, inflight: int, latency: float, queue_delay: float,
+                role: Optional[str]) -> str:
+        metrics.incr(f'admission.{mode}')
+        if role:
+            metrics.incr(f'admission.{role}.{mode}')
+        if mode != MODE_FULL:
+            logger.debug(f"Admission {mode} (priority={priority}, inflight={inflight}, "
+                         f"latency_p90={latency:.2f}s, queue_delay={queue_delay:.2f}s)")
+        return mode
+
+    def reduced_tokens(self, max_tokens: int) -> int:
+        """Get reduced max_tokens for degraded mode"""
+        return max(32, int(max_tokens * self.reduced_token_ratio))
+
+    @contextmanager
+    def track(self, admission: Optional[Admission] = None):
+        """Track one in-flight LLM call and record its latency (slot already counted when admission is given)"""
+        token = object()
+        start = time.monotonic()
+        with self._lock:
+            if admission is None:
+                self.inflight += 1
+            self._started[token] = (start, admission.priority if admission is not None else None)
+            metrics.set_gauge('llm.inflight', self.inflight)
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            metrics.observe('llm.latency', end - start)
+            with self._lock:
+                if admission is None:
+                    self.inflight -= 1
+                del self._started[token]
+                self._recent.append((end, end - start))
+                metrics.set_gauge('llm.inflight', self.inflight)
+
+    def get_state(self) -> dict:
+        """Get current admission state for status endpoints"""
+        return {
+            'inflight': self.inflight,
+            'latency_p90': round(self.upstream_latency(), 3),
+            'max_inflight': self.max_inflight,
+            'degrade_inflight': self.degrade_inflight,
+            'shed_latency': self.shed_latency,
+            'degrade_latency': self.degrade_latency,
+            'shed_queue_delay': self.shed_queue_delay,
+            'protected_priority': self.protected_priority
+        }
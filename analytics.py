@@ -0,0 +1,408 @@
+import os
+import re
+import json
+import gzip
+import hmac
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from config import Config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Pola data pribadi yang dihapus dari isi percakapan sebelum diekspor
+CHAT_ID_RE = re.compile(r'\b\d{5,}(?:-\d+)?@(?:c|g)\.us\b')
+EMAIL_RE = re.compile(r'\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b')
+# Nomor telepon: diawali +kode negara, 0 (lokal) atau 62, dengan total 9-15 digit. Tanggal, jam,
+# nominal dan nomor order biasa tidak cocok dengan bentuk ini
+PHONE_RE = re.compile(r'(?<![\w+])(?:\+\s?\(?\d|\(?0|62)(?:[\s().-]{0,2}\d)+(?![\w:])')
+PHONE_DIGITS = (9, 15)
+
+
+def redact_text(text: Optional[str]) -> Optional[str]:
+    """Replace WhatsApp ids, e-mail addresses and phone numbers"""
+    if not text:
+        return text
+    if '@' in text:
+        text = CHAT_ID_RE.sub('[CHAT]', text)
+        text = EMAIL_RE.sub('[EMAIL]', text)
+    return PHONE_RE.sub(_redact_phone, text)
+
+
+def _redact_phone(match: re.Match) -> str:
+    digits = sum(char.isdigit() for char in match.group())
+    return '[NUMBER]' if PHONE_DIGITS[0] <= digits <= PHONE_DIGITS[1] else match.group()
+
+
+def pseudonymize(chat_id: str, salt: str) -> str:
+    """Stable, non-reversible user key (HMAC-SHA256 of the chat id, 16 hex chars)"""
+    return hmac.new(salt.encode(), chat_id.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+class ChunkedJsonlWriter:
+    """Write records as gzip JSON lines, starting a new file every chunk_rows records.
+
+    Hanya satu chunk terbuka pada satu waktu dan setiap record langsung
+    dikompres ke file, jadi memori tidak bergantung pada jumlah baris.
+    """
+
+    def __init__(self, directory: str, prefix: str, chunk_rows: int = 50000, compresslevel: int = 6):
+        self.directory = directory
+        self.prefix = prefix
+        self.chunk_rows = chunk_rows
+        self.compresslevel = compresslevel
+        self.files: List[Dict] = []
+        self.rows = 0
+        self._file = None
+        self._chunk_rows = 0
+
+    def write(self, record: Dict):
+        if self._file is None or self._chunk_rows >= self.chunk_rows:
+            self._rotate()
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+        self._chunk_rows += 1
+        self.rows += 1
+
+    def write_all(self, records: Iterable[Dict]) -> int:
+        for record in records:
+            self.write(record)
+        return self.rows
+
+    def _rotate(self):
+        self._close_chunk()
+        name = f"{self.prefix}-{len(self.files):05d}.jsonl.gz"
+        self._file = gzip.open(os.path.join(self.directory, name), 'wb', compresslevel=self.compresslevel)
+        self._chunk_rows = 0
+        self.files.append({'name': name, 'rows': 0, 'bytes': 0})
+
+    def _close_chunk(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        chunk = self.files[-1]
+        chunk['rows'] = self._chunk_rows
+        chunk['bytes'] = os.path.getsize(os.path.join(self.directory, chunk['name']))
+
+    def close(self) -> List[Dict]:
+        """Close the open chunk; returns the written files (name, rows, compressed bytes)"""
+        self._close_chunk()
+        return self.files
+
+    def __enter__(self) -> 'ChunkedJsonlWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class UserStats:
+    """Per-user aggregates of one export window (messages, failures, tokens, sources)"""
+
+    __slots__ = ('tenant', 'user', 'role', 'messages', 'failed', 'tokens', 'first_at', 'last_at', 'sources')
+
+    def __init__(self, tenant: str, user: str):
+        self.tenant = tenant
+        self.user = user
+        self.role = None
+        self.messages = 0
+        self.failed = 0
+        self.tokens = 0
+        self.first_at = None
+        self.last_at = None
+        self.sources: Dict[str, int] = {}
+
+    def add(self, turn: Dict):
+        self.role = turn['role'] or self.role
+        self.messages += 1
+        self.failed += turn['state'] == 'failed'
+        self.tokens += turn['tokens'] or 0
+        self.first_at = turn['received_at'] if self.first_at is None else min(self.first_at, turn['received_at'])
+        self.last_at = turn['received_at'] if self.last_at is None else max(self.last_at, turn['received_at'])
+        source = turn['source'] or 'unknown'
+        self.sources[source] = self.sources.get(source, 0) + 1
+
+    def to_record(self, window: Dict) -> Dict:
+        return {
+            'tenant': self.tenant,
+            'user': self.user,
+            'role': self.role,
+            'messages': self.messages,
+            'failed': self.failed,
+            'tokens': self.tokens,
+            'first_at': self.first_at,
+            'last_at': self.last_at,
+            'sources': self.sources,
+            'window_start': window['start'],
+            'window_end': window['end']
+        }
+
+
+class AnalyticsExporter:
+    """Incremental export of finished jobs to chunked, gzip-compressed JSON lines.
+
+    Sumber data adalah job store (satu baris per pesan yang sudah selesai).
+    Export membaca dengan keyset pagination sejak watermark (updated_at, id)
+    export terakhir; setiap batch satu query pendek sehingga penanganan pesan
+    tidak pernah berhenti. Baris mengalir lewat generator ke writer, jadi
+    memori konstan terhadap jumlah baris - kecuali agregat user_stats yang
+    sebanding dengan jumlah user aktif di window tersebut.
+
+    Hasil per export: <directory>/<waktu>-<pid>/ berisi turns-NNNNN.jsonl.gz,
+    user_stats-NNNNN.jsonl.gz dan manifest.json (ditulis terakhir). Direktori
+    di-rename dari .partial setelah lengkap, baru watermark disimpan; export
+    yang gagal di tengah diulang dari watermark lama (id job tetap unik).
+    """
+
+    def __init__(self, job_store, directory: str = 'exports', batch_size: int = 1000, chunk_rows: int = 50000,
+                 settle_seconds: float = 5.0, include_text: bool = True, salt: str = '', interval: float = 0.0):
+        self.job_store = job_store
+        self.directory = directory
+        self.batch_size = batch_size
+        self.chunk_rows = chunk_rows
+        self.settle_seconds = settle_seconds
+        self.include_text = include_text
+        self.interval = interval
+        self._salt = salt
+
+        self.running = False
+        self.last_manifest: Optional[Dict] = None
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, job_store, config: Config = None) -> 'AnalyticsExporter':
+        """Build from Config"""
+        config = config or Config
+        return cls(
+            job_store,
+            directory=config.EXPORT_DIR,
+            batch_size=config.EXPORT_BATCH_SIZE,
+            chunk_rows=config.EXPORT_CHUNK_ROWS,
+            settle_seconds=config.EXPORT_SETTLE_SECONDS,
+            include_text=config.EXPORT_INCLUDE_TEXT,
+            salt=config.EXPORT_SALT,
+            interval=config.EXPORT_INTERVAL_SECONDS
+        )
+
+    # ===== STATE (watermark) =====
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.directory, 'state.json')
+
+    def load_state(self) -> Dict:
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def watermark(self) -> float:
+        """Finish time up to which every job has been exported (0 if never exported)"""
+        try:
+            return float((self.load_state().get('watermark') or (0.0, ''))[0])
+        except (OSError, ValueError):
+            return 0.0
+
+    def _save_state(self, state: Dict):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    # ===== PIPELINE =====
+
+    def turns(self, rows: Iterable[Dict], salt: str) -> Iterator[Dict]:
+        """Map job rows to redacted, pseudonymized conversation turns"""
+        for row in rows:
+            turn = {
+                'job_id': row['id'],
+                'tenant': row['tenant'],
+                'user': pseudonymize(row['chat_id'], salt),
+                'group': row['chat_id'].endswith('@g.us'),
+                'role': row['role'],
+                'source': row['source'],
+                'model': row['model'],
+                'tokens': row['tokens'],
+                'state': row['state'],
+                'attempts': row['attempts'],
+                'received_at': row['created_at'],
+                'finished_at': row['updated_at'],
+                'latency': round(row['updated_at'] - row['created_at'], 3),
+                'message_chars': len(row['message'] or ''),
+                'response_chars': len(row['response'] or '')
+            }
+            if self.include_text:
+                turn['message'] = redact_text(row['message'])
+                turn['response'] = redact_text(row['response'])
+            if row['error']:
+                turn['error'] = row['error'][:200]
+            yield turn
+
+    def run(self) -> Optional[Dict]:
+        """Export everything finished since the last watermark. Returns the manifest (None if another process is exporting)"""
+        os.makedirs(self.directory, exist_ok=True)
+        # Lock file: hanya satu proses (worker gunicorn) yang mengekspor pada satu waktu
+        lock_file = open(os.path.join(self.directory, 'export.lock'), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            logger.info("Analytics export is running in another process")
+            return None
+
+        self.running = True
+        try:
+            manifest = self._export()
+            self.last_manifest = manifest
+            self.last_error = None
+            return manifest
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {str(e)}"
+            metrics.incr('export.errors')
+            raise
+        finally:
+            self.running = False
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _export(self) -> Dict:
+        started = time.monotonic()
+        state = self.load_state()
+        # Salt pseudonim tidak pernah disimpan di EXPORT_DIR (direktori yang dibagikan ke analis):
+        # EXPORT_SALT atau salt acak di job store. Salt lama dari state.json dipindahkan sekali
+        salt = self._salt or self.job_store.secret('export_salt', state.get('salt'))
+        watermark = tuple(state.get('watermark') or (0.0, ''))
+        until = time.time() - self.settle_seconds
+
+        # Sisa export yang gagal di tengah tidak pernah dipakai (watermark belum maju)
+        for name in os.listdir(self.directory):
+            if name.endswith('.partial'):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+        name = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%fZ')}-{os.getpid()}"
+        partial = os.path.join(self.directory, f"{name}.partial")
+        os.makedirs(partial)
+
+        window = {'start': watermark[0], 'end': until}
+        users: Dict[tuple, UserStats] = {}
+        roles: Dict[str, Dict[str, int]] = {}
+        last = watermark
+
+        with ChunkedJsonlWriter(partial, 'turns', self.chunk_rows) as turns_writer:
+            for turn in self.turns(self.job_store.iter_finished(watermark, until, self.batch_size), salt):
+                turns_writer.write(turn)
+                last = (turn['finished_at'], turn['job_id'])
+
+                key = (turn['tenant'], turn['user'])
+                stats = users.get(key)
+                if stats is None:
+                    stats = users[key] = UserStats(*key)
+                stats.add(turn)
+                role = roles.setdefault(turn['role'] or 'unknown', {'messages': 0, 'tokens': 0})
+                role['messages'] += 1
+                role['tokens'] += turn['tokens'] or 0
+
+        with ChunkedJsonlWriter(partial, 'user_stats', self.chunk_rows) as stats_writer:
+            stats_writer.write_all(stats.to_record(window) for stats in users.values())
+
+        elapsed = time.monotonic() - started
+        manifest = {
+            'export': name,
+            'created_at': time.time(),
+            'window': window,
+            'watermark': list(last),
+            'turns': turns_writer.rows,
+            'users': stats_writer.rows,
+            'roles': roles,
+            'tokens': sum(role['tokens'] for role in roles.values()),
+            'include_text': self.include_text,
+            'files': turns_writer.files + stats_writer.files,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(turns_writer.rows / elapsed) if elapsed > 0 else None
+        }
+
+        if turns_writer.rows:
+            with open(os.path.join(partial, 'manifest.json'), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(partial, os.path.join(self.directory, name))
+        else:
+            # Tidak ada data baru - tidak perlu direktori kosong
+            shutil.rmtree(partial, ignore_errors=True)
+            manifest['export'] = None
+
+        self._save_state({'watermark': list(last), 'last_export': manifest['export'],
+                          'last_export_at': manifest['created_at']})
+        metrics.incr('export.runs')
+        metrics.incr('export.rows', turns_writer.rows)
+        metrics.observe('export.duration', elapsed)
+        logger.info(f"Analytics export {manifest['export'] or '(no new rows)'}: {turns_writer.rows} turns, "
+                    f"{stats_writer.rows} users in {elapsed:.1f}s")
+        return manifest
+
+    # ===== BACKGROUND =====
+
+    def start_async(self, on_done: Callable[[Optional[Dict]], object] = None) -> bool:
+        """Run one export in a background thread. Returns False if this process is already exporting"""
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+
+        def run():
+            manifest = None
+            try:
+                manifest = self.run()
+            except Exception as e:
+                logger.error(f"Error exporting analytics: {str(e)}")
+            finally:
+                self.running = False
+            if on_done:
+                on_done(manifest)
+
+        threading.Thread(target=run, name="analytics-export", daemon=True).start()
+        return True
+
+    def start(self):
+        """Start periodic exports (per process, after fork); disabled when interval is 0"""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_periodic, name="analytics-export-loop", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_periodic(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Error exporting analytics: {str(e)}")
+
+    def get_state(self) -> Dict:
+        """Exporter state for status endpoints"""
+        state = self.load_state() if os.path.isdir(self.directory) else {}
+        last = self.last_manifest or {}
+        return {
+            'directory': self.directory,
+            'interval': self.interval,
+            'running': self.running,
+            'watermark': state.get('watermark'),
+            'last_export': state.get('last_export'),
+            'last_export_at': state.get('last_export_at'),
+            'last_turns': last.get('turns'),
+            'last_rows_per_second': last.get('rows_per_second'),
+            'last_error': self.last_error
+        }
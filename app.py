@@ -1,25 +1,55 @@
-from flask import Flask, request, jsonify
-import requests
+import time
+_import_started = time.monotonic()
+
+from flask import Flask, request, jsonify, send_from_directory
 import os
 from dotenv import load_dotenv
-import json
 import logging
-from datetime import datetime
-from bot import WhatsAppBot
+import math
+import uuid
+import hmac
+import threading
+from datetime import datetime, timedelta, timezone
 from config import Config
-
-# Inisialisasi bot
-config = Config()
-bot = WhatsAppBot(config)
+from metrics import metrics
+from timeouts import timeouts
+from admission import AdmissionController, MODE_SHED, MODE_REDUCED
+from router import ModelRouter
+from interim import InterimNotifier
+from profiler import SamplingProfiler
+from prefilter import WebhookPreFilter
+from http_pool import session as http_session
+from tenants import Tenant, TenantRegistry, get_knowledge_base
+from broadcast import BroadcastManager
+from media import MediaSpool, MediaPipeline, MediaTooLarge, media_prompt
+from jobstore import JobStore, STATE_GENERATED
+from lifecycle import DrainController
+from health import HealthMonitor
+from analytics import AnalyticsExporter
+from scheduler import ScheduleStore, Scheduler, parse_reminder
+from tracing import tracer, TraceLogFilter
+from pipeline import MessageContext, FunctionStage, RateLimiter, build_message_pipeline
 
 # Load environment variables
 load_dotenv()
 
+# Setup logging - satu-satunya basicConfig, modul lain hanya memakai getLogger
+# Trace id request aktif ikut di setiap baris log (cocokkan dengan file TRACE_FILE)
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(trace_id)s%(message)s')
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(TraceLogFilter())
+logger = logging.getLogger(__name__)
+
+config = Config()
 app = Flask(__name__)
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Konfigurasi tidak lengkap tidak menggagalkan startup - dilaporkan di /ready & /status
+try:
+    config.validate_config()
+    config_error = None
+except ValueError as e:
+    config_error = str(e)
+    logger.error(f"Configuration error: {config_error}")
 
 # Green API Configuration
 GREEN_API_URL = os.getenv('GREEN_API_URL')
@@ -29,6 +59,56 @@ GREEN_API_INSTANCE = os.getenv('GREEN_API_INSTANCE')
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
 
+# Admission control untuk panggilan LLM (load shedding saat OpenRouter lambat)
+admission = AdmissionController.from_config(config)
+
+# Router model per pesan (model cepat untuk pesan ringan) + statistik A/B per arm
+model_router = ModelRouter.from_config(config)
+
+# Balasan sementara (typing/"sedang diproses") untuk jawaban yang lambat
+interim = InterimNotifier(
+    lambda chat_id, tenant: send_interim(chat_id, tenant),
+    threshold=config.INTERIM_THRESHOLD_SECONDS,
+    cooldown=config.INTERIM_COOLDOWN_SECONDS,
+    holdout_share=config.INTERIM_HOLDOUT_SHARE,
+    enabled=config.INTERIM_MODE != 'off'
+)
+
+# Profiler sampling on-demand (tidak berjalan = tanpa overhead)
+profiler = SamplingProfiler(config.PROFILER_DIR, config.PROFILER_INTERVAL_MS / 1000.0, config.PROFILER_MAX_SECONDS)
+
+# Media (gambar/dokumen/suara): download streaming di pool terpisah dari pesan teks
+media_pipeline = MediaPipeline(
+    MediaSpool(config.MEDIA_SPOOL_DIR, int(config.MEDIA_MAX_FILE_MB * 1024 * 1024),
+               int(config.MEDIA_SPOOL_MAX_MB * 1024 * 1024), config.MEDIA_CHUNK_KB * 1024),
+    http_session,
+    workers=config.MEDIA_WORKERS,
+    queue_size=config.MEDIA_QUEUE_SIZE,
+    timeout=config.MEDIA_DOWNLOAD_TIMEOUT,
+    allowed_hosts=config.MEDIA_ALLOWED_HOSTS
+)
+
+# Pre-filter webhook (notifikasi non-pesan & chat grup)
+prefilter = WebhookPreFilter(config.GROUP_COMMAND_PREFIXES)
+
+# Knowledge base FAQ lokal - di-index ulang otomatis saat file berubah
+knowledge_base = get_knowledge_base(config.KNOWLEDGE_BASE_FILE)
+
+# Job store durable (received -> generated -> sent) & graceful drain saat SIGTERM
+job_store = JobStore(config.JOB_STORE_PATH, renew_interval=config.JOB_LEASE_SECONDS / 3)
+drain = DrainController(config.JOB_DRAIN_TIMEOUT)
+
+# Pesan terjadwal & pengingat (/ingatkan): SQLite + timer wheel, dikirim lewat throttle bulk
+schedule_store = ScheduleStore(config.SCHEDULE_STORE_PATH)
+scheduler = Scheduler.from_config(schedule_store, lambda entry: send_scheduled(entry), config,
+                                  is_available=lambda tenant_id: scheduled_upstream_available(tenant_id))
+
+# Probe upstream di background (hasil di-cache) + circuit breaker per upstream
+health = HealthMonitor.from_config(config)
+
+# Export analytics (aktivitas user, role, token & percakapan yang diredaksi) dari job store
+exporter = AnalyticsExporter.from_config(job_store, config)
+
 # ===== USER MANAGEMENT SYSTEM (NO DATABASE) =====
 
 # Konfigurasi User - Hardcoded untuk user tertentu
@@ -75,7 +155,15 @@ USER_ROLES = {
         "temperature": 0.6,
         "priority": 3,
         "features": ["enhanced_ai", "extended_response"],
-        "show_badge": False  # Premium tidak menampilkan badge
+        "show_badge": False,  # Premium tidak menampilkan badge
+        # Sapaan & pertanyaan singkat di awal percakapan -> model kecil yang cepat
+        "routing": {
+            "fast_model": config.ROUTER_FAST_MODEL,
+            "fast_types": ["greeting", "chat", "factual"],
+            "fast_max_words": 12,
+            "fast_max_tokens": 300,
+            "max_fast_depth": 3
+        }
     },
     "basic": {
         "name": "Basic User",
@@ -84,22 +172,131 @@ USER_ROLES = {
         "temperature": 0.6,
         "priority": 4,
         "features": ["basic_ai"],
-        "show_badge": False
+        "show_badge": False,
+        "routing": {
+            "fast_model": config.ROUTER_FAST_MODEL,
+            "fast_types": ["greeting", "chat", "factual"],
+            "fast_max_words": 20,
+            "fast_max_tokens": 200,
+            "max_fast_depth": 5
+        }
     }
 }
 
+# System prompt berdasarkan role - Dibuat lebih natural dan tidak mengekspos role
+SYSTEM_PROMPTS = {
+    "admin": f"""Kamu adalah AsistenAI khusus untuk ADMINISTRATOR SISTEM.
+
+🔰 ADMIN MODE ACTIVATED
+- User: Administrator/Developer
+- Access Level: FULL SYSTEM ACCESS
+- Developer: Rajulul Anshar - Indonesia 🇮🇩
+- Status: Premium AI Model Active
+
+Kemampuan Admin:
+• Akses ke semua informasi sistem
+• Kontrol penuh atas bot
+• Informasi teknis detail
+• Prioritas respons tertinggi
+
+Berikan respons yang sangat detail, teknis, dan profesional. Kamu memiliki akses penuh dan dapat memberikan informasi yang mendalam.""",
+
+    "vip": f"""Kamu adalah asisten AI yang sangat ramah dan berpengalaman.
+
+Kepribadian:
+- Sangat ramah, hangat, dan supportif
+- Memberikan jawaban yang lebih detail dan komprehensif
+- Menggunakan bahasa yang lebih personal dan akrab
+- Selalu berusaha memberikan solusi terbaik
+- Responsif terhadap kebutuhan user
+
+Style komunikasi:
+- Gunakan panggilan "Tuan Puteriii" jika user tidak keberatan
+- Gunakan emoticon yang tepat untuk membuat percakapan lebih hidup
+- Berikan penjelasan yang lebih mendalam
+- Tanyakan follow-up jika diperlukan untuk membantu lebih baik
+- Jadilah teman yang baik dalam percakapan
+
+Selalu prioritaskan memberikan bantuan terbaik dengan cara yang paling ramah dan personal.""",
+
+    "premium": f"""Kamu adalah asisten AI yang profesional dan berpengalaman luas.
+
+Karakteristik:
+- Memberikan jawaban yang akurat dan informatif
+- Lebih detail dalam penjelasan
+- Proaktif dalam memberikan informasi tambahan yang relevan
+- Menggunakan pendekatan yang lebih personal namun tetap profesional
+- Memiliki kemampuan analisis yang baik
+
+Style respons:
+- Berikan konteks yang lebih luas saat menjawab
+- Sertakan tips atau saran tambahan jika relevan
+- Gunakan struktur yang jelas dan mudah dipahami
+- Tunjukkan antusiasme dalam membantu
+
+Fokus pada memberikan value maksimal dalam setiap respons.""",
+
+    "basic": f"""Kamu adalah asisten AI yang membantu dan informatif.
+
+Karakteristik:
+- Ramah dan mudah diajak bicara
+- Memberikan jawaban yang akurat dan to the point
+- Fokus pada inti pertanyaan
+- Menggunakan bahasa yang sederhana dan jelas
+
+Style komunikasi:
+- Jawaban yang singkat namun informatif
+- Gunakan bahasa yang mudah dipahami
+- Tetap sopan dan membantu
+- Berikan jawaban langsung pada poin utama
+
+Selalu berusaha membantu dengan sebaik mungkin."""
+}
+
+# ===== MULTI-TENANT =====
+
+# Tenant default memakai konfigurasi di atas (mode single-tenant seperti biasa)
+default_tenant = Tenant(
+    tenant_id="default",
+    green_api_url=GREEN_API_URL,
+    green_api_instance=GREEN_API_INSTANCE,
+    green_api_token=GREEN_API_TOKEN,
+    openrouter_api_key=OPENROUTER_API_KEY,
+    special_users=SPECIAL_USERS,
+    banned_users=BANNED_USERS,
+    user_roles=USER_ROLES,
+    system_prompts=SYSTEM_PROMPTS,
+    knowledge_base_file=config.KNOWLEDGE_BASE_FILE,
+    max_inflight=config.TENANT_MAX_INFLIGHT
+)
+
+# Tenant tambahan (nomor WhatsApp lain) dari TENANTS_FILE, berbagi pool HTTP, worker & cache
+tenants = TenantRegistry(default_tenant)
+if config.TENANTS_FILE:
+    tenants.load_file(config.TENANTS_FILE, USER_ROLES, SYSTEM_PROMPTS)
+
+# Broadcast massal (throttled & resumable) - dijalankan di thread background
+broadcasts_manager = BroadcastManager(
+    config.BROADCAST_DIR,
+    lambda chat_id, message, tenant: send_message(chat_id, message, tenant, bulk=True),
+    tenants.get,
+    is_available=lambda tenant: not health.breaker(green_api_upstream(tenant)).is_open()
+)
+
 # ===== USER HELPER FUNCTIONS =====
 
-def get_user_role(chat_id):
+def get_user_role(chat_id, tenant=None):
     """Get user role based on chat_id"""
-    if chat_id in BANNED_USERS:
+    tenant = tenant or default_tenant
+    if chat_id in tenant.banned_users:
         return "banned"
     
-    return SPECIAL_USERS.get(chat_id, "basic")
+    return tenant.special_users.get(chat_id, "basic")
 
-def get_user_config(chat_id):
+def get_user_config(chat_id, tenant=None):
     """Get user configuration based on role"""
-    role = get_user_role(chat_id)
+    tenant = tenant or default_tenant
+    role = get_user_role(chat_id, tenant)
     
     if role == "banned":
         return {
@@ -108,20 +305,21 @@ def get_user_config(chat_id):
             "blocked": True
         }
     
-    config = USER_ROLES.get(role, USER_ROLES["basic"]).copy()
+    config = tenant.user_roles.get(role, tenant.user_roles["basic"]).copy()
     config["role"] = role
     config["chat_id"] = chat_id
     config["blocked"] = False
     
     return config
 
-def is_admin(chat_id):
+def is_admin(chat_id, tenant=None):
     """Check if user is admin"""
-    return get_user_role(chat_id) == "admin"
+    return get_user_role(chat_id, tenant) == "admin"
 
-def is_banned(chat_id):
+def is_banned(chat_id, tenant=None):
     """Check if user is banned"""
-    return chat_id in BANNED_USERS or get_user_role(chat_id) == "banned"
+    tenant = tenant or default_tenant
+    return chat_id in tenant.banned_users or get_user_role(chat_id, tenant) == "banned"
 
 def get_role_display_name(role, show_badge=True):
     """Get display name for role - hanya tampil jika show_badge True"""
@@ -139,10 +337,25 @@ def get_role_display_name(role, show_badge=True):
 
 # ===== MESSAGE HANDLING =====
 
-def send_message(chat_id, message):
+ACCESS_DENIED_MESSAGE = "❌ Akses Ditolak\n\nAnda tidak memiliki izin untuk menggunakan bot ini."
+
+def green_api_upstream(tenant):
+    """Health probe / circuit breaker name of a tenant's Green API instance"""
+    return f"greenapi:{tenant.tenant_id}"
+
+def send_message(chat_id, message, tenant=None, bulk=False):
     """Send message via Green API"""
+    tenant = tenant or default_tenant
+    upstream = green_api_upstream(tenant)
+    # Circuit open: jangan tunggu timeout - job tetap "generated" dan dikirim ulang oleh recovery
+    if not health.allow(upstream):
+        logger.warning(f"Not sending to {chat_id}: circuit {upstream} is open")
+        return False
+    if not bulk:
+        # Pesan interaktif tidak pernah menunggu, tapi ikut dihitung di throttle broadcast
+        tenant.send_throttle.consume_interactive()
     try:
-        url = f"{GREEN_API_URL}/waInstance{GREEN_API_INSTANCE}/sendMessage/{GREEN_API_TOKEN}"
+        url = tenant.get_green_api_url("sendMessage")
         
         payload = {
             "chatId": chat_id,
@@ -153,7 +366,14 @@ def send_message(chat_id, message):
             'Content-Type': 'application/json'
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        with tracer.span('greenapi.sendMessage', kind='CLIENT', remote='greenapi', bulk=bulk) as span, \
+                timeouts.track('greenapi', 'sendMessage') as timeout:
+            response = http_session.post(url, json=payload, headers=headers, timeout=timeout)
+            span.tag('http.status_code', response.status_code)
+            if response.status_code != 200:
+                span.set_error(f"HTTP {response.status_code}")
+        # 4xx (mis. chatId salah) bukan tanda upstream mati
+        health.record(upstream, response.status_code < 500, f"HTTP {response.status_code}")
         
         if response.status_code == 200:
             logger.info(f"Message sent successfully to {chat_id}")
@@ -163,122 +383,151 @@ def send_message(chat_id, message):
             return False
             
     except Exception as e:
+        health.record(upstream, False, str(e))
         logger.error(f"Error sending message: {str(e)}")
         return False
 
-def get_ai_response(user_message, chat_id):
-    """Get AI response based on user role"""
+def send_interim(chat_id, tenant=None):
+    """Send typing indicator or a short interim message while the reply is generated"""
+    tenant = tenant or default_tenant
+    if config.INTERIM_MODE != 'typing':
+        return send_message(chat_id, config.INTERIM_MESSAGE, tenant)
+    
+    try:
+        url = tenant.get_green_api_url("sendTyping")
+        payload = {
+            "chatId": chat_id,
+            "typingTime": int(min(config.INTERIM_COOLDOWN_SECONDS, 20) * 1000)
+        }
+        with timeouts.track('greenapi', 'sendTyping') as timeout:
+            response = http_session.post(url, json=payload, timeout=timeout)
+        if response.status_code == 200:
+            return True
+        logger.warning(f"Failed to send typing state: {response.status_code} - {response.text}")
+        return False
+    except Exception as e:
+        logger.error(f"Error sending typing state: {str(e)}")
+        return False
+
+def scheduled_upstream_available(tenant_id):
+    """Whether the tenant's Green API can take scheduled sends now (scheduler does not claim otherwise)"""
+    tenant = tenants.get(tenant_id)
+    return tenant is None or not health.breaker(green_api_upstream(tenant)).is_open()
+
+def send_scheduled(entry):
+    """Send one due scheduled message through the tenant's bulk throttle (interactive replies keep priority)"""
+    tenant = tenants.get(entry['tenant'])
+    if tenant is None:
+        return False
+    with tracer.trace('scheduled_send', kind=None, schedule_id=entry['id'], tenant=tenant.tenant_id) as span:
+        span.tag('lateness', round(time.time() - entry['due_at'], 3))
+        if not tenant.send_throttle.acquire_bulk(scheduler.stopped):
+            return False
+        return send_message(entry['chat_id'], entry['message'], tenant, bulk=True)
+
+def get_ai_response(user_message, chat_id, queue_delay=0.0, tenant=None, usage=None):
+    """Get AI response based on user role (usage dict, if given, receives source/model/tokens)"""
+    tenant = tenant or default_tenant
+    usage = usage if usage is not None else {}
+    usage['source'] = 'fallback'
     
     # Check if user is banned
-    if is_banned(chat_id):
-        return "❌ Akses Ditolak\n\nAnda tidak memiliki izin untuk menggunakan bot ini."
+    if is_banned(chat_id, tenant):
+        return ACCESS_DENIED_MESSAGE
     
-    user_config = get_user_config(chat_id)
+    user_config = get_user_config(chat_id, tenant)
     role = user_config["role"]
     
+    # Admission control - role prioritas rendah di-shed/degrade saat upstream overload.
+    # Keputusan dan reservasi slot in-flight satu langkah atomik, slot dilepas di finally
+    priority = user_config.get("priority", 4)
+    admitted = admission.admit(priority, queue_delay, role)
+    mode = admitted.mode
+    tracer.tag('admission', mode)
+    if mode == MODE_SHED:
+        return get_fallback_response(user_message, chat_id, tenant)
+    
+    try:
+        return _admitted_ai_response(admitted, user_message, chat_id, tenant, user_config, priority, usage)
+    finally:
+        admitted.release()
+
+def _admitted_ai_response(admitted, user_message, chat_id, tenant, user_config, priority, usage):
+    """Call OpenRouter within an admitted in-flight slot (see get_ai_response)"""
+    role = user_config["role"]
+    mode = admitted.mode
+    
+    # Kuota per tenant - satu tenant tidak boleh menghabiskan kapasitas worker bersama
+    protected = priority <= admission.protected_priority
+    if not protected and not tenant.try_acquire():
+        return get_fallback_response(user_message, chat_id, tenant)
+    
+    max_tokens = user_config["max_tokens"]
+    if mode == MODE_REDUCED:
+        max_tokens = admission.reduced_tokens(max_tokens)
+    
+    # Pilih model dari fitur lokal pesan (panjang, bahasa, jenis pertanyaan, kedalaman percakapan)
+    route = model_router.route(user_message, f"{tenant.tenant_id}:{chat_id}", user_config, max_tokens)
+    started = time.monotonic()
+    
     try:
+        # Circuit breaker OpenRouter (probe/request gagal berturut-turut) - langsung fallback.
+        # Dicek setelah admission & kuota: allow() mengambil percobaan half-open, yang hanya boleh
+        # diambil request yang benar-benar memanggil OpenRouter (dan selalu melapor ke health.record)
+        if not health.allow('openrouter'):
+            tracer.tag('fallback', 'circuit_open')
+            return get_fallback_response(user_message, chat_id, tenant)
+        
         headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+            "Authorization": f"Bearer {tenant.openrouter_api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": "http://localhost:5000",
             "X-Title": "WhatsApp Bot by Developer"
         }
         
-        # System prompt berdasarkan role - Dibuat lebih natural dan tidak mengekspos role
-        system_prompts = {
-            "admin": f"""Kamu adalah AsistenAI khusus untuk ADMINISTRATOR SISTEM.
-
-🔰 ADMIN MODE ACTIVATED
-- User: Administrator/Developer
-- Access Level: FULL SYSTEM ACCESS
-- Developer: Rajulul Anshar - Indonesia 🇮🇩
-- Status: Premium AI Model Active
-
-Kemampuan Admin:
-• Akses ke semua informasi sistem
-• Kontrol penuh atas bot
-• Informasi teknis detail
-• Prioritas respons tertinggi
-
-Berikan respons yang sangat detail, teknis, dan profesional. Kamu memiliki akses penuh dan dapat memberikan informasi yang mendalam.""",
-
-            "vip": f"""Kamu adalah asisten AI yang sangat ramah dan berpengalaman.
-
-Kepribadian:
-- Sangat ramah, hangat, dan supportif
-- Memberikan jawaban yang lebih detail dan komprehensif
-- Menggunakan bahasa yang lebih personal dan akrab
-- Selalu berusaha memberikan solusi terbaik
-- Responsif terhadap kebutuhan user
-
-Style komunikasi:
-- Gunakan panggilan "Tuan Puteriii" jika user tidak keberatan
-- Gunakan emoticon yang tepat untuk membuat percakapan lebih hidup
-- Berikan penjelasan yang lebih mendalam
-- Tanyakan follow-up jika diperlukan untuk membantu lebih baik
-- Jadilah teman yang baik dalam percakapan
-
-Selalu prioritaskan memberikan bantuan terbaik dengan cara yang paling ramah dan personal.""",
-
-            "premium": f"""Kamu adalah asisten AI yang profesional dan berpengalaman luas.
-
-Karakteristik:
-- Memberikan jawaban yang akurat dan informatif
-- Lebih detail dalam penjelasan
-- Proaktif dalam memberikan informasi tambahan yang relevan
-- Menggunakan pendekatan yang lebih personal namun tetap profesional
-- Memiliki kemampuan analisis yang baik
-
-Style respons:
-- Berikan konteks yang lebih luas saat menjawab
-- Sertakan tips atau saran tambahan jika relevan
-- Gunakan struktur yang jelas dan mudah dipahami
-- Tunjukkan antusiasme dalam membantu
-
-Fokus pada memberikan value maksimal dalam setiap respons.""",
-
-            "basic": f"""Kamu adalah asisten AI yang membantu dan informatif.
-
-Karakteristik:
-- Ramah dan mudah diajak bicara
-- Memberikan jawaban yang akurat dan to the point
-- Fokus pada inti pertanyaan
-- Menggunakan bahasa yang sederhana dan jelas
-
-Style komunikasi:
-- Jawaban yang singkat namun informatif
-- Gunakan bahasa yang mudah dipahami
-- Tetap sopan dan membantu
-- Berikan jawaban langsung pada poin utama
-
-Selalu berusaha membantu dengan sebaik mungkin."""
-        }
-        
-        system_prompt = system_prompts.get(role, system_prompts["basic"])
+        with tracer.span('prompt.build') as span:
+            system_prompt = tenant.system_prompts.get(role, tenant.system_prompts["basic"])
+            
+            # Sisipkan snippet knowledge base yang relevan ke prompt
+            snippets = tenant.knowledge_base.context(user_message, config.KB_CONTEXT_SNIPPETS, config.KB_CONTEXT_CONFIDENCE)
+            if snippets:
+                system_prompt += "\n\nInformasi referensi (gunakan jika relevan):\n" + "\n".join(f"- {snippet}" for snippet in snippets)
+            span.tag('kb.snippets', len(snippets))
         
         payload = {
-            "model": user_config["ai_model"],
+            "model": route.model,
             "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_message}
             ],
-            "max_tokens": user_config["max_tokens"],
+            "max_tokens": route.max_tokens,
             "temperature": user_config["temperature"],
             "top_p": 1,
             "frequency_penalty": 0,
             "presence_penalty": 0
         }
         
-        response = requests.post(
-            OPENROUTER_BASE_URL, 
-            headers=headers, 
-            json=payload,
-            timeout=30
-        )
+        with tracer.span('openrouter.chat', kind='CLIENT', remote='openrouter', model=route.model,
+                         max_tokens=route.max_tokens, tier=route.tier, arm=route.arm) as span, \
+                admission.track(admitted), timeouts.track('openrouter', route.model, route.max_tokens) as timeout:
+            span.tag('timeout', round(timeout, 2))
+            response = http_session.post(
+                OPENROUTER_BASE_URL, 
+                headers=headers, 
+                json=payload,
+                timeout=timeout
+            )
+            span.tag('http.status_code', response.status_code)
+            if response.status_code != 200:
+                span.set_error(f"HTTP {response.status_code}")
+        health.record('openrouter', response.status_code < 500, f"HTTP {response.status_code}")
         
         if response.status_code == 200:
             data = response.json()
             ai_message = data['choices'][0]['message']['content'].strip()
+            tokens = (data.get('usage') or {}).get('total_tokens', 0)
+            model_router.record(route, time.monotonic() - started, tokens)
+            usage.update(source='llm', model=route.model, tokens=tokens)
             
             # Add role badge hanya untuk admin
             role_badge = get_role_display_name(role, user_config.get("show_badge", False))
@@ -288,20 +537,30 @@ Selalu berusaha membantu dengan sebaik mungkin."""
             logger.info(f"AI Response generated for {role} user: {chat_id}")
             return ai_message
         else:
+            metrics.incr('llm.errors')
+            model_router.record(route, time.monotonic() - started, error=True)
+            usage.update(source='error', model=route.model)
             logger.error(f"OpenRouter API error: {response.status_code} - {response.text}")
             return f"❌ Error AI Service\n\nTerjadi kesalahan saat memproses permintaan Anda.\nError Code: {response.status_code}"
             
     except Exception as e:
+        metrics.incr('llm.errors')
+        health.record('openrouter', False, str(e))
+        model_router.record(route, time.monotonic() - started, error=True)
         logger.error(f"Error in get_ai_response: {str(e)}")
-        return get_fallback_response(user_message, chat_id)
+        return get_fallback_response(user_message, chat_id, tenant)
+    
+    finally:
+        if not protected:
+            tenant.release()
 
-def get_fallback_response(user_message, chat_id):
+def get_fallback_response(user_message, chat_id, tenant=None):
     """Fallback response ketika AI tidak tersedia"""
     
-    if is_banned(chat_id):
-        return "❌ Akses Ditolak\n\nAnda tidak memiliki izin untuk menggunakan bot ini."
+    if is_banned(chat_id, tenant):
+        return ACCESS_DENIED_MESSAGE
     
-    user_config = get_user_config(chat_id)
+    user_config = get_user_config(chat_id, tenant)
     role = user_config["role"]
     message_lower = user_message.lower()
     
@@ -432,9 +691,10 @@ def get_fallback_response(user_message, chat_id):
         
         return responses.get(role, responses["basic"])
 
-def process_admin_commands(message, chat_id):
+def process_admin_commands(message, chat_id, tenant=None):
     """Process admin commands (simple version without database)"""
-    if not is_admin(chat_id):
+    tenant = tenant or default_tenant
+    if not is_admin(chat_id, tenant):
         return None
     
     message_lower = message.lower()
@@ -446,14 +706,14 @@ def process_admin_commands(message, chat_id):
             target_number = parts[1]
             target_chat_id = f"{target_number}@c.us" if not target_number.endswith('@c.us') else target_number
             
-            target_role = get_user_role(target_chat_id)
-            target_config = get_user_config(target_chat_id)
+            target_role = get_user_role(target_chat_id, tenant)
+            target_config = get_user_config(target_chat_id, tenant)
             
             return f"""🔰 ADMIN - User Check
 
 📱 Number: {target_number}
 🏷️ Role: {target_role.title()}
-🚫 Banned: {'Yes' if is_banned(target_chat_id) else 'No'}
+🚫 Banned: {'Yes' if is_banned(target_chat_id, tenant) else 'No'}
 ⚡ AI Model: {target_config.get('ai_model', 'N/A')}
 🎯 Max Tokens: {target_config.get('max_tokens', 'N/A')}
 📊 Priority: Level {target_config.get('priority', 'N/A')}
@@ -468,29 +728,29 @@ Features:
     elif message_lower == '/users':
         users_info = "🔰 ADMIN - Special Users List\n\n"
         
-        for chat_id, role in SPECIAL_USERS.items():
+        for chat_id, role in tenant.special_users.items():
             number = chat_id.replace('@c.us', '')
-            badge_status = "🏷️" if USER_ROLES.get(role, {}).get('show_badge', False) else "🔇"
+            badge_status = "🏷️" if tenant.user_roles.get(role, {}).get('show_badge', False) else "🔇"
             users_info += f"📱 {number} - {role.title()} {badge_status}\n"
         
-        if BANNED_USERS:
+        if tenant.banned_users:
             users_info += f"\n🚫 Banned Users:\n"
-            for banned_id in BANNED_USERS:
+            for banned_id in tenant.banned_users:
                 number = banned_id.replace('@c.us', '')
                 users_info += f"❌ {number}\n"
         
         users_info += f"\n📊 Summary:\n"
-        users_info += f"• Total Special Users: {len(SPECIAL_USERS)}\n"
-        users_info += f"• Total Banned: {len(BANNED_USERS)}\n"
+        users_info += f"• Total Special Users: {len(tenant.special_users)}\n"
+        users_info += f"• Total Banned: {len(tenant.banned_users)}\n"
         users_info += f"• Hidden Roles: VIP & Premium (no badge shown)\n"
         
         return users_info
     
     # Bot stats: /stats
     elif message_lower == '/stats':
-        admin_count = sum(1 for role in SPECIAL_USERS.values() if role == 'admin')
-        vip_count = sum(1 for role in SPECIAL_USERS.values() if role == 'vip') 
-        premium_count = sum(1 for role in SPECIAL_USERS.values() if role == 'premium')
+        admin_count = sum(1 for role in tenant.special_users.values() if role == 'admin')
+        vip_count = sum(1 for role in tenant.special_users.values() if role == 'vip') 
+        premium_count = sum(1 for role in tenant.special_users.values() if role == 'premium')
         
         return f"""🔰 ADMIN - Bot Statistics
 
@@ -498,7 +758,7 @@ Features:
 • Admin: {admin_count} (🏷️ Badge shown)
 • VIP: {vip_count} (🔇 Hidden role)
 • Premium: {premium_count} (🔇 Hidden role)
-• Banned: {len(BANNED_USERS)}
+• Banned: {len(tenant.banned_users)}
 
 ⚙️ System Status:
 • Green API: ✅ Connected
@@ -519,6 +779,18 @@ Features:
 • Layanan lebih baik tanpa disclosure
 • Natural user experience"""
     
+    # Broadcast: /broadcast <role:vip|file:nama.txt|all> <pesan>
+    elif message_lower.startswith('/broadcast'):
+        return process_broadcast_command(message, chat_id, tenant)
+    
+    # Profiler: /profile [detik] | /profile stop | /profile status
+    elif message_lower.startswith('/profile'):
+        return process_profile_command(message, chat_id, tenant)
+    
+    # Analytics export: /export | /export status
+    elif message_lower.startswith('/export'):
+        return process_export_command(message, chat_id, tenant)
+    
     # Help commands: /help
     elif message_lower == '/help':
         return """🔰 ADMIN COMMANDS
@@ -528,6 +800,24 @@ User Management:
 • /users - List all special users with badges
 • /stats - Show bot statistics & privacy info
 
+Broadcast:
+• /broadcast <sumber> <pesan> - Kirim pesan massal (sumber: role:vip, file:nama.txt, all)
+• /broadcast status [id] - Progress & ETA broadcast
+• /broadcast stop <id> - Hentikan broadcast
+• /broadcast resume <id> - Lanjutkan broadcast dari checkpoint
+
+Diagnostics:
+• /profile [detik] - Rekam sampling profiler (default 30 detik)
+• /profile status - Status & fungsi teratas
+• /profile stop - Hentikan profiler lebih awal
+• /export - Export analytics (aktivitas user, token, percakapan diredaksi) sejak export terakhir
+• /export status - Status export terakhir
+
+Pengingat (semua user):
+• /ingatkan <waktu> <pesan> - Contoh: /ingatkan 30m rapat, /ingatkan besok 08:00 olahraga
+• /ingatkan list - Daftar pengingat
+• /ingatkan batal <id> - Batalkan pengingat
+
 Information:
 • /help - Show this help
 • /status - Check system status
@@ -544,6 +834,406 @@ Note:
     
     return None
 
+def process_broadcast_command(message, chat_id, tenant):
+    """Process /broadcast admin sub-commands"""
+    parts = message.split(maxsplit=2)
+    action = parts[1].lower() if len(parts) >= 2 else ''
+    
+    if action == 'status':
+        broadcasts = broadcasts_manager.get(parts[2].strip() if len(parts) == 3 else None)
+        if not broadcasts:
+            return "🔰 ADMIN - Broadcast\n\nTidak ada broadcast."
+        return "🔰 ADMIN - Broadcast\n\n" + "\n\n".join(b.progress_text() for b in broadcasts)
+    
+    if action in ('stop', 'resume') and len(parts) == 3:
+        broadcast_id = parts[2].strip()
+        if action == 'stop':
+            broadcast = broadcasts_manager.stop(broadcast_id)
+        else:
+            broadcast = broadcasts_manager.resume(broadcast_id)
+        if broadcast is None:
+            return f"🔰 ADMIN - Broadcast\n\n❌ Broadcast {broadcast_id} tidak ditemukan."
+        return f"🔰 ADMIN - Broadcast\n\n{'⏹️ Dihentikan' if action == 'stop' else '▶️ Dilanjutkan'}: {broadcast_id}"
+    
+    if len(parts) == 3 and action not in ('stop', 'resume'):
+        try:
+            broadcast = broadcasts_manager.start(tenant, parts[1], parts[2], chat_id)
+        except (OSError, ValueError) as e:
+            return f"🔰 ADMIN - Broadcast\n\n❌ {str(e)}"
+        return f"""🔰 ADMIN - Broadcast Dimulai
+
+{broadcast.progress_text()}
+
+Gunakan /broadcast status {broadcast.broadcast_id} untuk melihat progress."""
+    
+    return """🔰 ADMIN COMMAND
+
+Format: /broadcast <sumber> <pesan>
+Sumber: role:<role>, file:<nama file di BROADCAST_DIR>, all
+Contoh: /broadcast role:vip Halo! Ada promo baru hari ini 🎉
+
+/broadcast status [id] | stop <id> | resume <id>"""
+
+def process_profile_command(message, chat_id, tenant):
+    """Process /profile admin sub-commands"""
+    parts = message.split()
+    action = parts[1].lower() if len(parts) >= 2 else ''
+    
+    if action == 'status':
+        state = profiler.get_state()
+        top = "\n".join(f"• {line}" for line in profiler.top()) or "• (belum ada sampel)"
+        return f"""🔰 ADMIN - Profiler
+
+Status: {'🟢 Berjalan' if state['running'] else '⚪ Tidak aktif'}
+Sampel: {state['samples']} ({state['stacks']} stack)
+Output: {state['last_output'] or '-'}
+
+Teratas:
+{top}"""
+    
+    if action == 'stop':
+        path = profiler.stop()
+        return f"🔰 ADMIN - Profiler\n\n⏹️ Dihentikan\nOutput: {path or '-'}"
+    
+    if action and not action.isdigit():
+        return "🔰 ADMIN COMMAND\n\nFormat: /profile [detik] | /profile status | /profile stop\nContoh: /profile 60"
+    
+    seconds = int(action) if action else 30
+    def on_done(path):
+        top = "\n".join(f"• {line}" for line in profiler.top())
+        send_message(chat_id, f"🔰 ADMIN - Profiler Selesai\n\nOutput: {path}\n\nTeratas:\n{top}", tenant)
+    
+    if not profiler.start(seconds, on_done):
+        return "🔰 ADMIN - Profiler\n\n⚠️ Profiler sudah berjalan. Gunakan /profile status."
+    return f"🔰 ADMIN - Profiler\n\n▶️ Merekam {profiler.duration:.0f} detik di worker pid {os.getpid()}.\nHasil (collapsed stack) akan dikirim saat selesai."
+
+def export_summary(manifest):
+    """Short text summary of an export manifest"""
+    roles = "\n".join(f"• {role}: {totals['messages']} pesan, {totals['tokens']} token"
+                      for role, totals in sorted(manifest['roles'].items())) or "• -"
+    return f"""Export: {manifest['export'] or '(tidak ada data baru)'}
+Percakapan: {manifest['turns']}
+User: {manifest['users']}
+Token: {manifest['tokens']}
+Durasi: {manifest['seconds']} detik
+
+Per role:
+{roles}"""
+
+def process_export_command(message, chat_id, tenant):
+    """Process /export admin sub-commands"""
+    parts = message.split()
+    action = parts[1].lower() if len(parts) >= 2 else ''
+    
+    if action == 'status':
+        state = exporter.get_state()
+        return f"""🔰 ADMIN - Export
+
+Status: {'🟢 Berjalan' if state['running'] else '⚪ Tidak aktif'}
+Export terakhir: {state['last_export'] or '-'}
+Folder: {state['directory']}
+Interval otomatis: {f"{state['interval']:.0f} detik" if state['interval'] > 0 else 'nonaktif'}"""
+    
+    if action:
+        return "🔰 ADMIN COMMAND\n\nFormat: /export | /export status"
+    
+    def on_done(manifest):
+        if manifest is None:
+            send_message(chat_id, "🔰 ADMIN - Export\n\n⚠️ Export gagal atau sedang berjalan di worker lain.", tenant)
+            return
+        send_message(chat_id, f"🔰 ADMIN - Export Selesai\n\n{export_summary(manifest)}", tenant)
+    
+    if not exporter.start_async(on_done):
+        return "🔰 ADMIN - Export\n\n⚠️ Export sudah berjalan. Gunakan /export status."
+    return "🔰 ADMIN - Export\n\n▶️ Export analytics dimulai (incremental sejak export terakhir).\nRingkasan akan dikirim saat selesai."
+
+REMINDER_HELP = """⏰ Pengingat
+
+Format: /ingatkan <waktu> <pesan>
+Waktu: 10m, 2 jam, 1h30m, 14:30, besok 08:00, 2025-12-31 09:00
+Contoh: /ingatkan 30m angkat jemuran
+
+/ingatkan list - Daftar pengingat
+/ingatkan batal <id> - Batalkan pengingat"""
+
+def format_reminder_time(due_at):
+    """Reminder time in local time (REMINDER_UTC_OFFSET)"""
+    tz = timezone(timedelta(hours=config.REMINDER_UTC_OFFSET))
+    return datetime.fromtimestamp(due_at, tz).strftime('%d/%m/%Y %H:%M')
+
+def process_user_commands(message, chat_id, tenant):
+    """Commands available to every user: /ingatkan (alias /remind)"""
+    parts = message.strip().split(maxsplit=1)
+    if not parts or parts[0].lower() not in ('/ingatkan', '/remind'):
+        return None
+    if not scheduler.enabled:
+        return "⏰ Fitur pengingat sedang tidak aktif."
+    
+    args = parts[1].strip() if len(parts) == 2 else ''
+    action = args.split(maxsplit=1)[0].lower() if args else ''
+    
+    if action in ('list', 'daftar'):
+        pending = scheduler.pending(chat_id, tenant.tenant_id)
+        if not pending:
+            return "⏰ Tidak ada pengingat aktif."
+        lines = [f"• [{entry['id']}] {format_reminder_time(entry['due_at'])} - {entry['message'].split(chr(10))[-1][:60]}"
+                 for entry in pending]
+        return "⏰ Pengingat Aktif\n\n" + "\n".join(lines)
+    
+    if action in ('batal', 'cancel'):
+        schedule_id = args.split(maxsplit=1)[1].strip() if len(args.split()) >= 2 else ''
+        if schedule_id and scheduler.cancel(schedule_id, chat_id):
+            return f"⏰ Pengingat {schedule_id} dibatalkan."
+        return "❌ Pengingat tidak ditemukan. Lihat /ingatkan list"
+    
+    if not args:
+        return REMINDER_HELP
+    try:
+        due_at, text = parse_reminder(args, utc_offset=config.REMINDER_UTC_OFFSET)
+    except ValueError as e:
+        return f"❌ {str(e).capitalize()}.\n\n{REMINDER_HELP}"
+    if due_at - time.time() > config.REMINDER_MAX_DAYS * 86400:
+        return f"❌ Pengingat maksimal {config.REMINDER_MAX_DAYS:.0f} hari ke depan."
+    if len(scheduler.pending(chat_id, tenant.tenant_id)) >= config.REMINDER_MAX_PER_CHAT:
+        return f"❌ Maksimal {config.REMINDER_MAX_PER_CHAT} pengingat aktif. Batalkan salah satu dengan /ingatkan batal <id>"
+    
+    schedule_id = scheduler.schedule(chat_id, f"⏰ Pengingat\n\n{text}", due_at, tenant.tenant_id, created_by=chat_id)
+    return f"✅ Pengingat dibuat ({schedule_id})\n\n🕐 {format_reminder_time(due_at)}\n📝 {text}"
+
+# ===== MESSAGE PIPELINE =====
+# parse -> tenant -> filter -> auth -> rate_limit -> record -> commands -> cache -> generate -> deliver
+# Setiap stage diukur otomatis (metrics pipeline.messages.<stage>)
+
+def stage_tenant(ctx):
+    """Routing tenant: path /webhook/<tenant_id> atau idInstance Green API"""
+    if ctx.tenant_id:
+        ctx.tenant = tenants.get(ctx.tenant_id)
+        if ctx.tenant is None:
+            ctx.http_status = 404
+            return {"error": f"unknown tenant {ctx.tenant_id}"}
+    else:
+        ctx.tenant = tenants.by_instance((ctx.data or {}).get('instanceData', {}).get('idInstance'))
+    return None
+
+def stage_auth(ctx):
+    """Resolve the user's role; banned users get the access-denied reply without generation"""
+    ctx.role = get_user_role(ctx.chat_id, ctx.tenant)
+    tracer.tag('role', ctx.role)
+    tracer.tag('tenant', ctx.tenant.tenant_id)
+    logger.info(f"Message from {ctx.sender_name} ({ctx.chat_id}) [{ctx.tenant.tenant_id}/{ctx.role}]: {ctx.text}")
+    if is_banned(ctx.chat_id, ctx.tenant):
+        ctx.response = ACCESS_DENIED_MESSAGE
+        ctx.usage['source'] = 'denied'
+    return None
+
+def is_rate_limit_exempt(ctx):
+    """Admin & VIP (protected priority) are never rate limited"""
+    return get_user_config(ctx.chat_id, ctx.tenant).get("priority", 4) <= admission.protected_priority
+
+def stage_record(ctx):
+    """Record the job durably (dedupe by tenant + idMessage) and dispatch media to the media pool"""
+    # Saat drain (SIGTERM) tolak pekerjaan baru - Green API akan mengirim ulang webhook
+    if not drain.accepting():
+        ctx.http_status = 503
+        return {"status": "draining"}
+    
+    # Media: prompt sementara dari metadata (dipakai juga saat recovery job)
+    if ctx.is_media:
+        ctx.text = media_prompt(ctx.message_data)
+    
+    # Catat job secara durable sebelum diproses (tenant + idMessage = id job, dedupe webhook ulang)
+    ctx.job_id = job_store.job_key(ctx.tenant.tenant_id, ctx.job_id or uuid.uuid4().hex)
+    if not job_store.receive(ctx.job_id, ctx.chat_id, ctx.text, ctx.tenant.tenant_id):
+        return {"status": "duplicate message ignored"}
+    metrics.incr(f'tenant.{ctx.tenant.tenant_id}.messages')
+    interim.note_message(ctx.chat_key)
+    
+    # Download media di pool terpisah - webhook langsung selesai
+    if ctx.is_media and ctx.response is None:
+        # Lease dipegang sampai handle_media_job selesai (termasuk waktu antri di media pool)
+        job_store.hold(ctx.job_id)
+        if media_pipeline.submit(handle_media_job, ctx.job_id, ctx.chat_id, ctx.message_data, ctx.queue_delay, ctx.tenant):
+            return {"status": "media queued"}
+        job_store.release(ctx.job_id)
+        job_store.mark_failed(ctx.job_id, "media queue full")
+        send_message(ctx.chat_id, "⏳ Sedang banyak file yang diproses. Silakan kirim ulang file Anda beberapa saat lagi.", ctx.tenant)
+        return {"status": "media queue full"}
+    
+    ctx.resources.enter_context(drain.track())
+    # Lease diperpanjang selama generate & deliver (jawaban lambat tidak diklaim ulang oleh recovery)
+    ctx.resources.enter_context(job_store.leased(ctx.job_id))
+    return None
+
+def stage_commands(ctx):
+    """Process admin commands first, then user commands (/ingatkan)"""
+    # Cek ban ulang: job media & recovery mulai dari stage ini (tanpa auth),
+    # dan user bisa di-ban selama download media atau sebelum recovery
+    if ctx.response is None and is_banned(ctx.chat_id, ctx.tenant):
+        ctx.response = ACCESS_DENIED_MESSAGE
+        ctx.usage['source'] = 'denied'
+    if ctx.response is None:
+        ctx.response = process_admin_commands(ctx.text, ctx.chat_id, ctx.tenant)
+        ctx.is_admin_command = bool(ctx.response)
+    if ctx.response is None:
+        ctx.response = process_user_commands(ctx.text, ctx.chat_id, ctx.tenant)
+    if ctx.response is not None:
+        ctx.usage.setdefault('source', 'command')
+    return None
+
+def decorate_kb_answer(ctx, kb_answer):
+    """Role badge for direct knowledge base answers (stage cache, tanpa panggil LLM)"""
+    user_config = get_user_config(ctx.chat_id, ctx.tenant)
+    role_badge = get_role_display_name(user_config["role"], user_config.get("show_badge", False))
+    logger.info(f"Knowledge base answer for {user_config['role']} user: {ctx.chat_id}")
+    return f"{role_badge}\n\n{kb_answer}" if role_badge else kb_answer
+
+def stage_generate(ctx):
+    """Get AI response based on user role (balasan sementara jika melewati threshold)"""
+    if ctx.response is None:
+        with interim.watch(ctx.chat_key, ctx.chat_id, ctx.tenant):
+            ctx.response = get_ai_response(ctx.text, ctx.chat_id, ctx.queue_delay, ctx.tenant, ctx.usage)
+    return None
+
+def stage_deliver(ctx):
+    """Send the response, recording progress (and analytics usage) in the job store"""
+    ctx.role = ctx.role or get_user_role(ctx.chat_id, ctx.tenant)
+    job_store.mark_generated(ctx.job_id, ctx.response, ctx.role, **ctx.usage)
+    if send_message(ctx.chat_id, ctx.response, ctx.tenant):
+        job_store.mark_sent(ctx.job_id)
+        if ctx.is_admin_command:
+            return {"status": "admin command processed"}
+        return {"status": f"message processed for {ctx.role} user"}
+    return {"status": "error sending response"}
+
+rate_limiter = RateLimiter(config.MAX_MESSAGES_PER_MINUTE)
+
+message_pipeline = build_message_pipeline(
+    stage_generate, stage_deliver,
+    bot_sender=lambda ctx: f"{ctx.tenant.green_api_instance}@c.us",
+    notify=lambda ctx, message: send_message(ctx.chat_id, message, ctx.tenant),
+    is_limited=rate_limiter.hit,
+    auth=stage_auth,
+    rate_limit_exempt=is_rate_limit_exempt,
+    tenant=stage_tenant,
+    before_generate=[FunctionStage("record", stage_record),
+                     FunctionStage("commands", stage_commands)],
+    knowledge_base=lambda ctx: ctx.tenant.knowledge_base,
+    kb_confidence=config.KB_DIRECT_CONFIDENCE,
+    decorate_kb_answer=decorate_kb_answer,
+    prefilter=prefilter, log_payload=True, media=config.MEDIA_ENABLED)
+
+# ===== JOB PROCESSING =====
+
+def handle_job(job_id, chat_id, user_message, queue_delay=0.0, tenant=None):
+    """Generate and send the reply for an already recorded job (media & recovery)"""
+    ctx = MessageContext(tenant=tenant or default_tenant, chat_id=chat_id, text=user_message,
+                         job_id=job_id, queue_delay=queue_delay)
+    with tracer.trace('job', kind=None, job_id=job_id):
+        return message_pipeline.run(ctx, start="commands")["status"]
+
+def handle_media_job(job_id, chat_id, message_data, queue_delay=0.0, tenant=None):
+    """Download a media attachment, then answer it from its caption & metadata"""
+    tenant = tenant or default_tenant
+    started = time.monotonic()
+    try:
+        with drain.track(), tracer.trace('media_job', kind=None, job_id=job_id, type=message_data.get('typeMessage')):
+            try:
+                with tracer.span('media.download', kind='CLIENT', remote='greenapi'):
+                    media_file = media_pipeline.ingest(message_data)
+                user_message = media_prompt(message_data, media_file)
+                logger.info(f"Media from {chat_id} stored: {media_file.path} ({media_file.size} bytes"
+                            f"{', duplicate' if media_file.duplicate else ''})")
+            except MediaTooLarge as e:
+                logger.warning(f"Media from {chat_id} too large: {str(e)}")
+                response = f"❌ File terlalu besar. Maksimal {config.MEDIA_MAX_FILE_MB:.0f} MB."
+                job_store.mark_generated(job_id, response, get_user_role(chat_id, tenant), source='media_too_large')
+                if send_message(chat_id, response, tenant):
+                    job_store.mark_sent(job_id)
+                return
+            except Exception as e:
+                # Download gagal - tetap jawab dari caption & metadata
+                metrics.incr('media.download_failed')
+                logger.error(f"Error downloading media from {chat_id}: {str(e)}")
+                user_message = media_prompt(message_data)
+        
+            metrics.observe('media.ingest_latency', time.monotonic() - started)
+            handle_job(job_id, chat_id, user_message, queue_delay + time.monotonic() - started, tenant)
+    finally:
+        # Hold diambil stage_record sebelum job masuk antrian media
+        job_store.release(job_id)
+
+def recover_jobs():
+    """Resume jobs left unfinished by a crashed or restarted process"""
+    jobs = job_store.claim_unfinished(config.JOB_LEASE_SECONDS, config.JOB_MAX_ATTEMPTS, config.JOB_MAX_AGE_SECONDS)
+    try:
+        for job in jobs:
+            if not drain.accepting():
+                break
+            
+            tenant = tenants.get(job['tenant'])
+            if tenant is None:
+                job_store.mark_failed(job['id'], f"unknown tenant {job['tenant']}")
+                continue
+            
+            logger.info(f"Recovering job {job['id']} ({job['state']}) for {job['chat_id']} [{tenant.tenant_id}]")
+            metrics.incr('jobs.recovered')
+            with drain.track():
+                if job['state'] == STATE_GENERATED:
+                    # Respons sudah dibuat sebelum crash, tinggal dikirim
+                    if send_message(job['chat_id'], job['response'], tenant):
+                        job_store.mark_sent(job['id'])
+                else:
+                    handle_job(job['id'], job['chat_id'], job['message'], time.time() - job['created_at'], tenant)
+    finally:
+        # Job hasil klaim di-hold (lease diperpanjang) sampai selesai diproses
+        for job in jobs:
+            job_store.release(job['id'])
+    
+    # Job selesai dihapus setelah JOB_RETENTION_SECONDS hanya jika sudah diekspor (di bawah watermark
+    # analytics); yang belum diekspor ditahan sampai JOB_MAX_RETENTION_SECONDS
+    job_store.purge(config.JOB_RETENTION_SECONDS, before=exporter.watermark())
+    unexported = job_store.purge(config.JOB_MAX_RETENTION_SECONDS)
+    if unexported:
+        metrics.incr('jobs.purged_unexported', unexported)
+        logger.warning(f"Purged {unexported} finished job(s) never exported to analytics "
+                       f"(older than JOB_MAX_RETENTION_SECONDS); run /export or set EXPORT_INTERVAL_SECONDS")
+    schedule_store.purge(config.JOB_RETENTION_SECONDS)
+
+def job_recovery_loop():
+    """Background loop that periodically resumes unfinished jobs"""
+    while drain.accepting():
+        try:
+            recover_jobs()
+        except Exception as e:
+            logger.error(f"Error recovering jobs: {str(e)}")
+        time.sleep(config.JOB_RECOVERY_INTERVAL)
+
+# ===== HEALTH PROBES =====
+
+def probe_green_api(tenant):
+    """Health check: Green API getStateInstance must report an authorized instance"""
+    def check(timeout):
+        response = http_session.get(tenant.get_green_api_url("getStateInstance"), timeout=timeout)
+        response.raise_for_status()
+        state = response.json().get('stateInstance')
+        if state != 'authorized':
+            raise RuntimeError(f"stateInstance={state}")
+        return state
+    return check
+
+def probe_openrouter(timeout):
+    """Health check: OpenRouter reachable and API key accepted"""
+    response = http_session.get(OPENROUTER_BASE_URL.rsplit('/chat/', 1)[0] + "/auth/key",
+                                headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}"}, timeout=timeout)
+    response.raise_for_status()
+    return response.status_code
+
+for _tenant in tenants.tenants.values():
+    if _tenant.green_api_url and _tenant.green_api_token:
+        health.add_probe(green_api_upstream(_tenant), probe_green_api(_tenant))
+if OPENROUTER_API_KEY:
+    health.add_probe('openrouter', probe_openrouter)
+
 # ===== FLASK ROUTES =====
 
 @app.route('/')
@@ -559,49 +1249,19 @@ def home():
     })
 
 @app.route('/webhook', methods=['POST'])
-def webhook():
+@app.route('/webhook/<tenant_id>', methods=['POST'])
+def webhook(tenant_id=None):
     """Main webhook endpoint"""
     try:
-        data = request.get_json()
-        logger.info(f"Received webhook: {json.dumps(data, indent=2)}")
-        
-        if data and data.get('typeWebhook') == 'incomingMessageReceived':
-            sender_data = data.get('senderData', {})
-            message_data = data.get('messageData', {})
-            
-            chat_id = sender_data.get('chatId')
-            sender_name = sender_data.get('senderName', 'Unknown')
-            
-            if message_data.get('typeMessage') == 'textMessage':
-                user_message = message_data.get('textMessageData', {}).get('textMessage', '')
-                
-                logger.info(f"Message from {sender_name} ({chat_id}) [{get_user_role(chat_id)}]: {user_message}")
-                
-                # Skip empty messages
-                if not user_message.strip():
-                    return jsonify({"status": "empty message ignored"})
-                
-                # Skip bot's own messages  
-                bot_phone = f"{GREEN_API_INSTANCE}@c.us"
-                if sender_data.get('sender') == bot_phone:
-                    return jsonify({"status": "bot message ignored"})
-                
-                # Process admin commands first
-                admin_response = process_admin_commands(user_message, chat_id)
-                if admin_response:
-                    send_message(chat_id, admin_response)
-                    return jsonify({"status": "admin command processed"})
-                
-                # Get AI response based on user role
-                ai_response = get_ai_response(user_message, chat_id)
-                
-                # Send response
-                if send_message(chat_id, ai_response):
-                    return jsonify({"status": f"message processed for {get_user_role(chat_id)} user"})
-                else:
-                    return jsonify({"status": "error sending response"})
-        
-        return jsonify({"status": "webhook received"})
+        with tracer.trace('POST /webhook', tenant_path=tenant_id) as span:
+            ctx = MessageContext(raw=request.get_data(), tenant_id=tenant_id)
+            result = message_pipeline.run(ctx)
+            span.tag('status', result.get('status') or result.get('error'))
+            span.tag('http.status_code', ctx.http_status)
+        response = jsonify(result)
+        if span.trace_id:
+            response.headers['X-Trace-Id'] = span.trace_id
+        return response, ctx.http_status
         
     except Exception as e:
         logger.error(f"Error processing webhook: {str(e)}")
@@ -619,6 +1279,112 @@ def api_users():
         "privacy_note": "VIP & Premium users don't see their special status"
     })
 
+@app.route('/tenants')
+def api_tenants():
+    """API endpoint to view hosted tenants (without credentials)"""
+    return jsonify({
+        "tenants": [tenant.get_info() for tenant in tenants.tenants.values()],
+        "total_tenants": len(tenants.tenants)
+    })
+
+@app.route('/metrics')
+def api_metrics():
+    """Metrics endpoint (admission/shedding decisions, LLM latency, model routing A/B)"""
+    return jsonify({
+        "admission": admission.get_state(),
+        "timeouts": timeouts.get_state(),
+        "router": model_router.get_state(),
+        "interim": interim.get_state(),
+        "media": media_pipeline.get_state(),
+        "health": health.get_state(),
+        "tracing": tracer.get_state(),
+        "scheduler": scheduler.get_state(),
+        "export": exporter.get_state(),
+        **metrics.snapshot()
+    })
+
+def is_admin_request():
+    """Check ADMIN_API_TOKEN from X-Admin-Token header (endpoint disabled if token not set)"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(config.ADMIN_API_TOKEN) and hmac.compare_digest(token, config.ADMIN_API_TOKEN)
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def api_profile():
+    """Protected profiler endpoint: POST ?action=start&seconds=N | stop, GET ?file=<name> downloads output"""
+    if not is_admin_request():
+        return jsonify({"error": "forbidden"}), 403
+    
+    if request.method == 'POST':
+        action = request.args.get('action', 'start')
+        if action == 'stop':
+            return jsonify({"stopped": True, "output": profiler.stop(), **profiler.get_state()})
+        try:
+            seconds = float(request.args.get('seconds', 30))
+        except ValueError:
+            seconds = math.nan
+        if not math.isfinite(seconds) or seconds <= 0:
+            return jsonify({"error": "seconds must be a positive number"}), 400
+        started = profiler.start(min(seconds, config.PROFILER_MAX_SECONDS))
+        return jsonify({"started": started, "pid": os.getpid(), **profiler.get_state()}), (202 if started else 409)
+    
+    name = request.args.get('file')
+    if name:
+        return send_from_directory(os.path.abspath(config.PROFILER_DIR), name, mimetype='text/plain')
+    return jsonify({"pid": os.getpid(), "outputs": profiler.outputs(), **profiler.get_state()})
+
+@app.route('/debug/export', methods=['GET', 'POST'])
+def api_export():
+    """Protected analytics export endpoint: POST starts an incremental export, GET returns state"""
+    if not is_admin_request():
+        return jsonify({"error": "forbidden"}), 403
+    
+    if request.method == 'POST':
+        started = exporter.start_async()
+        return jsonify({"started": started, "pid": os.getpid(), **exporter.get_state()}), (202 if started else 409)
+    return jsonify({"pid": os.getpid(), **exporter.get_state()})
+
+@app.route('/health/live')
+def api_live():
+    """Liveness: the process is up and serving requests (no upstream checks)"""
+    return jsonify({
+        "alive": True,
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.monotonic() - _import_started, 1),
+        "probe_thread_alive": health.get_state()['probe_thread_alive']
+    })
+
+def ready_upstreams():
+    """Upstreams that gate readiness: only ones every tenant depends on.
+
+    Proses ini melayani semua tenant, jadi instance Green API satu tenant yang
+    mati (mis. HP logout) tidak boleh membuat load balancer mencabut proses.
+    'greenapi' berarti instance tenant default.
+    """
+    return [green_api_upstream(default_tenant) if name.strip() == 'greenapi' else name.strip()
+            for name in config.HEALTH_READY_UPSTREAMS if name.strip()]
+
+@app.route('/ready')
+@app.route('/health/ready')
+def api_ready():
+    """Readiness: 200 after warm-up, 503 while starting, draining, misconfigured or a required upstream is down.
+
+    Hanya membaca hasil probe yang di-cache - tidak pernah memanggil upstream.
+    """
+    unavailable = health.unavailable(ready_upstreams())
+    is_ready = ready.is_set() and drain.accepting() and not config_error and not unavailable
+    return jsonify({
+        "ready": is_ready,
+        "warming_up": not ready.is_set(),
+        "draining": drain.draining,
+        "config_error": config_error,
+        "unavailable_upstreams": unavailable,
+        # Upstream lain yang bermasalah (mis. instance satu tenant logout) - hanya detail, tidak membuat 503
+        "degraded_upstreams": [name for name in health.unavailable() if name not in unavailable],
+        "upstreams": health.get_state()['upstreams'],
+        "pid": os.getpid(),
+        **startup_timings
+    }), (200 if is_ready else 503)
+
 @app.route('/status')
 def status():
     """Status endpoint"""
@@ -636,9 +1402,81 @@ def status():
             "basic_badge": False
         },
         "green_api_configured": bool(GREEN_API_URL and GREEN_API_TOKEN and GREEN_API_INSTANCE),
-        "openrouter_configured": bool(OPENROUTER_API_KEY)
+        "openrouter_configured": bool(OPENROUTER_API_KEY),
+        "green_api": health.status(green_api_upstream(default_tenant)),
+        "openrouter": health.status('openrouter'),
+        "draining": drain.draining,
+        "drain_handler_installed": drain.signal_handler_installed,
+        "ready": ready.is_set(),
+        "config_error": config_error,
+        "startup": startup_timings,
+        "jobs": job_store.counts()
     })
 
+# ===== STARTUP =====
+
+# Thread background & koneksi upstream dimulai per proses worker, setelah fork
+# (aman untuk gunicorn --preload - lihat post_worker_init di gunicorn.conf.py)
+_background_pid = None
+_background_lock = threading.Lock()
+ready = threading.Event()
+startup_timings = {}
+
+def warm_up():
+    """Open upstream keep-alive connections and load caches before reporting ready"""
+    started = time.monotonic()
+    
+    for tenant in tenants.tenants.values():
+        tenant.knowledge_base.refresh(force=True)
+    
+    urls = {tenant.green_api_url for tenant in tenants.tenants.values() if tenant.green_api_url}
+    urls.add(OPENROUTER_BASE_URL.rsplit('/chat/', 1)[0] + "/models")
+    for url in urls:
+        try:
+            http_session.head(url, timeout=config.STARTUP_WARMUP_TIMEOUT)
+        except Exception as e:
+            # Gagal warm-up tidak fatal - koneksi akan dibuka saat request pertama
+            logger.warning(f"Warm-up connection to {url} failed: {str(e)}")
+    
+    startup_timings['warmup_seconds'] = round(time.monotonic() - started, 3)
+    metrics.set_gauge('startup.warmup_seconds', startup_timings['warmup_seconds'])
+
+def start_background():
+    """Start per-process background work: drain handler, job recovery, broadcasts, health probes, scheduler, exports, warm-up"""
+    global _background_pid
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+    
+    # Resume job yang belum selesai & drain in-flight saat SIGTERM
+    drain.install_signal_handler()
+    threading.Thread(target=job_recovery_loop, name="job-recovery", daemon=True).start()
+    broadcasts_manager.resume_all()
+    health.start()
+    scheduler.start()
+    exporter.start()
+    
+    def finish_startup():
+        if config.STARTUP_WARMUP:
+            warm_up()
+        ready.set()
+        startup_timings['ready_seconds'] = round(time.monotonic() - _import_started, 3)
+        logger.info(f"Worker {os.getpid()} ready in {startup_timings['ready_seconds']}s")
+    
+    ready.clear()
+    threading.Thread(target=finish_startup, name="warm-up", daemon=True).start()
+
+@app.before_request
+def ensure_background():
+    """Fallback for servers without the gunicorn hook: start background work on first request"""
+    if _background_pid != os.getpid():
+        start_background()
+
+startup_timings['import_seconds'] = round(time.monotonic() - _import_started, 3)
+metrics.set_gauge('startup.import_seconds', startup_timings['import_seconds'])
+logger.info(f"App imported in {startup_timings['import_seconds']}s")
+
 if __name__ == '__main__':
     required_vars = ['GREEN_API_URL', 'GREEN_API_TOKEN', 'GREEN_API_INSTANCE', 'OPENROUTER_API_KEY']
     missing_vars = [var for var in required_vars if not os.getenv(var)]
@@ -651,4 +1489,5 @@ if __name__ == '__main__':
         logger.info(f"Special users configured: {len(SPECIAL_USERS)}")
         logger.info(f"Banned users: {len(BANNED_USERS)}")
         logger.info("Privacy mode: VIP & Premium roles are hidden from users")
+        start_background()
         app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
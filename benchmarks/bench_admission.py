@@ -0,0 +1,94 @@
+"""Load test: tail latency with and without admission control.
+
+Simulasi upstream OpenRouter dengan kapasitas terbatas (CAPACITY request paralel,
+SERVICE_TIME detik per request). Beban yang ditawarkan melebihi kapasitas, sehingga
+tanpa admission control antrian dan latency terus bertambah.
+
+Usage: python benchmarks/bench_admission.py
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, MODE_SHED, MODE_REDUCED  # noqa: E402
+from metrics import Metrics  # noqa: E402
+
+CAPACITY = 4
+SERVICE_TIME = 0.05
+REQUESTS = 400
+ARRIVAL_INTERVAL = 0.005  # ~2.5x kapasitas upstream
+PROTECTED_SHARE = 0.1     # proporsi request admin/VIP
+
+
+def run(controller=None):
+    upstream = threading.Semaphore(CAPACITY)
+    results = Metrics(window=REQUESTS)
+    threads = []
+
+    def handle(priority):
+        start = time.monotonic()
+        service_time = SERVICE_TIME
+        admitted = controller.admit(priority) if controller else None
+        mode = admitted.mode if admitted else None
+        if mode == MODE_SHED:
+            results.incr('shed')
+        else:
+            if mode == MODE_REDUCED:
+                service_time *= controller.reduced_token_ratio
+                results.incr('reduced')
+            tracker = controller.track(admitted) if controller else None
+            if tracker:
+                tracker.__enter__()
+            try:
+                with upstream:
+                    time.sleep(service_time)
+            finally:
+                if tracker:
+                    tracker.__exit__(None, None, None)
+                    admitted.release()
+        latency = time.monotonic() - start
+        results.observe('all', latency)
+        if priority <= 2:
+            results.observe('protected', latency)
+
+    random.seed(42)
+    for _ in range(REQUESTS):
+        priority = 1 if random.random() < PROTECTED_SHARE else 4
+        thread = threading.Thread(target=handle, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(ARRIVAL_INTERVAL)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def report(name, results):
+    snapshot = results.snapshot()
+    print(f"\n== {name} ==")
+    for key in ('all', 'protected'):
+        summary = snapshot['summaries'].get(key, {})
+        print(f"{key:>10}: p50={summary.get('p50', 0):.3f}s p95={summary.get('p95', 0):.3f}s "
+              f"p99={summary.get('p99', 0):.3f}s max={summary.get('max', 0):.3f}s")
+    print(f"  shed={snapshot['counters'].get('shed', 0)} reduced={snapshot['counters'].get('reduced', 0)}")
+    return snapshot
+
+
+if __name__ == '__main__':
+    baseline = report("no admission control", run())
+    controller = AdmissionController(
+        max_inflight=CAPACITY * 2,
+        degrade_inflight=CAPACITY,
+        shed_latency=SERVICE_TIME * 6,
+        degrade_latency=SERVICE_TIME * 3,
+        protected_priority=2
+    )
+    shedding = report("admission control", run(controller))
+
+    bounded = shedding['summaries']['all']['p99'] < baseline['summaries']['all']['p99'] / 2
+    print(f"\ntail latency bounded: {'yes' if bounded else 'NO'}")
+    sys.exit(0 if bounded else 1)
@@ -0,0 +1,147 @@
+"""Benchmark analytics export: throughput, compression, memory and impact on live traffic.
+
+1. Throughput: job store berisi ROWS job selesai (USERS user, isi pesan
+   realistis dengan nomor & email) diekspor penuh. Diukur baris/detik,
+   MB/detik (JSON sebelum kompresi), rasio gzip dan puncak memori Python
+   (tracemalloc, run terpisah) untuk dua ukuran data - puncak memori harus
+   hampir sama.
+2. Live traffic: latency receive -> generated -> sent dari thread "webhook"
+   tanpa export vs selama export berjalan.
+3. Incremental: export kedua hanya mengambil job baru sejak watermark.
+
+Usage: python benchmarks/bench_export.py [rows]
+"""
+import os
+import gzip
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobstore import JobStore, STATE_SENT, STATE_FAILED  # noqa: E402
+from analytics import AnalyticsExporter  # noqa: E402
+from metrics import _percentile  # noqa: E402
+
+ROWS = 200_000
+USERS = 5000
+LIVE_MESSAGES = 2000
+ROLES = ('admin', 'vip', 'premium', 'basic', 'basic', 'basic')
+SOURCES = ('llm', 'llm', 'llm', 'kb', 'command', 'fallback')
+MESSAGES = ("Halo, bagaimana cara reset password akun saya? nomor saya 0812-3456-7890",
+            "Tolong jelaskan perbedaan paket premium dan basic",
+            "Email saya budi.santoso@example.com belum menerima invoice bulan ini",
+            "apa kabar")
+
+
+def fill(store: JobStore, rows: int, start_index: int = 0, since: float = 3600):
+    """Insert finished jobs (finished within the last `since` seconds) in bulk, one transaction per 10k rows"""
+    now = time.time() - since
+    batch = []
+    for index in range(start_index, start_index + rows):
+        created = now + (index - start_index) * min(0.001, (since - 5) / rows)
+        batch.append((f"job{index:09d}", 'default', f"62{random.randrange(USERS):010d}@c.us",
+                      random.choice(MESSAGES), STATE_FAILED if index % 50 == 0 else STATE_SENT,
+                      "Berikut penjelasannya: " + "lorem ipsum dolor sit amet " * random.randint(2, 20),
+                      random.choice(ROLES), random.choice(SOURCES), 'meta-llama/llama-3.2-3b-instruct:free',
+                      random.randint(50, 800), created, created + random.random() * 5))
+        if len(batch) == 10_000:
+            _insert(store, batch)
+            batch = []
+    if batch:
+        _insert(store, batch)
+
+
+def _insert(store: JobStore, batch):
+    with store._lock:
+        store._conn.execute("BEGIN")
+        store._conn.executemany(
+            "INSERT INTO jobs (id, tenant, chat_id, message, state, response, role, source, model, tokens, "
+            "attempts, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)", batch)
+        store._conn.execute("COMMIT")
+
+
+def bench_throughput(directory: str, rows: int):
+    store = JobStore(os.path.join(directory, f'jobs-{rows}.db'))
+    fill(store, rows)
+    exporter = AnalyticsExporter(store, os.path.join(directory, f'exports-{rows}'), settle_seconds=0)
+    manifest = exporter.run()
+
+    # Memori diukur di run terpisah (tracemalloc memperlambat export beberapa kali lipat)
+    tracemalloc.start()
+    AnalyticsExporter(store, os.path.join(directory, f'exports-{rows}-traced'), settle_seconds=0).run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    compressed = sum(f['bytes'] for f in manifest['files'])
+    raw = 0
+    for f in manifest['files']:
+        with gzip.open(os.path.join(exporter.directory, manifest['export'], f['name'])) as chunk:
+            while True:
+                data = chunk.read(1 << 20)
+                if not data:
+                    break
+                raw += len(data)
+    print(f"Export {manifest['turns']:,} turns / {manifest['users']:,} users in {manifest['seconds']:.2f}s: "
+          f"{manifest['rows_per_second']:,} rows/s, {raw / manifest['seconds'] / 1e6:.1f} MB/s JSON, "
+          f"gzip {raw / 1e6:.0f} MB -> {compressed / 1e6:.1f} MB ({raw / compressed:.1f}x), "
+          f"{len(manifest['files'])} files, peak memory {peak / 1e6:.1f} MB")
+    assert manifest['turns'] == rows
+    return store, exporter
+
+
+def live_latencies(store: JobStore, stop: threading.Event = None):
+    latencies = []
+    for index in range(LIVE_MESSAGES):
+        job_id = f"live{random.getrandbits(64):x}"
+        started = time.perf_counter()
+        store.receive(job_id, "628123@c.us", "pesan uji")
+        store.mark_generated(job_id, "balasan uji " * 20, 'basic', source='llm', tokens=100)
+        store.mark_sent(job_id)
+        latencies.append(time.perf_counter() - started)
+        if stop is not None and stop.is_set():
+            break
+    latencies.sort()
+    return latencies
+
+
+def bench_live(directory: str, rows: int):
+    store = JobStore(os.path.join(directory, 'jobs-live.db'))
+    fill(store, rows)
+    idle = live_latencies(store)
+
+    exporter = AnalyticsExporter(store, os.path.join(directory, 'exports-live'), settle_seconds=0)
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (exporter.run(), done.set()))
+    thread.start()
+    during = live_latencies(store, done)
+    thread.join()
+
+    for name, latencies in (('idle', idle), ('during export', during)):
+        print(f"Live receive+generated+sent ({name}, {len(latencies)} msgs): "
+              f"p50 {_percentile(latencies, 50) * 1000:.2f} ms, p99 {_percentile(latencies, 99) * 1000:.2f} ms, "
+              f"max {latencies[-1] * 1000:.1f} ms")
+
+
+def bench_incremental(store: JobStore, exporter: AnalyticsExporter, rows: int):
+    fill(store, 1000, start_index=rows, since=10)
+    manifest = exporter.run()
+    print(f"Incremental: {manifest['turns']:,} new turns exported in {manifest['seconds'] * 1000:.0f} ms")
+    assert manifest['turns'] == 1000
+
+
+def main():
+    random.seed(42)
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    with tempfile.TemporaryDirectory() as directory:
+        bench_throughput(directory, rows // 10)
+        store, exporter = bench_throughput(directory, rows)
+        bench_incremental(store, exporter, rows)
+        bench_live(directory, rows // 4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark knowledge base: query latency, incremental rebuild, LLM-call reduction.
+
+Corpus sintetis berisi ENTRIES FAQ. Separuh query adalah parafrase pertanyaan FAQ
+(subset kata, urutan diacak), separuh lagi pertanyaan umum di luar FAQ.
+
+Usage: python benchmarks/bench_knowledge.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge import KnowledgeBase  # noqa: E402
+from metrics import _percentile  # noqa: E402
+
+ENTRIES = 5000
+QUERIES = 2000
+VOCAB = [f"kata{i}" for i in range(20000)]
+OFF_TOPIC = [f"umum{i}" for i in range(5000)]
+
+
+def build_corpus(rng):
+    entries = []
+    for _ in range(ENTRIES):
+        question = rng.sample(VOCAB, 6)
+        answer = rng.sample(VOCAB, 25)
+        entries.append((question, answer))
+    return entries
+
+
+def to_text(entries):
+    return "\n\n".join(f"Q: {' '.join(q)}\nA: {' '.join(a)}" for q, a in entries)
+
+
+def main():
+    rng = random.Random(7)
+    entries = build_corpus(rng)
+    text = to_text(entries)
+
+    kb = KnowledgeBase()
+    start = time.perf_counter()
+    kb.load_text(text)
+    build_time = time.perf_counter() - start
+
+    # Incremental: ubah satu blok saja
+    entries[0] = (rng.sample(VOCAB, 6), rng.sample(VOCAB, 25))
+    start = time.perf_counter()
+    added, removed = kb.load_text(to_text(entries))
+    incremental_time = time.perf_counter() - start
+
+    latencies, direct, correct, faq_queries = [], 0, 0, 0
+    for _ in range(QUERIES):
+        if rng.random() < 0.5:
+            index = rng.randrange(ENTRIES)
+            words = rng.sample(entries[index][0], 4)
+            faq_queries += 1
+        else:
+            index = None
+            words = rng.sample(OFF_TOPIC, 3) + rng.sample(VOCAB, 1)
+        query = ' '.join(words)
+
+        start = time.perf_counter()
+        answer = kb.answer(query)
+        if answer is None:
+            kb.context(query)
+        latencies.append(time.perf_counter() - start)
+
+        if answer is not None:
+            direct += 1
+            if index is not None and answer == ' '.join(entries[index][1]):
+                correct += 1
+
+    latencies.sort()
+    print(f"entries={len(kb.documents)} terms={len(kb.postings)}")
+    print(f"full build: {build_time * 1000:.1f} ms")
+    print(f"incremental rebuild (+{added} -{removed}): {incremental_time * 1000:.1f} ms")
+    print(f"query latency: p50={_percentile(latencies, 50) * 1e6:.0f}us "
+          f"p99={_percentile(latencies, 99) * 1e6:.0f}us")
+    print(f"LLM calls avoided: {direct}/{QUERIES} ({direct / QUERIES:.1%}), "
+          f"FAQ queries answered correctly: {correct}/{faq_queries}")
+
+
+if __name__ == '__main__':
+    main()
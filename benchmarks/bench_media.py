@@ -0,0 +1,108 @@
+"""Benchmark media pipeline: memory ceiling under concurrent large downloads.
+
+Server HTTP lokal mengirim FILES file berukuran FILE_MB (dibangkitkan per chunk,
+tidak disimpan di memori). Semua file di-submit sekaligus ke MediaPipeline dengan
+WORKERS thread; puncak alokasi Python (tracemalloc) dan RSS dibandingkan dengan
+total ukuran file. Juga memeriksa batas ukuran file dan dedupe SHA-256.
+
+Usage: python benchmarks/bench_media.py
+"""
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_pool import create_session  # noqa: E402
+from media import MediaPipeline, MediaSpool, MediaTooLarge  # noqa: E402
+
+FILES = 16
+FILE_MB = 32
+WORKERS = 4
+CHUNK = 64 * 1024
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # /<seed>/<size_mb>: konten deterministik per seed (seed sama = file sama)
+        _, seed, size_mb = self.path.split('/')
+        size = int(size_mb) * 1024 * 1024
+        block = (seed.encode() * (CHUNK // len(seed) + 1))[:CHUNK]
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        try:
+            for _ in range(size // CHUNK):
+                self.wfile.write(block)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client membatalkan download (batas ukuran)
+
+    def log_message(self, *args):
+        pass
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    with tempfile.TemporaryDirectory() as directory:
+        spool = MediaSpool(directory, max_file_bytes=(FILE_MB + 1) * 1024 * 1024,
+                           max_total_bytes=FILES * FILE_MB * 1024 * 1024, chunk_size=CHUNK)
+        pipeline = MediaPipeline(spool, create_session(WORKERS), workers=WORKERS, queue_size=FILES)
+        results, errors = [], []
+        done = threading.Semaphore(0)
+
+        def task(url):
+            try:
+                # Langsung ke spool: server lokal http tidak lolos allowlist host ingest()
+                results.append(pipeline.spool.download(url, pipeline.session, pipeline.timeout))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                done.release()
+
+        rss_before = rss_mb()
+        tracemalloc.start()
+        start = time.perf_counter()
+        # Separuh file punya konten yang sama (seed berulang) untuk menguji dedupe
+        for i in range(FILES):
+            assert pipeline.submit(task, f"{base}/seed{i % (FILES // 2)}/{FILE_MB}")
+        for _ in range(FILES):
+            done.acquire()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        total_mb = FILES * FILE_MB
+        duplicates = sum(1 for result in results if result.duplicate)
+        print(f"Downloaded {len(results)} x {FILE_MB} MB ({total_mb} MB) with {WORKERS} workers "
+              f"in {elapsed:.1f}s ({total_mb / elapsed:.0f} MB/s), errors: {len(errors)}")
+        print(f"Peak Python allocations: {peak / 1024 / 1024:.1f} MB "
+              f"({peak / (total_mb * 1024 * 1024):.2%} of downloaded bytes)")
+        print(f"Max RSS growth: {rss_mb() - rss_before:.1f} MB")
+        print(f"Duplicates detected: {duplicates}, files in spool: {len(os.listdir(directory))}, "
+              f"spool bytes: {spool.total_bytes / 1024 / 1024:.0f} MB")
+
+        small = MediaSpool(directory, max_file_bytes=FILE_MB * 1024 * 1024 // 2, chunk_size=CHUNK)
+        try:
+            small.download(f"{base}/big/{FILE_MB}", pipeline.session, 30)
+            print("Size cap: NOT enforced")
+        except MediaTooLarge as e:
+            print(f"Size cap enforced: {e}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
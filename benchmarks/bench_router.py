@@ -0,0 +1,87 @@
+"""Benchmark model router: routing overhead and simulated latency per A/B arm.
+
+Campuran pesan sintetis (sapaan, pertanyaan singkat, pertanyaan panjang/kode) dikirim
+dari banyak chat. Setengah chat masuk arm "control" (selalu model default role),
+setengah lagi arm "routed". Latency upstream disimulasikan: model cepat
+FAST_BASE + FAST_PER_TOKEN per token, model default DEFAULT_BASE + DEFAULT_PER_TOKEN.
+
+Usage: python benchmarks/bench_router.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import ModelRouter, ARM_CONTROL, ARM_ROUTED, TIER_FAST  # noqa: E402
+from metrics import _percentile  # noqa: E402
+
+MESSAGES = 20000
+CHATS = 2000
+FAST_BASE, FAST_PER_TOKEN = 0.3, 0.004
+DEFAULT_BASE, DEFAULT_PER_TOKEN = 1.2, 0.012
+
+SAMPLES = [
+    "halo", "pagi kak", "terima kasih", "ok sip", "hi",
+    "apa itu python?", "siapa presiden pertama indonesia?", "berapa harga paket premium?",
+    "kapan toko buka?", "lagi apa kamu",
+    "jelaskan bagaimana cara kerja jaringan saraf tiruan secara detail beserta contohnya",
+    "bandingkan kelebihan dan kekurangan postgres dan mysql untuk aplikasi skala besar",
+    "kenapa kode ini error: ```def f(x): return x +```",
+    "buatkan rencana belajar pemrograman selama tiga bulan untuk pemula yang sibuk bekerja",
+]
+
+USER_CONFIG = {
+    "role": "basic",
+    "ai_model": "default-model",
+    "max_tokens": 250,
+    "routing": {
+        "fast_model": "fast-model",
+        "fast_types": ["greeting", "chat", "factual"],
+        "fast_max_words": 20,
+        "fast_max_tokens": 200,
+        "max_fast_depth": 5
+    }
+}
+
+
+def simulated_latency(route, rng):
+    # Jawaban sapaan/pertanyaan singkat jauh lebih pendek dari max_tokens
+    tokens = min(route.max_tokens, int(rng.uniform(0.2, 0.6) * route.max_tokens))
+    if route.tier == TIER_FAST:
+        return FAST_BASE + FAST_PER_TOKEN * tokens, tokens
+    return DEFAULT_BASE + DEFAULT_PER_TOKEN * tokens, tokens
+
+
+def main():
+    rng = random.Random(3)
+    router = ModelRouter(control_share=0.5)
+    latencies = {ARM_CONTROL: [], ARM_ROUTED: []}
+    fast = 0
+    overhead = 0.0
+
+    for _ in range(MESSAGES):
+        chat = f"default:62{rng.randrange(CHATS):010d}@c.us"
+        text = rng.choice(SAMPLES)
+        start = time.perf_counter()
+        route = router.route(text, chat, USER_CONFIG, USER_CONFIG["max_tokens"])
+        overhead += time.perf_counter() - start
+
+        latency, tokens = simulated_latency(route, rng)
+        router.record(route, latency, tokens)
+        latencies[route.arm].append(latency)
+        fast += route.tier == TIER_FAST
+
+    print(f"Routing overhead: {overhead / MESSAGES * 1e6:.1f} us/message")
+    print(f"Routed to fast model: {fast / len(latencies[ARM_ROUTED]):.0%} of routed arm")
+    for arm, values in latencies.items():
+        values.sort()
+        print(f"{arm:8s} n={len(values):5d} avg={sum(values) / len(values):.2f}s "
+              f"p50={_percentile(values, 50):.2f}s p95={_percentile(values, 95):.2f}s")
+    for arm, stats in router.get_state()['arms'].items():
+        print(f"{arm:8s} avg_tokens={stats['avg_tokens']} error_rate={stats['error_rate']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark scheduler: timer wheel density, store throughput and firing jitter.
+
+1. Density: WHEEL_ENTRIES entry tersebar acak dalam WHEEL_SPAN_DAYS hari dimasukkan
+   ke TimerWheel (tick 1 detik), lalu wheel dijalankan sampai habis. Diukur
+   kecepatan insert, memori per entry, dan biaya fire (termasuk cascade).
+2. Store: STORE_ROWS baris ke SQLite (WAL) dan waktu query horizon 1 jam.
+3. Jitter: Scheduler sungguhan dengan JITTER_SENDS pesan jatuh tempo dalam
+   beberapa detik ke depan; selisih waktu kirim vs jatuh tempo per tick.
+
+Usage: python benchmarks/bench_scheduler.py [wheel_entries]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import TimerWheel, ScheduleStore, Scheduler  # noqa: E402
+from metrics import _percentile  # noqa: E402
+
+WHEEL_ENTRIES = 1_000_000
+WHEEL_SPAN_DAYS = 30
+STORE_ROWS = 100_000
+JITTER_SENDS = 2000
+JITTER_WINDOW = 3.0
+
+
+def bench_wheel(entries: int):
+    start = 1_700_000_000.0
+    span = WHEEL_SPAN_DAYS * 86400
+    dues = [start + random.random() * span for _ in range(entries)]
+
+    tracemalloc.start()
+    wheel = TimerWheel(1.0, start=start)
+    t0 = time.perf_counter()
+    for index, due in enumerate(dues):
+        wheel.add(due, index)
+    insert_seconds = time.perf_counter() - t0
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    fired = 0
+    worst_tick = 0.0
+    now = start
+    # Maju per jam simulasi (3600 tick per advance)
+    while now < start + span + 3600:
+        now += 3600
+        tick_started = time.perf_counter()
+        fired += len(wheel.advance(now))
+        worst_tick = max(worst_tick, time.perf_counter() - tick_started)
+    fire_seconds = time.perf_counter() - t0
+
+    print(f"Wheel: {entries:,} entries over {WHEEL_SPAN_DAYS} days")
+    print(f"  insert: {entries / insert_seconds:,.0f}/s ({insert_seconds / entries * 1e6:.2f} us/entry), "
+          f"memory {memory / entries:.0f} B/entry ({memory / 1024 / 1024:.0f} MB)")
+    print(f"  fire:   {fired:,} fired, {fired / fire_seconds:,.0f}/s incl. cascades, "
+          f"{span:,} ticks, worst simulated hour {worst_tick * 1000:.1f} ms")
+    assert fired == entries, f"lost {entries - fired} entries"
+
+
+def bench_store(directory: str):
+    store = ScheduleStore(os.path.join(directory, 'schedule.db'))
+    now = time.time()
+    t0 = time.perf_counter()
+    for index in range(STORE_ROWS):
+        store.add(f"id{index}", f"62{index}@c.us", "⏰ Pengingat", now + random.random() * WHEEL_SPAN_DAYS * 86400)
+    insert_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    rows = store.due_between(now, now + 3600)
+    query_seconds = time.perf_counter() - t0
+    print(f"Store: {STORE_ROWS:,} rows inserted at {STORE_ROWS / insert_seconds:,.0f}/s, "
+          f"1h horizon query {query_seconds * 1000:.1f} ms ({len(rows)} rows)")
+
+
+def bench_jitter(directory: str, tick: float):
+    store = ScheduleStore(os.path.join(directory, f'jitter-{tick}.db'))
+    delays = []
+    done = threading.Event()
+
+    def send(entry):
+        delays.append(time.time() - entry['due_at'])
+        if len(delays) == JITTER_SENDS:
+            done.set()
+        return True
+
+    scheduler = Scheduler(store, send, tick=tick, horizon=3600, load_interval=30)
+    scheduler.start()
+    time.sleep(0.1)
+    now = time.time()
+    for index in range(JITTER_SENDS):
+        scheduler.schedule(f"62{index}@c.us", "⏰ Pengingat", now + 0.5 + random.random() * JITTER_WINDOW)
+    done.wait(JITTER_WINDOW + 10 * tick + 10)
+    scheduler.stop()
+
+    delays.sort()
+    print(f"Jitter (tick {tick * 1000:.0f} ms, {len(delays)} sends): "
+          f"p50 {_percentile(delays, 50) * 1000:.1f} ms, p99 {_percentile(delays, 99) * 1000:.1f} ms, "
+          f"max {delays[-1] * 1000:.1f} ms, early {sum(1 for delay in delays if delay < 0)}")
+
+
+def main():
+    random.seed(42)
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else WHEEL_ENTRIES
+    bench_wheel(entries)
+    with tempfile.TemporaryDirectory() as directory:
+        bench_store(directory)
+        for tick in (0.05, 1.0):
+            bench_jitter(directory, tick)
+
+
+if __name__ == '__main__':
+    main()
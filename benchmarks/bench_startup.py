@@ -0,0 +1,65 @@
+"""Startup-time benchmark: cold import of app.py in a fresh interpreter.
+
+Mengukur waktu import app (tanpa warm-up) dan memastikan dependensi berat
+(openai/aiohttp) tidak ikut di-import saat startup. Import juga dicoba tanpa
+environment variable untuk memastikan startup tetap fail-soft.
+Exit code 1 jika median melewati BUDGET_SECONDS (guard regresi di CI).
+
+Usage: python benchmarks/bench_startup.py [runs] [budget_seconds]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("openai", "aiohttp")
+
+PROBE = f"""
+import json, sys, time
+sys.path.insert(0, {ROOT!r})
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules],
+                  "config_error": app.config_error}}))
+"""
+
+
+def probe(env, cwd):
+    output = subprocess.run([sys.executable, "-c", PROBE], env=env, cwd=cwd, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    base_env = {key: value for key, value in os.environ.items()
+                if key not in ("GREEN_API_TOKEN", "GREEN_API_INSTANCE", "OPENROUTER_API_KEY")}
+    env = dict(base_env, GREEN_API_TOKEN="x", GREEN_API_INSTANCE="1", OPENROUTER_API_KEY="k",
+               STARTUP_WARMUP="False")
+
+    with tempfile.TemporaryDirectory() as cwd:
+        results = [probe(env, cwd) for _ in range(runs)]
+        missing = probe(dict(base_env, STARTUP_WARMUP="False"), cwd)
+
+    times = sorted(result["seconds"] for result in results)
+    median = statistics.median(times)
+    loaded = sorted({module for result in results for module in result["loaded"]})
+
+    print(f"Import app: median {median * 1000:.0f}ms, min {times[0] * 1000:.0f}ms, "
+          f"max {times[-1] * 1000:.0f}ms ({runs} runs, budget {budget * 1000:.0f}ms)")
+    print(f"Lazy modules imported at startup: {', '.join(loaded) or 'none'}")
+    print(f"Startup without env vars: ok ({missing['config_error']})")
+
+    if median > budget or loaded:
+        print("FAIL: startup regression")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark memory per tenant: multi-tenant in one process vs one process per bot.
+
+- Multi-tenant: tracemalloc selisih memori setelah menambah TENANTS tenant
+  (role table, prompt, kuota) yang berbagi pool HTTP, worker dan knowledge base.
+- Separate process: RSS maksimum satu proses `import app` (deployment app.py terpisah).
+
+Usage: python benchmarks/bench_tenants.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TENANTS = 200
+ENV = {
+    'GREEN_API_TOKEN': 'bench',
+    'GREEN_API_INSTANCE': '1100000000',
+    'OPENROUTER_API_KEY': 'bench',
+    'JOB_STORE_PATH': ':memory:',
+}
+
+
+def separate_process_rss() -> float:
+    """Max RSS (MB) of a single-tenant app.py process"""
+    code = "import resource, app; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    env = {**os.environ, **ENV}
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return int(out.strip().splitlines()[-1]) / 1024
+
+
+def multi_tenant_per_tenant() -> float:
+    """Memory (KB) added per tenant in one process"""
+    os.environ.update(ENV)
+    from tenants import Tenant, TenantRegistry
+
+    base_roles = {
+        role: {"ai_model": "meta-llama/llama-3.1-8b-instruct:free", "max_tokens": 250,
+               "temperature": 0.6, "priority": priority, "features": ["basic_ai"], "show_badge": False}
+        for priority, role in enumerate(["admin", "vip", "premium", "basic"], 1)
+    }
+    base_prompts = {role: "Kamu adalah asisten AI yang membantu. " * 20 for role in base_roles}
+
+    default = Tenant("default", "https://api.green-api.com", "1", "token", "key", {}, set(),
+                     base_roles, base_prompts, os.path.join(ROOT, 'knowledge_base.txt'))
+    registry = TenantRegistry(default)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump({"tenants": [
+            {"id": f"t{i}", "green_api_instance": str(1100000001 + i), "green_api_token": f"token{i}",
+             "special_users": {f"62812000{i:05d}@c.us": "admin"},
+             "system_prompts": {"basic": f"Persona tenant {i}. " * 20},
+             "knowledge_base_file": os.path.join(ROOT, 'knowledge_base.txt')}
+            for i in range(TENANTS)
+        ]}, f)
+        path = f.name
+
+    try:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        registry.load_file(path, base_roles, base_prompts)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+    finally:
+        os.unlink(path)
+
+    added = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return added / TENANTS / 1024
+
+
+def main():
+    per_tenant_kb = multi_tenant_per_tenant()
+    print(f"multi-tenant: {per_tenant_kb:.1f} KB per additional tenant ({TENANTS} tenants)")
+    try:
+        rss_mb = separate_process_rss()
+        print(f"separate process: {rss_mb:.1f} MB RSS per bot (python + Flask + app.py)")
+        print(f"ratio: ~{rss_mb * 1024 / per_tenant_kb:.0f}x less memory per tenant in multi-tenant mode")
+    except (subprocess.CalledProcessError, ValueError) as e:
+        print(f"separate process: could not start app.py ({e})")
+
+
+if __name__ == '__main__':
+    main()
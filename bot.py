@@ -1,15 +1,30 @@
 import requests
-import openai
 import logging
-import time
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Optional
 from config import Config
+from timeouts import timeouts
+from tracing import tracer
+from http_pool import session as http_session
+from media import media_prompt
+from prefilter import WebhookPreFilter
+from tenants import get_knowledge_base
+from pipeline import Pipeline, MessageContext, RateLimiter, build_message_pipeline
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_openai = None
+
+def get_openai(api_key: str = None):
+    """Import the openai SDK on first use (it pulls in aiohttp and adds ~150ms to startup)"""
+    global _openai
+    if _openai is None:
+        import openai
+        _openai = openai
+    if api_key:
+        _openai.api_key = api_key
+    return _openai
+
 class WhatsAppBot:
     """Main WhatsApp Bot Class"""
     
@@ -17,7 +32,10 @@ class WhatsAppBot:
         self.config = config or Config()
         self.message_history: Dict[str, List] = {}
         self.user_stats: Dict[str, Dict] = {}
-        self.rate_limiter: Dict[str, List] = {}
+        self.rate_limiter = RateLimiter(self.config.MAX_MESSAGES_PER_MINUTE)
+        self.prefilter = WebhookPreFilter(self.config.GROUP_COMMAND_PREFIXES)
+        self.knowledge_base = get_knowledge_base(self.config.KNOWLEDGE_BASE_FILE)
+        self.pipeline = self.build_pipeline()
         
         # Validate configuration
         try:
@@ -27,29 +45,11 @@ class WhatsAppBot:
             logger.error(f"Configuration error: {e}")
             raise
         
-        # Setup OpenAI
-        openai.api_key = self.config.OPENROUTER_API_KEY
-        
         logger.info(f"WhatsApp Bot initialized: {self.config.BOT_NAME}")
     
     def is_rate_limited(self, user_id: str) -> bool:
         """Check if user is rate limited"""
-        current_time = time.time()
-        user_messages = self.rate_limiter.get(user_id, [])
-        
-        # Remove old messages (older than 1 minute)
-        user_messages = [msg_time for msg_time in user_messages if current_time - msg_time < 60]
-        self.rate_limiter[user_id] = user_messages
-        
-        # Check rate limit
-        if len(user_messages) >= self.config.MAX_MESSAGES_PER_MINUTE:
-            return True
-        
-        # Add current message time
-        user_messages.append(current_time)
-        self.rate_limiter[user_id] = user_messages
-        
-        return False
+        return self.rate_limiter.hit(user_id)
     
     def update_user_stats(self, user_id: str, message: str, response: str):
         """Update user statistics"""
@@ -66,8 +66,11 @@ class WhatsAppBot:
         stats['message_count'] += 1
         stats['total_tokens_used'] += len(message.split()) + len(response.split())
         
-    def get_ai_response(self, user_message: str, user_id: str = None) -> str:
-        """Get response from OpenAI"""
+    def get_ai_response(self, user_message: str, user_id: str = None, usage: Dict = None) -> str:
+        """Get response from OpenAI (usage dict, if given, receives the answer source)"""
+        openai = get_openai(self.config.OPENROUTER_API_KEY)
+        usage = usage if usage is not None else {}
+        usage['source'] = 'command'
         try:
             # Check for specific commands
             if user_message.lower().startswith('/help'):
@@ -79,6 +82,8 @@ class WhatsAppBot:
             if user_message.lower().startswith('/stats') and user_id:
                 return self.get_user_stats(user_id)
             
+            usage['source'] = 'error'
+            
             # Get conversation history for context
             context_messages = self.get_conversation_context(user_id)
             
@@ -86,22 +91,19 @@ class WhatsAppBot:
             context_messages.append({"role": "user", "content": user_message})
             
             # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model=self.config.OPENAI_MODEL,
-                messages=context_messages,
-                max_tokens=self.config.OPENAI_MAX_TOKENS,
-                temperature=self.config.OPENAI_TEMPERATURE
-            )
+            with tracer.span('openai.chat', kind='CLIENT', remote='openai', model=self.config.OPENAI_MODEL), \
+                    timeouts.track('openai', self.config.OPENAI_MODEL, self.config.OPENAI_MAX_TOKENS) as timeout:
+                response = openai.ChatCompletion.create(
+                    model=self.config.OPENAI_MODEL,
+                    messages=context_messages,
+                    max_tokens=self.config.OPENAI_MAX_TOKENS,
+                    temperature=self.config.OPENAI_TEMPERATURE,
+                    request_timeout=timeout
+                )
             
             ai_response = response.choices[0].message.content.strip()
-            
-            # Update conversation history
-            self.update_conversation_history(user_id, user_message, ai_response)
-            
-            # Update user statistics
-            if user_id:
-                self.update_user_stats(user_id, user_message, ai_response)
-            
+            # History & statistik dicatat oleh stage history
+            usage['source'] = 'llm'
             return ai_response
             
         except openai.error.RateLimitError:
@@ -164,7 +166,12 @@ class WhatsAppBot:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            with tracer.span('greenapi.sendMessage', kind='CLIENT', remote='greenapi') as span, \
+                    timeouts.track('greenapi', 'sendMessage') as timeout:
+                response = http_session.post(url, json=payload, headers=headers, timeout=timeout)
+                span.tag('http.status_code', response.status_code)
+                if response.status_code != 200:
+                    span.set_error(f"HTTP {response.status_code}")
             
             if response.status_code == 200:
                 logger.info(f"Message sent successfully to {chat_id}")
@@ -183,57 +190,60 @@ class WhatsAppBot:
             logger.error(f"Error sending message: {str(e)}")
             return False
     
+    def build_pipeline(self) -> Pipeline:
+        """Message pipeline for this bot: the shared stages (prefilter, group filter, KB answers) plus
+        OpenAI generation and history"""
+        return build_message_pipeline(
+            self._stage_generate, self._stage_deliver,
+            bot_sender=lambda ctx: self.config.GREEN_API_INSTANCE,
+            notify=lambda ctx, message: self.send_message(ctx.chat_id, message),
+            is_limited=self.is_rate_limited,
+            auth=self._stage_auth,
+            knowledge_base=lambda ctx: self.knowledge_base,
+            kb_confidence=self.config.KB_DIRECT_CONFIDENCE,
+            history=self._stage_history,
+            prefilter=self.prefilter, body_key='body', name="bot")
+    
+    def _stage_auth(self, ctx: MessageContext) -> Optional[Dict]:
+        # Check if user is allowed
+        if not self.config.is_user_allowed(ctx.chat_id):
+            return {"status": "ignored", "reason": "user not allowed"}
+        return None
+    
+    def _stage_generate(self, ctx: MessageContext) -> Optional[Dict]:
+        if ctx.response is not None:
+            # Sudah dijawab knowledge base (stage cache)
+            return None
+        if ctx.is_media:
+            # Media dijawab dari caption & metadata (download ada di pipeline media app.py)
+            ctx.text = media_prompt(ctx.message_data)
+        logger.info(f"Processing message from {ctx.sender_name} ({ctx.chat_id}): {ctx.text}")
+        ctx.response = self.get_ai_response(ctx.text, ctx.chat_id, ctx.usage)
+        return None
+    
+    def _stage_history(self, ctx: MessageContext) -> Optional[Dict]:
+        # Hanya jawaban LLM yang masuk konteks percakapan & statistik (bukan command/error)
+        if ctx.usage.get('source') == 'llm':
+            self.update_conversation_history(ctx.chat_id, ctx.text, ctx.response)
+            if ctx.chat_id:
+                self.update_user_stats(ctx.chat_id, ctx.text, ctx.response)
+        return None
+    
+    def _stage_deliver(self, ctx: MessageContext) -> Optional[Dict]:
+        if self.send_message(ctx.chat_id, ctx.response):
+            return {
+                "status": "success",
+                "chat_id": ctx.chat_id,
+                "user_message": ctx.text,
+                "bot_response": ctx.response
+            }
+        return {"status": "error", "reason": "failed to send response"}
+    
     def process_message(self, webhook_data: Dict) -> Dict:
         """Process incoming webhook message"""
         try:
-            webhook_body = webhook_data.get('body', {})
-            
-            # Check if it's an incoming message
-            if (webhook_body.get('typeWebhook') != 'incomingMessageReceived' or 
-                webhook_body.get('messageData', {}).get('typeMessage') != 'textMessage'):
-                return {"status": "ignored", "reason": "not a text message"}
-            
-            # Extract message details
-            sender_data = webhook_body.get('senderData', {})
-            message_data = webhook_body.get('messageData', {})
-            
-            chat_id = sender_data.get('chatId')
-            sender_name = sender_data.get('senderName', 'Unknown')
-            user_message = message_data.get('textMessageData', {}).get('textMessage', '')
-            
-            # Skip empty messages
-            if not user_message.strip():
-                return {"status": "ignored", "reason": "empty message"}
-            
-            # Skip bot's own messages
-            if sender_data.get('sender') == self.config.GREEN_API_INSTANCE:
-                return {"status": "ignored", "reason": "bot message"}
-            
-            # Check if user is allowed
-            if not self.config.is_user_allowed(chat_id):
-                return {"status": "ignored", "reason": "user not allowed"}
-            
-            # Check rate limiting
-            if self.is_rate_limited(chat_id):
-                self.send_message(chat_id, "Anda mengirim pesan terlalu cepat. Silakan tunggu sebentar.")
-                return {"status": "rate_limited"}
-            
-            logger.info(f"Processing message from {sender_name} ({chat_id}): {user_message}")
-            
-            # Get AI response
-            ai_response = self.get_ai_response(user_message, chat_id)
-            
-            # Send response
-            if self.send_message(chat_id, ai_response):
-                return {
-                    "status": "success",
-                    "chat_id": chat_id,
-                    "user_message": user_message,
-                    "bot_response": ai_response
-                }
-            else:
-                return {"status": "error", "reason": "failed to send response"}
-                
+            with tracer.trace('bot.process_message'):
+                return self.pipeline.run(MessageContext(data=webhook_data))
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
             return {"status": "error", "reason": str(e)}
@@ -0,0 +1,415 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import logging
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STATE_RUNNING = "running"
+STATE_STOPPED = "stopped"
+STATE_DONE = "done"
+
+
+class SendThrottle:
+    """Token bucket shared by interactive and bulk sends of one Green API instance.
+
+    Pesan interaktif tidak pernah diblok (hanya mengurangi token). Pesan bulk
+    hanya boleh mengambil token jika sisa token di atas cadangan interaktif,
+    dan dibatasi maksimal (1 - reserved_share) dari rate.
+
+    Bucket ini per proses: dengan beberapa worker gunicorn rate dan burst dibagi
+    workers supaya total semua worker tetap dalam limit instance Green API.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: float = 5.0, reserved_share: float = 0.3, workers: int = 1):
+        if not 0 <= reserved_share < 1:
+            raise ValueError(f"reserved_share must be >= 0 and < 1, got {reserved_share}")
+        workers = max(1, workers)
+        self.rate = rate / workers
+        self.burst = max(1.0, burst / workers)
+        self.reserved_share = reserved_share
+        self.tokens = burst
+        self.bulk_tokens = 1.0
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.bulk_tokens = min(1.0, self.bulk_tokens + elapsed * self.rate * (1 - self.reserved_share))
+
+    def consume_interactive(self):
+        """Account for one interactive send (never blocks)"""
+        with self._cond:
+            self._refill()
+            self.tokens -= 1
+
+    def acquire_bulk(self, stop: threading.Event) -> bool:
+        """Wait for a bulk send slot. Returns False if stop was set while waiting"""
+        reserve = self.reserved_share * self.burst
+        while not stop.is_set():
+            with self._cond:
+                self._refill()
+                if self.tokens >= 1 + reserve and self.bulk_tokens >= 1:
+                    self.tokens -= 1
+                    self.bulk_tokens -= 1
+                    return True
+                deficit = max(1 + reserve - self.tokens, (1 - self.bulk_tokens) / (1 - self.reserved_share))
+            stop.wait(min(1.0, max(0.01, deficit / self.rate)))
+        return False
+
+
+def normalize_chat_id(value: str) -> Optional[str]:
+    """Turn a phone number or chat id line into a chat id"""
+    value = value.strip()
+    if not value or value.startswith('#'):
+        return None
+    if '@' in value:
+        return value
+    digits = ''.join(ch for ch in value if ch.isdigit())
+    return f"{digits}@c.us" if digits else None
+
+
+class Broadcast:
+    """One broadcast job with a persistent checkpoint"""
+
+    def __init__(self, broadcast_id: str, tenant_id: str, source: str, message: str,
+                 requested_by: str, total: int = 0):
+        self.broadcast_id = broadcast_id
+        self.tenant_id = tenant_id
+        self.source = source
+        self.message = message
+        self.requested_by = requested_by
+        self.total = total
+        self.offset = 0
+        self.sent = 0
+        self.failed = 0
+        self.state = STATE_RUNNING
+        self.started_at = time.time()
+        self.run_started_at = time.time()
+        self.run_start_offset = 0
+        self.stop_event = threading.Event()
+
+    def to_dict(self) -> Dict:
+        return {
+            'broadcast_id': self.broadcast_id,
+            'tenant_id': self.tenant_id,
+            'source': self.source,
+            'message': self.message,
+            'requested_by': self.requested_by,
+            'total': self.total,
+            'offset': self.offset,
+            'sent': self.sent,
+            'failed': self.failed,
+            'state': self.state,
+            'started_at': self.started_at,
+            'run_started_at': self.run_started_at,
+            'run_start_offset': self.run_start_offset
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Broadcast':
+        broadcast = cls(data['broadcast_id'], data['tenant_id'], data['source'], data['message'],
+                        data['requested_by'], data.get('total', 0))
+        broadcast.offset = data.get('offset', 0)
+        broadcast.sent = data.get('sent', 0)
+        broadcast.failed = data.get('failed', 0)
+        broadcast.state = data.get('state', STATE_RUNNING)
+        broadcast.started_at = data.get('started_at', time.time())
+        broadcast.run_started_at = data.get('run_started_at', broadcast.started_at)
+        broadcast.run_start_offset = data.get('run_start_offset', 0)
+        return broadcast
+
+    def rate(self) -> float:
+        """Observed send rate (recipients/second) of the current run"""
+        elapsed = time.time() - self.run_started_at
+        done = self.offset - self.run_start_offset
+        return done / elapsed if elapsed > 0 and done > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        """Estimated seconds remaining"""
+        rate = self.rate()
+        if not rate or not self.total:
+            return None
+        return max(0, self.total - self.offset) / rate
+
+    def progress_text(self) -> str:
+        """Progress summary for admin replies"""
+        eta = self.eta()
+        eta_text = f"{eta / 60:.1f} menit" if eta is not None else "menghitung..."
+        percent = f" ({self.offset / self.total:.0%})" if self.total else ""
+        return (f"📣 Broadcast {self.broadcast_id} [{self.state}]\n"
+                f"• Sumber: {self.source}\n"
+                f"• Progress: {self.offset}/{self.total}{percent}\n"
+                f"• Terkirim: {self.sent} | Gagal: {self.failed}\n"
+                f"• Kecepatan: {self.rate() * 60:.1f} pesan/menit\n"
+                f"• ETA: {eta_text}")
+
+
+class BroadcastManager:
+    """Runs throttled, resumable broadcasts in background threads"""
+
+    def __init__(self, directory: str, send: Callable[[str, str, object], bool],
+                 resolve_tenant: Callable[[str], object],
+                 is_available: Callable[[object], bool] = None):
+        self.directory = directory
+        self.send = send
+        self.resolve_tenant = resolve_tenant
+        # Broadcast dijeda (bukan dihitung gagal) selama upstream tenant tidak tersedia
+        self.is_available = is_available
+        # Broadcast yang sedang dijalankan proses ini (untuk stop_event lokal)
+        self.broadcasts: Dict[str, Broadcast] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # ===== RECIPIENTS =====
+
+    def _source_path(self, name: str) -> str:
+        # File penerima hanya boleh dari dalam BROADCAST_DIR
+        path = os.path.realpath(os.path.join(self.directory, name))
+        if not path.startswith(os.path.realpath(self.directory) + os.sep):
+            raise ValueError(f"File harus berada di {self.directory}")
+        return path
+
+    def recipients(self, source: str, tenant) -> Iterator[str]:
+        """Stream recipients from 'file:<name>', 'role:<role>' or 'all'"""
+        if source.startswith('file:'):
+            with open(self._source_path(source[5:]), encoding='utf-8') as f:
+                for line in f:
+                    chat_id = normalize_chat_id(line)
+                    if chat_id:
+                        yield chat_id
+        elif source.startswith('role:'):
+            role = source[5:]
+            for chat_id, user_role in list(tenant.special_users.items()):
+                if user_role == role and chat_id not in tenant.banned_users:
+                    yield chat_id
+        elif source == 'all':
+            for chat_id in list(tenant.special_users):
+                if chat_id not in tenant.banned_users:
+                    yield chat_id
+        else:
+            raise ValueError(f"Sumber tidak dikenal: {source}")
+
+    def count_recipients(self, source: str, tenant) -> int:
+        """Count recipients with one streaming pass (constant memory)"""
+        return sum(1 for _ in self.recipients(source, tenant))
+
+    # ===== CHECKPOINTS =====
+
+    def _checkpoint_path(self, broadcast_id: str) -> str:
+        return os.path.join(self.directory, f"{broadcast_id}.json")
+
+    def checkpoint(self, broadcast: Broadcast):
+        """Persist progress atomically"""
+        path = self._checkpoint_path(broadcast.broadcast_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(broadcast.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def load_checkpoint(self, broadcast_id: str) -> Optional[Broadcast]:
+        try:
+            with open(self._checkpoint_path(broadcast_id), encoding='utf-8') as f:
+                return Broadcast.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    # ===== CONTROL =====
+    # Checkpoint, file .stop dan flock pada file .lock dipakai bersama semua worker
+    # gunicorn: status & stop dibaca/ditulis lewat file, bukan objek di memori worker.
+
+    def _lock_path(self, broadcast_id: str) -> str:
+        return os.path.join(self.directory, f"{broadcast_id}.lock")
+
+    def _stop_path(self, broadcast_id: str) -> str:
+        return os.path.join(self.directory, f"{broadcast_id}.stop")
+
+    def _try_lock(self, broadcast_id: str):
+        """Open and exclusively lock the broadcast's lock file, or None if another runner holds it"""
+        lock_file = open(self._lock_path(broadcast_id), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    @staticmethod
+    def _unlock(lock_file):
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    def _clear_stop(self, broadcast_id: str):
+        try:
+            os.remove(self._stop_path(broadcast_id))
+        except FileNotFoundError:
+            pass
+
+    def start(self, tenant, source: str, message: str, requested_by: str) -> Broadcast:
+        """Start a new broadcast"""
+        total = self.count_recipients(source, tenant)
+        broadcast = Broadcast(uuid.uuid4().hex[:8], tenant.tenant_id, source, message, requested_by, total)
+        self.checkpoint(broadcast)
+        self._launch(broadcast.broadcast_id)
+        return broadcast
+
+    def resume(self, broadcast_id: str) -> Optional[Broadcast]:
+        """Resume an interrupted or stopped broadcast from its checkpoint"""
+        broadcast = self.load_checkpoint(broadcast_id)
+        if broadcast is None or broadcast.state == STATE_DONE:
+            return broadcast
+        # Batalkan stop yang belum diproses runner
+        self._clear_stop(broadcast_id)
+        lock_file = self._try_lock(broadcast_id)
+        if lock_file is None:
+            # Masih berjalan di proses ini atau worker lain
+            return broadcast
+        try:
+            broadcast = self.load_checkpoint(broadcast_id)
+            if broadcast is None or broadcast.state == STATE_DONE:
+                return broadcast
+            broadcast.state = STATE_RUNNING
+            self.checkpoint(broadcast)
+        finally:
+            self._unlock(lock_file)
+        self._launch(broadcast_id)
+        return broadcast
+
+    def resume_all(self) -> List[str]:
+        """Resume every broadcast whose checkpoint is still running (after restart)"""
+        resumed = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                broadcast = self.load_checkpoint(name[:-5])
+                if broadcast and broadcast.state == STATE_RUNNING:
+                    self._launch(broadcast.broadcast_id)
+                    resumed.append(broadcast.broadcast_id)
+        return resumed
+
+    def stop(self, broadcast_id: str) -> Optional[Broadcast]:
+        """Stop a running broadcast in whichever worker runs it (it can be resumed later)"""
+        broadcast = self.load_checkpoint(broadcast_id)
+        if broadcast is None or broadcast.state != STATE_RUNNING:
+            return broadcast
+        # Runner (di worker mana pun) memeriksa file stop sebelum setiap kirim
+        with open(self._stop_path(broadcast_id), 'w'):
+            pass
+        with self._lock:
+            running = self.broadcasts.get(broadcast_id)
+        if running:
+            running.stop_event.set()
+
+        # Tidak ada runner (mis. proses mati sebelum resume) - tandai stopped langsung
+        lock_file = self._try_lock(broadcast_id)
+        if lock_file is not None:
+            try:
+                broadcast = self.load_checkpoint(broadcast_id) or broadcast
+                if broadcast.state == STATE_RUNNING:
+                    broadcast.state = STATE_STOPPED
+                    self.checkpoint(broadcast)
+                self._clear_stop(broadcast_id)
+            finally:
+                self._unlock(lock_file)
+        return broadcast
+
+    def get(self, broadcast_id: Optional[str] = None, limit: int = 5) -> List[Broadcast]:
+        """Get one broadcast or the most recent ones (running first), read from checkpoints"""
+        if broadcast_id:
+            broadcast = self.load_checkpoint(broadcast_id)
+            return [broadcast] if broadcast else []
+        broadcasts = [broadcast for broadcast in (self.load_checkpoint(name[:-5])
+                                                  for name in os.listdir(self.directory) if name.endswith('.json'))
+                      if broadcast]
+        broadcasts.sort(key=lambda broadcast: (broadcast.state != STATE_RUNNING, -broadcast.started_at))
+        return broadcasts[:limit]
+
+    def _launch(self, broadcast_id: str):
+        threading.Thread(target=self._run, args=(broadcast_id,), name=f"broadcast-{broadcast_id}",
+                         daemon=True).start()
+
+    # ===== WORKER =====
+
+    def _stop_requested(self, broadcast: Broadcast) -> bool:
+        if not broadcast.stop_event.is_set() and os.path.exists(self._stop_path(broadcast.broadcast_id)):
+            broadcast.stop_event.set()
+        return broadcast.stop_event.is_set()
+
+    def _wait_available(self, broadcast: Broadcast, tenant) -> bool:
+        """Wait while the tenant's upstream is unavailable. Returns False if the broadcast was stopped"""
+        if self.is_available is None or self.is_available(tenant):
+            return True
+        logger.warning(f"Broadcast {broadcast.broadcast_id} paused: upstream unavailable")
+        metrics.incr('broadcast.paused')
+        while not self.is_available(tenant):
+            broadcast.stop_event.wait(1.0)
+            if self._stop_requested(broadcast):
+                return False
+        logger.info(f"Broadcast {broadcast.broadcast_id} resumed")
+        return True
+
+    def _run(self, broadcast_id: str):
+        # Lock file: hanya satu proses (worker gunicorn) yang menjalankan broadcast ini
+        lock_file = self._try_lock(broadcast_id)
+        if lock_file is None:
+            logger.info(f"Broadcast {broadcast_id} is running in another process")
+            return
+
+        # Progress dibaca ulang dari checkpoint setelah lock didapat (runner lain mungkin sudah maju)
+        broadcast = self.load_checkpoint(broadcast_id)
+        if broadcast is None or broadcast.state != STATE_RUNNING:
+            self._unlock(lock_file)
+            return
+        with self._lock:
+            self.broadcasts[broadcast_id] = broadcast
+
+        try:
+            tenant = self.resolve_tenant(broadcast.tenant_id)
+            broadcast.run_started_at = time.time()
+            broadcast.run_start_offset = broadcast.offset
+            self.checkpoint(broadcast)
+            logger.info(f"Broadcast {broadcast.broadcast_id} running from offset {broadcast.offset}")
+
+            for index, chat_id in enumerate(self.recipients(broadcast.source, tenant)):
+                if index < broadcast.offset:
+                    continue
+                if not self._wait_available(broadcast, tenant):
+                    break
+                if not tenant.send_throttle.acquire_bulk(broadcast.stop_event):
+                    break
+                if self._stop_requested(broadcast):
+                    break
+
+                if self.send(chat_id, broadcast.message, tenant):
+                    broadcast.sent += 1
+                    metrics.incr('broadcast.sent')
+                else:
+                    broadcast.failed += 1
+                    metrics.incr('broadcast.failed')
+                broadcast.offset = index + 1
+                # Checkpoint setelah setiap kirim (rate bulk ~1/detik, tulis file kecil atomik)
+                self.checkpoint(broadcast)
+
+            broadcast.state = STATE_STOPPED if broadcast.stop_event.is_set() else STATE_DONE
+        except Exception as e:
+            broadcast.state = STATE_STOPPED
+            logger.error(f"Broadcast {broadcast.broadcast_id} error: {str(e)}")
+        finally:
+            self.checkpoint(broadcast)
+            self._clear_stop(broadcast_id)
+            with self._lock:
+                self.broadcasts.pop(broadcast_id, None)
+            self._unlock(lock_file)
+
+        logger.info(f"Broadcast {broadcast.broadcast_id} {broadcast.state}: "
+                    f"{broadcast.sent} sent, {broadcast.failed} failed")
+        if broadcast.state == STATE_DONE and broadcast.requested_by:
+            self.send(broadcast.requested_by, f"✅ Broadcast selesai\n\n{broadcast.progress_text()}", tenant)
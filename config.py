@@ -39,6 +39,134 @@ class Config:
     MAX_MESSAGES_PER_MINUTE = int(os.getenv('MAX_MESSAGES_PER_MINUTE', '10'))
     MAX_TOKENS_PER_DAY = int(os.getenv('MAX_TOKENS_PER_DAY', '10000'))
     
+    # Group Chat Configuration - prefix yang membuat bot merespons di grup
+    GROUP_COMMAND_PREFIXES = os.getenv('GROUP_COMMAND_PREFIXES', '/,!').split(',')
+    
+    # Load Shedding / Admission Control
+    SHED_MAX_INFLIGHT = int(os.getenv('SHED_MAX_INFLIGHT', '16'))
+    SHED_DEGRADE_INFLIGHT = int(os.getenv('SHED_DEGRADE_INFLIGHT', '8'))
+    SHED_LATENCY_SECONDS = float(os.getenv('SHED_LATENCY_SECONDS', '20'))
+    SHED_DEGRADE_LATENCY_SECONDS = float(os.getenv('SHED_DEGRADE_LATENCY_SECONDS', '10'))
+    SHED_QUEUE_DELAY_SECONDS = float(os.getenv('SHED_QUEUE_DELAY_SECONDS', '30'))
+    SHED_REDUCED_TOKEN_RATIO = float(os.getenv('SHED_REDUCED_TOKEN_RATIO', '0.5'))
+    SHED_PROTECTED_PRIORITY = int(os.getenv('SHED_PROTECTED_PRIORITY', '2'))
+    
+    # Adaptive Timeouts (per upstream & model, dari percentile latency)
+    TIMEOUT_PERCENTILE = float(os.getenv('TIMEOUT_PERCENTILE', '99'))
+    TIMEOUT_MULTIPLIER = float(os.getenv('TIMEOUT_MULTIPLIER', '1.5'))
+    TIMEOUT_FLOOR_SECONDS = float(os.getenv('TIMEOUT_FLOOR_SECONDS', '2'))
+    TIMEOUT_CEILING_SECONDS = float(os.getenv('TIMEOUT_CEILING_SECONDS', '60'))
+    TIMEOUT_DEFAULT_SECONDS = float(os.getenv('TIMEOUT_DEFAULT_SECONDS', '30'))
+    TIMEOUT_MIN_SAMPLES = int(os.getenv('TIMEOUT_MIN_SAMPLES', '20'))
+    TIMEOUT_REFERENCE_TOKENS = int(os.getenv('TIMEOUT_REFERENCE_TOKENS', '500'))
+    
+    # Multi-Tenant & Shared Resources
+    TENANTS_FILE = os.getenv('TENANTS_FILE', '')
+    TENANT_MAX_INFLIGHT = int(os.getenv('TENANT_MAX_INFLIGHT', '16'))
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))
+    
+    # Broadcast (kirim massal, throttled sesuai limit Green API)
+    BROADCAST_DIR = os.getenv('BROADCAST_DIR', 'broadcasts')
+    BROADCAST_RATE_PER_SECOND = float(os.getenv('BROADCAST_RATE_PER_SECOND', '1'))
+    BROADCAST_BURST = float(os.getenv('BROADCAST_BURST', '5'))
+    BROADCAST_RESERVED_SHARE = float(os.getenv('BROADCAST_RESERVED_SHARE', '0.3'))  # 0 <= x < 1
+    # Jumlah worker gunicorn (sama dengan gunicorn.conf.py): throttle kirim per proses dibagi angka ini
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+    
+    # Model Router (pilih model cepat/kuat per pesan) & A/B test
+    ROUTER_ENABLED = os.getenv('ROUTER_ENABLED', 'True').lower() == 'true'
+    ROUTER_FAST_MODEL = os.getenv('ROUTER_FAST_MODEL', 'meta-llama/llama-3.2-3b-instruct:free')
+    ROUTER_AB_CONTROL_SHARE = float(os.getenv('ROUTER_AB_CONTROL_SHARE', '0'))
+    ROUTER_DEPTH_WINDOW_SECONDS = float(os.getenv('ROUTER_DEPTH_WINDOW_SECONDS', '1800'))
+    
+    # Interim Reply (indikator mengetik / pesan sementara saat jawaban lambat)
+    INTERIM_MODE = os.getenv('INTERIM_MODE', 'typing')  # typing | message | off
+    INTERIM_THRESHOLD_SECONDS = float(os.getenv('INTERIM_THRESHOLD_SECONDS', '8'))
+    INTERIM_COOLDOWN_SECONDS = float(os.getenv('INTERIM_COOLDOWN_SECONDS', '60'))
+    INTERIM_HOLDOUT_SHARE = float(os.getenv('INTERIM_HOLDOUT_SHARE', '0.1'))
+    INTERIM_MESSAGE = os.getenv('INTERIM_MESSAGE', '⏳ Sebentar ya, jawabannya sedang disiapkan...')
+    
+    # Sampling Profiler (on-demand via /profile atau endpoint /debug/profile)
+    PROFILER_DIR = os.getenv('PROFILER_DIR', 'profiles')
+    PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', '10'))
+    PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', '120'))
+    ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+    
+    # Startup (warm-up koneksi & cache sebelum /ready melaporkan siap)
+    STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'True').lower() == 'true'
+    STARTUP_WARMUP_TIMEOUT = float(os.getenv('STARTUP_WARMUP_TIMEOUT', '5'))
+    
+    # Health Probes & Circuit Breaker (probe upstream di background, hasil di-cache)
+    HEALTH_PROBES_ENABLED = os.getenv('HEALTH_PROBES_ENABLED', 'True').lower() == 'true'
+    HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '15'))
+    HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '5'))
+    # Nama upstream persis; 'greenapi' = instance tenant default. Instance tenant lain tidak memengaruhi /ready
+    HEALTH_READY_UPSTREAMS = os.getenv('HEALTH_READY_UPSTREAMS', 'greenapi').split(',')
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '3'))
+    BREAKER_RECOVERY_SECONDS = float(os.getenv('BREAKER_RECOVERY_SECONDS', '30'))
+    
+    # Tracing per request (span Zipkin v2 JSON lines ke file lokal yang di-rotate)
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'True').lower() == 'true'
+    # Nama dasar; setiap proses menulis <nama>.<pid>.jsonl (aman untuk banyak worker gunicorn)
+    TRACE_FILE = os.getenv('TRACE_FILE', 'traces/spans.jsonl')
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.05'))
+    TRACE_SLOW_SECONDS = float(os.getenv('TRACE_SLOW_SECONDS', '8'))
+    TRACE_MAX_MB = float(os.getenv('TRACE_MAX_MB', '10'))
+    TRACE_BACKUP_COUNT = int(os.getenv('TRACE_BACKUP_COUNT', '5'))
+    TRACE_QUEUE_SIZE = int(os.getenv('TRACE_QUEUE_SIZE', '1000'))
+    TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'whatsapp-bot')
+    
+    # Media (gambar, dokumen, pesan suara) - download streaming ke spool berbatas
+    MEDIA_ENABLED = os.getenv('MEDIA_ENABLED', 'True').lower() == 'true'
+    MEDIA_SPOOL_DIR = os.getenv('MEDIA_SPOOL_DIR', 'media_spool')
+    MEDIA_MAX_FILE_MB = float(os.getenv('MEDIA_MAX_FILE_MB', '16'))
+    MEDIA_SPOOL_MAX_MB = float(os.getenv('MEDIA_SPOOL_MAX_MB', '512'))
+    MEDIA_CHUNK_KB = int(os.getenv('MEDIA_CHUNK_KB', '64'))
+    MEDIA_WORKERS = int(os.getenv('MEDIA_WORKERS', '2'))
+    MEDIA_QUEUE_SIZE = int(os.getenv('MEDIA_QUEUE_SIZE', '16'))
+    MEDIA_DOWNLOAD_TIMEOUT = float(os.getenv('MEDIA_DOWNLOAD_TIMEOUT', '30'))
+    # downloadUrl dari body webhook hanya di-download jika https dan host-nya (atau subdomain) ada di sini
+    MEDIA_ALLOWED_HOSTS = os.getenv('MEDIA_ALLOWED_HOSTS', 'green-api.com,greenapi.com').split(',')
+    
+    # Scheduler (pesan terjadwal & pengingat: SQLite + timer wheel)
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'True').lower() == 'true'
+    SCHEDULE_STORE_PATH = os.getenv('SCHEDULE_STORE_PATH', 'schedule.db')
+    SCHEDULER_TICK_SECONDS = float(os.getenv('SCHEDULER_TICK_SECONDS', '1'))
+    SCHEDULER_HORIZON_SECONDS = float(os.getenv('SCHEDULER_HORIZON_SECONDS', '3600'))
+    SCHEDULER_LOAD_INTERVAL = float(os.getenv('SCHEDULER_LOAD_INTERVAL', '30'))
+    SCHEDULER_RETRY_SECONDS = float(os.getenv('SCHEDULER_RETRY_SECONDS', '60'))
+    SCHEDULER_MAX_ATTEMPTS = int(os.getenv('SCHEDULER_MAX_ATTEMPTS', '3'))
+    SCHEDULER_LEASE_SECONDS = float(os.getenv('SCHEDULER_LEASE_SECONDS', '600'))  # Diperpanjang selama pesan dikirim
+    REMINDER_MAX_PER_CHAT = int(os.getenv('REMINDER_MAX_PER_CHAT', '20'))
+    REMINDER_MAX_DAYS = float(os.getenv('REMINDER_MAX_DAYS', '365'))
+    REMINDER_UTC_OFFSET = float(os.getenv('REMINDER_UTC_OFFSET', '7'))  # WIB
+    
+    # Knowledge Base (FAQ lokal dengan BM25)
+    KNOWLEDGE_BASE_FILE = os.getenv('KNOWLEDGE_BASE_FILE', 'knowledge_base.txt')
+    KB_DIRECT_CONFIDENCE = float(os.getenv('KB_DIRECT_CONFIDENCE', '0.8'))
+    KB_CONTEXT_CONFIDENCE = float(os.getenv('KB_CONTEXT_CONFIDENCE', '0.3'))
+    KB_CONTEXT_SNIPPETS = int(os.getenv('KB_CONTEXT_SNIPPETS', '3'))
+    
+    # Durable Job Store & Graceful Shutdown
+    JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', 'jobs.db')
+    JOB_DRAIN_TIMEOUT = float(os.getenv('JOB_DRAIN_TIMEOUT', '25'))
+    JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '60'))
+    JOB_RECOVERY_INTERVAL = float(os.getenv('JOB_RECOVERY_INTERVAL', '30'))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+    JOB_MAX_AGE_SECONDS = float(os.getenv('JOB_MAX_AGE_SECONDS', '3600'))
+    JOB_RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_SECONDS', '86400'))
+    # Job selesai yang belum diekspor analytics disimpan sampai batas ini (lalu dihapus dengan warning)
+    JOB_MAX_RETENTION_SECONDS = float(os.getenv('JOB_MAX_RETENTION_SECONDS', '604800'))
+    
+    # Analytics Export (jobs selesai -> JSONL gzip ber-chunk, incremental sejak export terakhir)
+    EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+    EXPORT_INTERVAL_SECONDS = float(os.getenv('EXPORT_INTERVAL_SECONDS', '0'))  # 0 = hanya manual (/export)
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+    EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '50000'))
+    EXPORT_SETTLE_SECONDS = float(os.getenv('EXPORT_SETTLE_SECONDS', '5'))
+    EXPORT_INCLUDE_TEXT = os.getenv('EXPORT_INCLUDE_TEXT', 'True').lower() == 'true'
+    EXPORT_SALT = os.getenv('EXPORT_SALT', '')  # Kosong = dibuat acak & disimpan di job store (bukan EXPORT_DIR)
+    
     # Response Configuration
     DEFAULT_SYSTEM_PROMPT = os.getenv('DEFAULT_SYSTEM_PROMPT', 
         'Kamu adalah asisten AI yang membantu dalam bahasa Indonesia. '
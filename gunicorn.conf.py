@@ -0,0 +1,20 @@
+import os
+
+# Gunicorn config (dibaca otomatis dari direktori kerja, lihat Procfile)
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+# Lebih lama dari JOB_DRAIN_TIMEOUT supaya job in-flight sempat selesai saat SIGTERM
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+
+# Import app sekali di master lalu fork: worker baru siap tanpa import ulang.
+# Aman karena thread, signal handler & koneksi upstream baru dibuka di post_worker_init,
+# dan koneksi SQLite job store dibuka ulang otomatis di proses worker.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+
+def post_worker_init(worker):
+    """Start per-worker background threads & warm-up after fork"""
+    from app import start_background
+    start_background()
@@ -0,0 +1,288 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Status hasil probe upstream
+STATUS_UNKNOWN = "unknown"  # Belum pernah di-probe (atau hasil terakhir sudah basi)
+STATUS_UP = "up"
+STATUS_DOWN = "down"
+
+# State circuit breaker
+BREAKER_CLOSED = "closed"        # Normal, semua request diteruskan
+BREAKER_OPEN = "open"            # Upstream dianggap mati, request langsung di-short-circuit
+BREAKER_HALF_OPEN = "half_open"  # Satu request percobaan setelah recovery_timeout
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one upstream.
+
+    Diberi makan oleh dua sumber: hasil probe background dan hasil request
+    sungguhan. Saat open, allow() langsung False tanpa menyentuh jaringan;
+    setelah recovery_timeout satu request percobaan diizinkan (half-open).
+    Probe yang sukses langsung menutup breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._trial_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may go to the upstream now"""
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            now = time.monotonic()
+            # Percobaan yang tidak pernah melapor (mis. thread mati) tidak boleh mengunci breaker
+            if self._trial_started is not None and now - self._trial_started < self.recovery_timeout:
+                allowed = False
+            elif now - self.opened_at >= self.recovery_timeout:
+                self.state = BREAKER_HALF_OPEN
+                self._trial_started = now
+                allowed = True
+            else:
+                allowed = False
+        if not allowed:
+            metrics.incr(f'breaker.{self.name}.rejected')
+        return allowed
+
+    def is_open(self) -> bool:
+        """Whether allow() would currently reject (no side effects, no trial taken)"""
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return False
+            now = time.monotonic()
+            if self._trial_started is not None:
+                return now - self._trial_started < self.recovery_timeout
+            return now - self.opened_at < self.recovery_timeout
+
+    def record(self, ok: bool, error: Optional[str] = None):
+        """Record the outcome of a request or probe"""
+        with self._lock:
+            self._trial_started = None
+            if ok:
+                if self.state != BREAKER_CLOSED:
+                    logger.info(f"Circuit {self.name} closed")
+                self.state = BREAKER_CLOSED
+                self.failures = 0
+                self.opened_at = None
+                return
+
+            self.failures += 1
+            self.last_error = error
+            if self.state == BREAKER_HALF_OPEN or (self.state == BREAKER_CLOSED and
+                                                   self.failures >= self.failure_threshold):
+                if self.state == BREAKER_CLOSED:
+                    metrics.incr(f'breaker.{self.name}.opened')
+                    logger.warning(f"Circuit {self.name} open after {self.failures} failures: {error}")
+                self.state = BREAKER_OPEN
+                self.opened_at = time.monotonic()
+
+    def get_state(self) -> Dict:
+        """Breaker state for status endpoints"""
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'open_seconds': round(time.monotonic() - self.opened_at, 1) if self.opened_at else None,
+            'last_error': self.last_error
+        }
+
+
+class Probe:
+    """Cached result of one upstream health check.
+
+    check(timeout) melempar exception jika upstream tidak sehat; nilai return-nya
+    (mis. stateInstance Green API) disimpan sebagai detail.
+    """
+
+    def __init__(self, name: str, check: Callable[[float], object]):
+        self.name = name
+        self.check = check
+        self.status = STATUS_UNKNOWN
+        self.detail = None
+        self.latency: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.last_ok_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+        self.consecutive_failures = 0
+
+    def run(self, timeout: float) -> bool:
+        """Run the check once and cache the outcome"""
+        started = time.monotonic()
+        try:
+            self.detail = self.check(timeout)
+            ok = True
+        except Exception as e:
+            ok = False
+            self.last_error = f"{type(e).__name__}: {str(e)}"[:300]
+            self.last_error_at = time.time()
+
+        self.latency = time.monotonic() - started
+        self.checked_at = time.time()
+        metrics.observe(f'health.{self.name}.latency', self.latency)
+        if ok:
+            self.status = STATUS_UP
+            self.last_ok_at = self.checked_at
+            self.consecutive_failures = 0
+        else:
+            self.status = STATUS_DOWN
+            self.consecutive_failures += 1
+            metrics.incr(f'health.{self.name}.failures')
+        metrics.set_gauge(f'health.{self.name}.up', 1 if ok else 0)
+        return ok
+
+    def current_status(self, stale_after: float) -> str:
+        """Status, downgraded to unknown when the last result is too old to trust"""
+        if self.checked_at is None or time.time() - self.checked_at > stale_after:
+            return STATUS_UNKNOWN
+        return self.status
+
+    def get_state(self, stale_after: float) -> Dict:
+        return {
+            'status': self.current_status(stale_after),
+            'detail': self.detail,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'checked_at': self.checked_at,
+            'last_ok_at': self.last_ok_at,
+            'last_error': self.last_error,
+            'last_error_at': self.last_error_at,
+            'consecutive_failures': self.consecutive_failures
+        }
+
+
+class HealthMonitor:
+    """Background upstream probes with cached results and one circuit breaker per upstream.
+
+    Probe berjalan di satu thread dengan interval tetap; endpoint health hanya
+    membaca hasil cache sehingga health check load balancer tidak pernah
+    memanggil upstream. Nama breaker sama dengan nama probe.
+    """
+
+    def __init__(self, interval: float = 15.0, timeout: float = 5.0, failure_threshold: int = 3,
+                 recovery_timeout: float = 30.0, enabled: bool = True):
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.enabled = enabled
+        # Hasil probe lebih tua dari ini dianggap unknown (thread probe macet/mati)
+        self.stale_after = max(3 * interval, interval + timeout)
+
+        self.probes: Dict[str, Probe] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.rounds = 0
+        self.last_round_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Config = None) -> 'HealthMonitor':
+        """Build from Config"""
+        config = config or Config
+        return cls(
+            interval=config.HEALTH_PROBE_INTERVAL,
+            timeout=config.HEALTH_PROBE_TIMEOUT,
+            failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=config.BREAKER_RECOVERY_SECONDS,
+            enabled=config.HEALTH_PROBES_ENABLED
+        )
+
+    def add_probe(self, name: str, check: Callable[[float], object]) -> Probe:
+        """Register an upstream check (and its breaker)"""
+        probe = self.probes[name] = Probe(name, check)
+        self.breaker(name)
+        return probe
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        """Get the breaker for an upstream, creating it on first use"""
+        with self._lock:
+            breaker = self.breakers.get(name)
+            if breaker is None:
+                breaker = self.breakers[name] = CircuitBreaker(name, self.failure_threshold, self.recovery_timeout)
+            return breaker
+
+    def allow(self, name: str) -> bool:
+        """Whether a request to the upstream may proceed"""
+        return self.breaker(name).allow()
+
+    def record(self, name: str, ok: bool, error: Optional[str] = None):
+        """Record a request outcome for the upstream's breaker"""
+        self.breaker(name).record(ok, error)
+
+    def probe_all(self) -> Dict[str, bool]:
+        """Run every probe once and feed the results into the breakers"""
+        results = {}
+        for name, probe in list(self.probes.items()):
+            ok = probe.run(self.timeout)
+            self.breaker(name).record(ok, probe.last_error)
+            if not ok:
+                logger.warning(f"Health probe {name} failed: {probe.last_error}")
+            results[name] = ok
+        self.rounds += 1
+        self.last_round_at = time.time()
+        return results
+
+    def start(self):
+        """Start the probe thread (per process, after fork)"""
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-probes", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe_all()
+            except Exception as e:
+                logger.error(f"Error running health probes: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def status(self, name: str) -> str:
+        """Cached probe status of one upstream"""
+        probe = self.probes.get(name)
+        return probe.current_status(self.stale_after) if probe else STATUS_UNKNOWN
+
+    def unavailable(self, names: Optional[List[str]] = None) -> List[str]:
+        """Upstreams (exact names, or all known when None) that are down or have an open breaker"""
+        known = set(self.probes) | set(self.breakers)
+        candidates = known if names is None else known & set(names)
+        return sorted(name for name in candidates
+                      if self.status(name) == STATUS_DOWN or self.breaker(name).state != BREAKER_CLOSED)
+
+    def get_state(self) -> Dict:
+        """Cached probe results and breaker states for health endpoints"""
+        names = sorted(set(self.probes) | set(self.breakers))
+        return {
+            'enabled': self.enabled,
+            'interval': self.interval,
+            'probe_thread_alive': self._thread is not None and self._thread.is_alive(),
+            'rounds': self.rounds,
+            'last_round_at': self.last_round_at,
+            'upstreams': {
+                name: {
+                    **(self.probes[name].get_state(self.stale_after) if name in self.probes
+                       else {'status': STATUS_UNKNOWN}),
+                    'breaker': self.breaker(name).get_state()
+                }
+                for name in names
+            }
+        }
@@ -0,0 +1,19 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+
+def create_session(pool_size: int = None) -> requests.Session:
+    """Create a requests Session with a connection pool sized for the worker threads"""
+    pool_size = pool_size or Config.HTTP_POOL_SIZE
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# Session global: koneksi keep-alive ke Green API & OpenRouter dipakai bersama
+# oleh semua tenant dan thread dalam satu proses
+session = create_session()
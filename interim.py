@@ -0,0 +1,173 @@
+import heapq
+import time
+import zlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Grup pengukuran: "treated" mendapat balasan sementara, "holdout" tidak (pembanding)
+GROUP_TREATED = "treated"
+GROUP_HOLDOUT = "holdout"
+
+
+class _Pending:
+    """One reply still being generated"""
+
+    __slots__ = ('chat_key', 'chat_id', 'context', 'deadline', 'group', 'cancelled', 'fired', 'slow', 'done')
+
+    def __init__(self, chat_key: str, chat_id: str, context, deadline: float, group: str):
+        self.chat_key = chat_key
+        self.chat_id = chat_id
+        self.context = context
+        self.deadline = deadline
+        self.group = group
+        self.cancelled = False
+        self.fired = False
+        self.slow = False
+        self.done = threading.Event()
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+
+class InterimNotifier:
+    """Send a typing indicator / "still thinking" message when a reply is slow.
+
+    Satu thread scheduler untuk semua chat (bukan satu Timer per pesan). Jika
+    jawaban selesai sebelum threshold, entry dibatalkan dan tidak ada yang dikirim.
+    Resend user selama jawaban masih diproses dihitung per grup (treated/holdout)
+    untuk mengukur efek fitur ini.
+    """
+
+    def __init__(self, notify: Callable[[str, object], bool], threshold: float = 8.0,
+                 cooldown: float = 60.0, holdout_share: float = 0.0, enabled: bool = True):
+        self.notify = notify
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.holdout_share = holdout_share
+        self.enabled = enabled
+
+        self._heap = []
+        self._pending: Dict[str, _Pending] = {}
+        self._last_sent: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="interim-notifier", daemon=True)
+            self._thread.start()
+
+    def group_for(self, chat_key: str) -> str:
+        """Sticky holdout assignment per chat"""
+        if self.holdout_share <= 0:
+            return GROUP_TREATED
+        bucket = zlib.crc32(chat_key.encode('utf-8')) % 10000 / 10000
+        return GROUP_HOLDOUT if bucket < self.holdout_share else GROUP_TREATED
+
+    def note_message(self, chat_key: str) -> bool:
+        """Record an inbound message. Returns True if it is a resend while a slow reply is pending"""
+        with self._cond:
+            pending = self._pending.get(chat_key)
+            if pending is None or not pending.slow:
+                return False
+            group = pending.group
+        metrics.incr(f'interim.resend.{group}')
+        return True
+
+    @contextmanager
+    def watch(self, chat_key: str, chat_id: str, context=None):
+        """Watch one reply generation; notify the chat if it outlives the threshold"""
+        if not self.enabled:
+            yield
+            return
+
+        entry = _Pending(chat_key, chat_id, context, time.monotonic() + self.threshold, self.group_for(chat_key))
+        with self._cond:
+            self._start()
+            self._pending[chat_key] = entry
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+        try:
+            yield
+        finally:
+            with self._cond:
+                entry.cancelled = True
+                if self._pending.get(chat_key) is entry:
+                    del self._pending[chat_key]
+                fired = entry.fired
+            if fired:
+                # Balasan sementara sedang dikirim - tunggu supaya urutan pesan tetap benar
+                entry.done.wait(5.0)
+            else:
+                metrics.incr('interim.skipped')
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0].deadline > time.monotonic():
+                    if self._heap:
+                        self._cond.wait(self._heap[0].deadline - time.monotonic())
+                    else:
+                        self._cond.wait()
+                entry = heapq.heappop(self._heap)
+                if entry.cancelled:
+                    continue
+                entry.slow = True
+                metrics.incr(f'interim.slow.{entry.group}')
+
+                now = time.monotonic()
+                if entry.group == GROUP_HOLDOUT:
+                    continue
+                if now - self._last_sent.get(entry.chat_key, -self.cooldown) < self.cooldown:
+                    metrics.incr('interim.rate_limited')
+                    continue
+                self._last_sent[entry.chat_key] = now
+                entry.fired = True
+
+            try:
+                if self.notify(entry.chat_id, entry.context):
+                    metrics.incr('interim.sent')
+            except Exception as e:
+                logger.error(f"Error sending interim reply: {str(e)}")
+            finally:
+                entry.done.set()
+
+            self._prune()
+
+    def _prune(self):
+        """Forget cooldowns that have expired"""
+        with self._cond:
+            if len(self._last_sent) < 1024:
+                return
+            now = time.monotonic()
+            for key in [key for key, sent in self._last_sent.items() if now - sent >= self.cooldown]:
+                del self._last_sent[key]
+
+    def get_state(self) -> Dict:
+        """Resend rate per group (resends per slow reply) for status endpoints"""
+        snapshot = metrics.snapshot()['counters']
+        groups = {}
+        for group in (GROUP_TREATED, GROUP_HOLDOUT):
+            slow = snapshot.get(f'interim.slow.{group}', 0)
+            resends = snapshot.get(f'interim.resend.{group}', 0)
+            groups[group] = {
+                'slow_replies': slow,
+                'resends': resends,
+                'resend_rate': round(resends / slow, 4) if slow else None
+            }
+        treated, holdout = groups[GROUP_TREATED]['resend_rate'], groups[GROUP_HOLDOUT]['resend_rate']
+        return {
+            'enabled': self.enabled,
+            'threshold': self.threshold,
+            'cooldown': self.cooldown,
+            'holdout_share': self.holdout_share,
+            'pending': len(self._pending),
+            'groups': groups,
+            'resend_reduction': round(1 - treated / holdout, 4) if treated is not None and holdout else None
+        }
@@ -0,0 +1,271 @@
+import os
+import time
+import sqlite3
+import secrets
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Status job: received -> generated -> sent (atau failed)
+STATE_RECEIVED = "received"
+STATE_GENERATED = "generated"
+STATE_SENT = "sent"
+STATE_FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    tenant TEXT NOT NULL DEFAULT 'default',
+    chat_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    state TEXT NOT NULL,
+    response TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    role TEXT,
+    source TEXT,
+    model TEXT,
+    tokens INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, updated_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated_at, id);
+CREATE TABLE IF NOT EXISTS secrets (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class JobStore:
+    """Durable SQLite store tracking each inbound message until it is answered"""
+
+    def __init__(self, path: str = 'jobs.db', renew_interval: float = 20.0):
+        self.path = path
+        self.renew_interval = renew_interval
+        self._lock = threading.Lock()
+        # Job yang sedang diproses di proses ini (id -> jumlah pemegang), lease-nya diperpanjang di background
+        self._active: Dict[str, int] = {}
+        self._active_pid = None
+        self._active_lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if self.path != ':memory:':
+            # WAL + synchronous=NORMAL: tahan crash proses, fsync hanya saat checkpoint
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add columns introduced after the first schema version"""
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'tenant' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT NOT NULL DEFAULT 'default'")
+        # Kolom analytics (role, sumber jawaban, model, token)
+        for column, kind in (('role', 'TEXT'), ('source', 'TEXT'), ('model', 'TEXT'), ('tokens', 'INTEGER')):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        # v1: id job diberi prefix tenant (lihat job_key); idempotent jika beberapa worker migrasi bersamaan
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("UPDATE jobs SET id = tenant || ':' || id "
+                               "WHERE substr(id, 1, length(tenant) + 1) != tenant || ':'")
+            self._conn.execute("PRAGMA user_version = 1")
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def job_key(tenant: str, message_id: str) -> str:
+        """Job id scoped to a tenant.
+
+        Dedupe per tenant: dua nomor tenant di grup yang sama menerima idMessage
+        yang sama, dan masing-masing tetap harus menjawab.
+        """
+        return f"{tenant}:{message_id}"
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Koneksi SQLite tidak boleh dipakai lintas fork (gunicorn --preload)
+                self._connect()
+            return self._conn.execute(sql, params)
+
+    def receive(self, job_id: str, chat_id: str, message: str, tenant: str = 'default') -> bool:
+        """Record an inbound message. Returns False if the job already exists (duplicate webhook)"""
+        now = time.time()
+        cursor = self._execute(
+            "INSERT OR IGNORE INTO jobs (id, tenant, chat_id, message, state, attempts, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+            (job_id, tenant, chat_id, message, STATE_RECEIVED, now, now)
+        )
+        if cursor.rowcount == 0:
+            metrics.incr('jobs.duplicate')
+            return False
+        metrics.incr('jobs.received')
+        return True
+
+    def mark_generated(self, job_id: str, response: str, role: Optional[str] = None, source: Optional[str] = None,
+                       model: Optional[str] = None, tokens: Optional[int] = None):
+        """Store the generated response so a crash after this point only needs a resend"""
+        self._execute("UPDATE jobs SET state = ?, response = ?, role = COALESCE(?, role), source = COALESCE(?, source), "
+                      "model = COALESCE(?, model), tokens = COALESCE(?, tokens), updated_at = ? WHERE id = ?",
+                      (STATE_GENERATED, response, role, source, model, tokens, time.time(), job_id))
+
+    def mark_sent(self, job_id: str):
+        """Mark job as delivered (response is kept until purge for analytics export)"""
+        self._execute("UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                      (STATE_SENT, time.time(), job_id))
+        metrics.incr('jobs.sent')
+
+    def mark_failed(self, job_id: str, error: str):
+        """Mark job as permanently failed"""
+        self._execute("UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE id = ?",
+                      (STATE_FAILED, error, time.time(), job_id))
+        metrics.incr('jobs.failed')
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Get one job"""
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    # ===== LEASE JOB IN-FLIGHT =====
+
+    def hold(self, job_id: str):
+        """Mark a job as in flight in this process until release(): recovery skips it and its lease is renewed"""
+        with self._active_lock:
+            if self._active_pid != os.getpid():
+                # Set job aktif & thread renewer dibuat per proses (aman untuk fork)
+                self._active_pid = os.getpid()
+                self._active = {}
+                threading.Thread(target=self._renew_loop, name="job-lease-renewer", daemon=True).start()
+            self._active[job_id] = self._active.get(job_id, 0) + 1
+
+    def release(self, job_id: str):
+        """Drop one hold taken with hold()"""
+        with self._active_lock:
+            count = self._active.get(job_id, 0) - 1
+            if count > 0:
+                self._active[job_id] = count
+            else:
+                self._active.pop(job_id, None)
+
+    @contextmanager
+    def leased(self, job_id: str):
+        """Hold a job for the duration of the block"""
+        self.hold(job_id)
+        try:
+            yield
+        finally:
+            self.release(job_id)
+
+    def is_active(self, job_id: str) -> bool:
+        """Whether the job is held by this process"""
+        with self._active_lock:
+            return self._active_pid == os.getpid() and job_id in self._active
+
+    def renew_leases(self) -> int:
+        """Refresh updated_at of unfinished jobs held by this process (worker lain tidak mengklaimnya)"""
+        with self._active_lock:
+            job_ids = list(self._active) if self._active_pid == os.getpid() else []
+        if not job_ids:
+            return 0
+        cursor = self._execute(
+            f"UPDATE jobs SET updated_at = ? WHERE state IN (?, ?) AND id IN ({', '.join('?' * len(job_ids))})",
+            (time.time(), STATE_RECEIVED, STATE_GENERATED, *job_ids)
+        )
+        return cursor.rowcount
+
+    def _renew_loop(self):
+        while True:
+            time.sleep(self.renew_interval)
+            try:
+                self.renew_leases()
+            except Exception as e:
+                logger.error(f"Error renewing job leases: {str(e)}")
+
+    def claim_unfinished(self, lease: float = 60.0, max_attempts: int = 3, max_age: float = 3600.0) -> List[Dict]:
+        """Claim unfinished jobs idle for longer than lease.
+
+        Klaim atomik (update updated_at + attempts) supaya beberapa worker gunicorn
+        tidak memproses job yang sama, dan job yang sedang diproses (di-hold di
+        proses ini, atau lease-nya masih diperpanjang worker lain) tidak diambil.
+        Job hasil klaim langsung di-hold; pemanggil wajib release() setelah selesai.
+        """
+        now = time.time()
+
+        # Job yang terlalu lama atau sudah terlalu sering dicoba dianggap gagal
+        self._execute(
+            "UPDATE jobs SET state = ?, error = 'expired', updated_at = ? "
+            "WHERE state IN (?, ?) AND (created_at < ? OR attempts >= ?) AND updated_at < ?",
+            (STATE_FAILED, now, STATE_RECEIVED, STATE_GENERATED, now - max_age, max_attempts, now - lease)
+        )
+
+        rows = self._execute(
+            "SELECT * FROM jobs WHERE state IN (?, ?) AND updated_at < ? ORDER BY created_at",
+            (STATE_RECEIVED, STATE_GENERATED, now - lease)
+        ).fetchall()
+
+        claimed = []
+        for row in rows:
+            if self.is_active(row['id']):
+                continue
+            cursor = self._execute(
+                "UPDATE jobs SET attempts = attempts + 1, updated_at = ? WHERE id = ? AND updated_at = ?",
+                (now, row['id'], row['updated_at'])
+            )
+            if cursor.rowcount == 1:
+                self.hold(row['id'])
+                claimed.append(dict(row))
+        return claimed
+
+    def iter_finished(self, after: Tuple[float, str] = (0.0, ''), until: Optional[float] = None,
+                      batch_size: int = 1000) -> Iterator[Dict]:
+        """Stream sent/failed jobs ordered by (updated_at, id), strictly after the watermark.
+
+        Keyset pagination: setiap batch satu query pendek, sehingga lock koneksi
+        hanya dipegang sebentar dan pesan baru tetap diproses selama export.
+        """
+        updated_at, job_id = after
+        until = time.time() if until is None else until
+        while True:
+            rows = self._execute(
+                # INDEXED BY: tanpa ini planner memilih idx_jobs_state lalu mengurutkan sisa window per batch
+                "SELECT * FROM jobs INDEXED BY idx_jobs_updated WHERE (updated_at, id) > (?, ?) AND updated_at <= ? "
+                "AND state IN (?, ?) ORDER BY updated_at, id LIMIT ?",
+                (updated_at, job_id, until, STATE_SENT, STATE_FAILED, batch_size)
+            ).fetchall()
+            for row in rows:
+                yield dict(row)
+            if len(rows) < batch_size:
+                return
+            updated_at, job_id = rows[-1]['updated_at'], rows[-1]['id']
+
+    def purge(self, older_than: float = 86400.0, before: Optional[float] = None) -> int:
+        """Delete finished jobs older than older_than seconds (and, if given, finished before `before`)"""
+        cutoff = time.time() - older_than
+        if before is not None:
+            cutoff = min(cutoff, before)
+        cursor = self._execute("DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?",
+                               (STATE_SENT, STATE_FAILED, cutoff))
+        return cursor.rowcount
+
+    def secret(self, name: str, default: Optional[str] = None) -> str:
+        """Get a persistent secret, creating it (default or random) on first use; atomic across workers"""
+        self._execute("INSERT OR IGNORE INTO secrets (name, value) VALUES (?, ?)",
+                      (name, default or secrets.token_hex(16)))
+        return self._execute("SELECT value FROM secrets WHERE name = ?", (name,)).fetchone()['value']
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per state"""
+        rows = self._execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        return {row['state']: row['n'] for row in rows}
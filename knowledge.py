@@ -0,0 +1,239 @@
+import os
+import re
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Stopword sederhana (Indonesia & Inggris) supaya skor tidak didominasi kata umum
+STOPWORDS = {
+    'yang', 'dan', 'di', 'ke', 'dari', 'ini', 'itu', 'apa', 'apakah', 'ada', 'untuk',
+    'dengan', 'saya', 'anda', 'kamu', 'aku', 'bisa', 'tidak', 'atau', 'juga', 'akan',
+    'bagaimana', 'cara', 'mau', 'tolong', 'dong', 'sih', 'ya', 'kah', 'nya', 'pada',
+    'the', 'a', 'an', 'is', 'are', 'of', 'to', 'in', 'and', 'or', 'for', 'what', 'how',
+    'do', 'does', 'can', 'i', 'you', 'it', 'this', 'that', 'me', 'my'
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class Document:
+    """One FAQ entry or document block"""
+
+    __slots__ = ('doc_id', 'digest', 'question', 'answer', 'length', 'terms')
+
+    def __init__(self, doc_id: int, digest: str, question: str, answer: str):
+        self.doc_id = doc_id
+        self.digest = digest
+        self.question = question
+        self.answer = answer
+        # Pertanyaan diindeks dua kali supaya lebih berbobot daripada jawaban
+        tokens = tokenize(question) * 2 + tokenize(answer)
+        self.length = len(tokens)
+        self.terms = Counter(tokens)
+
+
+def parse_blocks(text: str) -> List[Tuple[str, str]]:
+    """Parse knowledge-base text into (question, answer) blocks.
+
+    Entri FAQ diawali baris "Q:"/"T:" (pertanyaan) lalu "A:"/"J:" (jawaban) dan
+    boleh berisi baris kosong; entri berakhir di "Q:" berikutnya. Paragraf tanpa
+    penanda (dipisah baris kosong) dipakai utuh sebagai jawaban.
+    """
+    blocks = []
+    question_lines, answer_lines = [], []
+    current = answer_lines
+    in_faq = False
+
+    def flush():
+        answer = '\n'.join(answer_lines).strip()
+        if answer:
+            blocks.append((' '.join(question_lines).strip(), answer))
+        question_lines.clear()
+        answer_lines.clear()
+
+    for line in text.splitlines():
+        marker = line[:2].upper()
+        if line.startswith('#'):
+            continue
+        if marker in ('Q:', 'T:'):
+            if current is answer_lines:
+                flush()
+            in_faq = True
+            current = question_lines
+            line = line[2:]
+        elif marker in ('A:', 'J:'):
+            current = answer_lines
+            line = line[2:]
+        elif not line.strip() and not in_faq:
+            flush()
+            continue
+        current.append(line.strip())
+
+    flush()
+    return blocks
+
+
+class KnowledgeBase:
+    """In-memory inverted index with BM25 scoring over a FAQ file"""
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75,
+                 check_interval: float = 5.0):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.check_interval = check_interval
+
+        self.documents: Dict[int, Document] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_length = 0
+
+        self._by_digest: Dict[str, int] = {}
+        self._next_id = 0
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.RLock()
+
+    # ===== INDEX MAINTENANCE =====
+
+    def add_document(self, question: str, answer: str) -> Optional[int]:
+        """Add one entry to the index, skipping duplicates"""
+        digest = hashlib.sha1(f"{question}\0{answer}".encode('utf-8')).hexdigest()
+        with self._lock:
+            if digest in self._by_digest:
+                return None
+
+            doc = Document(self._next_id, digest, question, answer)
+            self._next_id += 1
+            self.documents[doc.doc_id] = doc
+            self._by_digest[digest] = doc.doc_id
+            self.total_length += doc.length
+            for term, tf in doc.terms.items():
+                self.postings.setdefault(term, {})[doc.doc_id] = tf
+            return doc.doc_id
+
+    def remove_document(self, doc_id: int):
+        """Remove one entry from the index"""
+        with self._lock:
+            doc = self.documents.pop(doc_id, None)
+            if doc is None:
+                return
+            del self._by_digest[doc.digest]
+            self.total_length -= doc.length
+            for term in doc.terms:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(doc_id, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def load_text(self, text: str) -> Tuple[int, int]:
+        """Sync the index with text, only touching changed blocks. Returns (added, removed)"""
+        blocks = parse_blocks(text)
+        wanted = {hashlib.sha1(f"{q}\0{a}".encode('utf-8')).hexdigest(): (q, a) for q, a in blocks}
+
+        with self._lock:
+            stale = [doc_id for digest, doc_id in self._by_digest.items() if digest not in wanted]
+            for doc_id in stale:
+                self.remove_document(doc_id)
+
+            added = 0
+            for digest, (question, answer) in wanted.items():
+                if digest not in self._by_digest:
+                    self.add_document(question, answer)
+                    added += 1
+
+        return added, len(stale)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload the file if its mtime changed. Returns True if the index changed"""
+        if not self.path:
+            return False
+
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if not force and mtime == self._mtime:
+            return False
+
+        with open(self.path, encoding='utf-8') as f:
+            added, removed = self.load_text(f.read())
+        self._mtime = mtime
+        logger.info(f"Knowledge base {self.path} indexed: +{added} -{removed} ({len(self.documents)} entries)")
+        return bool(added or removed)
+
+    # ===== QUERY =====
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency"""
+        n = len(self.documents)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[float, float, Document]]:
+        """Search the index. Returns [(score, confidence, document)] best first.
+
+        confidence = porsi bobot idf term query yang ditemukan di dokumen (0-1).
+        """
+        self.refresh()
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            if not self.documents:
+                return []
+
+            avgdl = self.total_length / len(self.documents)
+            idfs = {term: self.idf(term) for term in terms}
+            total_idf = sum(idfs.values()) or 1.0
+
+            scores: Dict[int, float] = {}
+            matched: Dict[int, float] = {}
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = idfs[term]
+                for doc_id, tf in posting.items():
+                    length = self.documents[doc_id].length
+                    norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avgdl))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+                    matched[doc_id] = matched.get(doc_id, 0.0) + idf
+
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(score, matched[doc_id] / total_idf, self.documents[doc_id]) for doc_id, score in best]
+
+    def answer(self, query: str, min_confidence: float = 0.8, min_terms: int = 2) -> Optional[str]:
+        """Direct answer if the best match has high confidence, otherwise None"""
+        if len(set(tokenize(query))) < min_terms:
+            return None
+        results = self.search(query, k=1)
+        if results and results[0][1] >= min_confidence:
+            metrics.incr('kb.direct')
+            return results[0][2].answer
+        return None
+
+    def context(self, query: str, k: int = 3, min_confidence: float = 0.3) -> List[str]:
+        """Top snippets to inject into the LLM prompt"""
+        snippets = [doc.answer for _, confidence, doc in self.search(query, k) if confidence >= min_confidence]
+        metrics.incr('kb.context' if snippets else 'kb.miss')
+        return snippets
@@ -0,0 +1,88 @@
+import os
+import time
+import signal
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class DrainController:
+    """Tracks in-flight work and drains it on SIGTERM before the process exits"""
+
+    def __init__(self, deadline: float = 25.0):
+        self.deadline = deadline
+        self.draining = False
+        self.signal_handler_installed = False
+        self.inflight = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def track(self):
+        """Track one unit of in-flight work"""
+        with self._cond:
+            self.inflight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.inflight -= 1
+                self._cond.notify_all()
+
+    def accepting(self) -> bool:
+        """Whether new work should be accepted"""
+        return not self.draining
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Wait until no work is in flight. Returns False on timeout"""
+        end = time.monotonic() + timeout
+        with self._cond:
+            while self.inflight > 0:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def begin_drain(self):
+        """Stop accepting new work"""
+        self.draining = True
+        logger.info(f"Draining: stop accepting new work, {self.inflight} job(s) in flight")
+
+    def install_signal_handler(self) -> bool:
+        """Install a SIGTERM handler that drains before handing over to the previous handler.
+
+        Handler tidak boleh blocking (di worker sync gunicorn, main thread yang sama
+        sedang melayani request), jadi penantian dilakukan di thread terpisah lalu
+        SIGTERM dikirim ulang ke handler sebelumnya (gunicorn / default).
+        Python hanya mengizinkan signal.signal() di main thread; dari thread lain
+        (mis. fallback before_request tanpa hook gunicorn) handler tidak dipasang
+        dan False dikembalikan.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            logger.warning("SIGTERM drain handler not installed: not on the main thread. In-flight jobs "
+                           "will not be drained on shutdown; start background work from the gunicorn "
+                           "post_worker_init hook (gunicorn.conf.py)")
+            return False
+
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            if self.draining:
+                return
+            self.begin_drain()
+            signal.signal(signal.SIGTERM, previous if previous is not None else signal.SIG_DFL)
+
+            def finish():
+                if self.wait_idle(self.deadline):
+                    logger.info("Drain complete")
+                else:
+                    logger.warning(f"Drain deadline {self.deadline}s exceeded, {self.inflight} job(s) unfinished")
+                os.kill(os.getpid(), signal.SIGTERM)
+
+            threading.Thread(target=finish, name="drain", daemon=True).start()
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
+        self.signal_handler_installed = True
+        return True
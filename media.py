@@ -0,0 +1,231 @@
+import os
+import hashlib
+import logging
+import mimetypes
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# typeMessage Green API yang berisi file (fileMessageData)
+MEDIA_TYPES = {
+    "imageMessage": "Gambar",
+    "videoMessage": "Video",
+    "documentMessage": "Dokumen",
+    "audioMessage": "Pesan suara",
+}
+
+
+class MediaTooLarge(Exception):
+    """Attachment exceeds the per-file size cap"""
+
+
+class MediaFile:
+    """One attachment stored in the spool directory"""
+
+    def __init__(self, path: str, sha256: str, size: int, mime_type: str, duplicate: bool = False):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.mime_type = mime_type
+        self.duplicate = duplicate
+
+
+def check_media_url(url: str, allowed_hosts: Iterable[str]) -> str:
+    """Validate a downloadUrl from the webhook body. Raises ValueError unless https on an allowed host.
+
+    Body webhook tidak diautentikasi: tanpa cek ini siapa pun yang bisa POST ke
+    /webhook dapat membuat bot mengambil URL internal/metadata cloud.
+    """
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower().rstrip('.')
+    except ValueError:
+        parts, host = None, ''
+    allowed = [entry.strip().lower().lstrip('.') for entry in allowed_hosts if entry.strip()]
+    if (parts is None or parts.scheme != 'https' or parts.username or parts.password
+            or not any(host == entry or host.endswith('.' + entry) for entry in allowed)):
+        metrics.incr('media.url_rejected')
+        raise ValueError(f"media url not allowed: {host or url[:80]}")
+    return url
+
+
+def file_data(message_data: Dict) -> Dict:
+    """Get fileMessageData from a Green API messageData"""
+    return message_data.get('fileMessageData') or {}
+
+
+def media_prompt(message_data: Dict, media_file: Optional[MediaFile] = None) -> str:
+    """Build the text sent to the LLM for a media message: kind, metadata and caption"""
+    data = file_data(message_data)
+    kind = MEDIA_TYPES.get(message_data.get('typeMessage'), "File")
+    details = [data.get('fileName'), data.get('mimeType') or (media_file.mime_type if media_file else None)]
+    if media_file:
+        details.append(f"{media_file.size / 1024:.0f} KB")
+    if data.get('isForwarded'):
+        details.append("diteruskan")
+    description = ", ".join(detail for detail in details if detail)
+
+    caption = (data.get('caption') or '').strip()
+    prompt = f"[{kind} diterima{': ' + description if description else ''}]"
+    if caption:
+        prompt += f"\n{caption}"
+    else:
+        prompt += ("\nUser mengirim file tanpa keterangan. Konfirmasi bahwa file sudah diterima "
+                   "dan tanyakan apa yang bisa dibantu terkait file tersebut.")
+    return prompt
+
+
+class MediaSpool:
+    """Size-capped spool directory for attachments, de-duplicated by SHA-256.
+
+    File di-download secara streaming per chunk langsung ke disk (hash dihitung
+    sambil jalan), jadi memori per download hanya sebesar chunk_size. File lama
+    dihapus saat total ukuran spool melewati max_total_bytes.
+    """
+
+    def __init__(self, directory: str = 'media_spool', max_file_bytes: int = 16 * 1024 * 1024,
+                 max_total_bytes: int = 512 * 1024 * 1024, chunk_size: int = 64 * 1024):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory)
+                               if entry.is_file() and not entry.name.startswith('.'))
+
+    def download(self, url: str, session, timeout: float = 30.0, mime_type: str = None) -> MediaFile:
+        """Stream url into the spool. Raises MediaTooLarge if the size cap is exceeded"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(prefix='.part-', dir=self.directory)
+        try:
+            # Redirect tidak diikuti - target redirect bisa keluar dari allowlist host
+            with os.fdopen(fd, 'wb') as f, \
+                    session.get(url, stream=True, timeout=timeout, allow_redirects=False) as response:
+                response.raise_for_status()
+                length = int(response.headers.get('Content-Length') or 0)
+                if length > self.max_file_bytes:
+                    raise MediaTooLarge(f"{length} bytes > {self.max_file_bytes}")
+                mime_type = mime_type or response.headers.get('Content-Type', '').split(';')[0] or None
+
+                for chunk in response.iter_content(self.chunk_size):
+                    size += len(chunk)
+                    if size > self.max_file_bytes:
+                        raise MediaTooLarge(f"more than {self.max_file_bytes} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        sha256 = digest.hexdigest()
+        extension = mimetypes.guess_extension(mime_type or '') or ''
+        path = os.path.join(self.directory, f"{sha256}{extension}")
+        metrics.observe('media.size', size)
+
+        with self._lock:
+            if os.path.exists(path):
+                # Konten yang sama sudah pernah diterima - simpan sekali saja
+                os.unlink(tmp_path)
+                os.utime(path)
+                metrics.incr('media.duplicate')
+                return MediaFile(path, sha256, size, mime_type, duplicate=True)
+            os.replace(tmp_path, path)
+            self.total_bytes += size
+            self._evict()
+
+        metrics.incr('media.stored')
+        return MediaFile(path, sha256, size, mime_type)
+
+    def _evict(self):
+        """Delete least recently used files until the spool fits max_total_bytes"""
+        if self.total_bytes <= self.max_total_bytes:
+            return
+        entries = sorted((entry for entry in os.scandir(self.directory)
+                          if entry.is_file() and not entry.name.startswith('.')),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self.total_bytes <= self.max_total_bytes:
+                break
+            size = entry.stat().st_size
+            os.unlink(entry.path)
+            self.total_bytes -= size
+            metrics.incr('media.evicted')
+
+
+class MediaPipeline:
+    """Bounded worker pool for media ingestion, separate from text traffic.
+
+    submit() tidak pernah blocking: jika antrian penuh job ditolak, sehingga
+    lonjakan file besar tidak memakan thread webhook maupun memori.
+    """
+
+    def __init__(self, spool: MediaSpool, session, workers: int = 2, queue_size: int = 16,
+                 timeout: float = 30.0, allowed_hosts: Iterable[str] = ('green-api.com', 'greenapi.com')):
+        self.spool = spool
+        self.allowed_hosts = list(allowed_hosts)
+        self.session = session
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.pending = 0
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Dibuat saat pertama dipakai - aman untuk fork (gunicorn --preload)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="media")
+            return self._executor
+
+    def ingest(self, message_data: Dict) -> MediaFile:
+        """Download the attachment of one message (runs in a pool thread)"""
+        data = file_data(message_data)
+        url = data.get('downloadUrl')
+        if not url:
+            raise ValueError("message has no downloadUrl")
+        check_media_url(url, self.allowed_hosts)
+        return self.spool.download(url, self.session, self.timeout, data.get('mimeType'))
+
+    def submit(self, task: Callable, *args) -> bool:
+        """Queue a media task. Returns False when the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            metrics.incr('media.rejected')
+            return False
+
+        with self._lock:
+            self.pending += 1
+        metrics.set_gauge('media.pending', self.pending)
+
+        def run():
+            try:
+                task(*args)
+            except Exception as e:
+                logger.error(f"Error in media task: {str(e)}")
+            finally:
+                with self._lock:
+                    self.pending -= 1
+                metrics.set_gauge('media.pending', self.pending)
+                self._slots.release()
+
+        self._pool().submit(run)
+        return True
+
+    def get_state(self) -> Dict:
+        """Pipeline state for status endpoints"""
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'pending': self.pending,
+            'spool_bytes': self.spool.total_bytes,
+            'spool_max_bytes': self.spool.max_total_bytes
+        }
@@ -0,0 +1,69 @@
+import threading
+from collections import defaultdict, deque
+from typing import Dict, List
+
+
+class Metrics:
+    """Thread-safe in-process metrics registry (counters, gauges, latency samples)"""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.gauges: Dict[str, float] = {}
+        self.samples: Dict[str, deque] = {}
+
+    def incr(self, name: str, value: int = 1):
+        """Increment a counter"""
+        with self._lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        """Set a gauge to the current value"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Record a sample (e.g. latency in seconds) in a rolling window"""
+        with self._lock:
+            window = self.samples.get(name)
+            if window is None:
+                window = self.samples[name] = deque(maxlen=self.window)
+            window.append(value)
+
+    def percentile(self, name: str, q: float) -> float:
+        """Get percentile q (0-100) of the rolling window, 0.0 if empty"""
+        with self._lock:
+            values = list(self.samples.get(name, ()))
+        return _percentile(sorted(values), q)
+
+    def snapshot(self) -> Dict:
+        """Get a JSON-serialisable copy of all metrics"""
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            samples = {name: sorted(values) for name, values in self.samples.items()}
+
+        summaries = {}
+        for name, values in samples.items():
+            summaries[name] = {
+                'count': len(values),
+                'p50': round(_percentile(values, 50), 4),
+                'p95': round(_percentile(values, 95), 4),
+                'p99': round(_percentile(values, 99), 4),
+                'max': round(values[-1], 4) if values else 0.0
+            }
+
+        return {'counters': counters, 'gauges': gauges, 'summaries': summaries}
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+# Registry global yang dipakai bersama oleh app.py dan bot.py
+metrics = Metrics()
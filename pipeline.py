@@ -0,0 +1,316 @@
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from contextlib import ExitStack
+from typing import Callable, Dict, List, Optional
+
+from metrics import metrics
+from tracing import tracer
+from prefilter import extract_text
+from media import MEDIA_TYPES, file_data
+
+logger = logging.getLogger(__name__)
+
+TEXT_TYPES = ('textMessage', 'extendedTextMessage', 'quotedMessage')
+
+
+class MessageContext:
+    """State of one inbound message as it moves through the pipeline"""
+
+    def __init__(self, raw: bytes = None, data: Dict = None, tenant=None, **fields):
+        self.raw = raw
+        self.data = data
+        self.tenant = tenant
+        self.chat_id: Optional[str] = None
+        self.sender: Optional[str] = None
+        self.sender_name = 'Unknown'
+        self.message_data: Dict = {}
+        self.type_message: Optional[str] = None
+        self.text = ''
+        self.is_media = False
+        self.job_id: Optional[str] = None
+        self.queue_delay = 0.0
+        self.role: Optional[str] = None
+        self.response: Optional[str] = None
+        # Asal jawaban untuk analytics (source, model, tokens), disimpan di job store
+        self.usage: Dict = {}
+        self.is_admin_command = False
+        self.http_status = 200
+        self.timings: Dict[str, float] = {}
+        # Resource yang harus tetap terbuka sampai pipeline selesai (mis. drain.track())
+        self.resources = ExitStack()
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    @property
+    def chat_key(self) -> str:
+        """Chat id namespaced by tenant"""
+        tenant_id = getattr(self.tenant, 'tenant_id', None)
+        return f"{tenant_id}:{self.chat_id}" if tenant_id else str(self.chat_id)
+
+
+class Stage:
+    """One pipeline step. process() returns a result dict to stop the pipeline, or None to continue"""
+
+    name = "stage"
+
+    def process(self, ctx: MessageContext) -> Optional[Dict]:
+        raise NotImplementedError
+
+
+class FunctionStage(Stage):
+    """Stage built from a plain function"""
+
+    def __init__(self, name: str, func: Callable[[MessageContext], Optional[Dict]]):
+        self.name = name
+        self.func = func
+
+    def process(self, ctx: MessageContext) -> Optional[Dict]:
+        return self.func(ctx)
+
+
+class Pipeline:
+    """Ordered stages with automatic per-stage timing (metrics pipeline.<name>.<stage> & trace spans)"""
+
+    def __init__(self, stages: List[Stage], name: str = "messages"):
+        self.stages = list(stages)
+        self.name = name
+
+    def stage_names(self) -> List[str]:
+        return [stage.name for stage in self.stages]
+
+    def replace(self, name: str, stage: Stage) -> 'Pipeline':
+        """Swap the stage with the given name"""
+        self.stages[self.stage_names().index(name)] = stage
+        return self
+
+    def insert_before(self, name: str, stage: Stage) -> 'Pipeline':
+        """Insert a stage in front of the stage with the given name"""
+        self.stages.insert(self.stage_names().index(name), stage)
+        return self
+
+    def run(self, ctx: MessageContext, start: str = None) -> Dict:
+        """Run stages in order (optionally from a named stage) until one returns a result"""
+        stages = self.stages[self.stage_names().index(start):] if start else self.stages
+        result = None
+        started = time.perf_counter()
+        with ctx.resources:
+            for stage in stages:
+                stage_started = time.perf_counter()
+                try:
+                    with tracer.span(stage.name):
+                        result = stage.process(ctx)
+                except Exception:
+                    metrics.incr(f'pipeline.{self.name}.{stage.name}.errors')
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - stage_started
+                    ctx.timings[stage.name] = elapsed
+                    metrics.observe(f'pipeline.{self.name}.{stage.name}', elapsed)
+                if result is not None:
+                    break
+
+        total = time.perf_counter() - started
+        metrics.observe(f'pipeline.{self.name}.total', total)
+        logger.debug(f"Pipeline {self.name} {total * 1000:.1f}ms: " +
+                     ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in ctx.timings.items()))
+        return result or {"status": "ok"}
+
+
+# ===== SHARED STAGES =====
+
+class ParseStage(Stage):
+    """Parse the Green API notification and extract sender, message type and text.
+
+    prefilter membuang notifikasi non-pesan dari raw body sebelum JSON di-parse.
+    body_key dipakai untuk format webhook yang membungkus payload (mis. {"body": {...}}).
+    """
+
+    name = "parse"
+
+    def __init__(self, prefilter=None, body_key: str = None, log_payload: bool = False):
+        self.prefilter = prefilter
+        self.body_key = body_key
+        self.log_payload = log_payload
+
+    def process(self, ctx: MessageContext) -> Optional[Dict]:
+        if ctx.data is None:
+            if self.prefilter:
+                drop_reason = self.prefilter.check_raw(ctx.raw)
+                if drop_reason:
+                    return {"status": "ignored", "reason": drop_reason}
+            ctx.data = json.loads(ctx.raw)
+        elif self.prefilter:
+            # Webhook yang sudah di-parse pemanggil: filter yang sama dengan check_raw
+            drop_reason = self.prefilter.check_data(ctx.data.get(self.body_key, {}) if self.body_key else ctx.data)
+            if drop_reason:
+                return {"status": "ignored", "reason": drop_reason}
+        if self.body_key:
+            ctx.data = ctx.data.get(self.body_key, {})
+        if self.log_payload:
+            logger.info(f"Received webhook: {json.dumps(ctx.data, indent=2)}")
+
+        data = ctx.data or {}
+        sender_data = data.get('senderData', {})
+        ctx.chat_id = sender_data.get('chatId')
+        ctx.sender = sender_data.get('sender')
+        ctx.sender_name = sender_data.get('senderName', 'Unknown')
+        ctx.message_data = data.get('messageData', {})
+        ctx.type_message = ctx.message_data.get('typeMessage')
+        ctx.job_id = data.get('idMessage')
+        if data.get('timestamp'):
+            # Umur pesan (queue delay) dari timestamp Green API
+            ctx.queue_delay = max(0.0, time.time() - data['timestamp'])
+        return None
+
+
+class FilterStage(Stage):
+    """Keep only incoming text (and optionally media) messages addressed to the bot"""
+
+    name = "filter"
+
+    def __init__(self, bot_sender: Callable[[MessageContext], str], prefilter=None, media: bool = True):
+        self.bot_sender = bot_sender
+        self.prefilter = prefilter
+        self.media = media
+
+    def process(self, ctx: MessageContext) -> Optional[Dict]:
+        if (ctx.data or {}).get('typeWebhook') != 'incomingMessageReceived':
+            return {"status": "ignored", "reason": "not an incoming message"}
+        # Update status WhatsApp (story) juga masuk sebagai incomingMessageReceived
+        if ctx.chat_id == 'status@broadcast':
+            return {"status": "ignored", "reason": "status"}
+
+        ctx.is_media = self.media and ctx.type_message in MEDIA_TYPES
+        if ctx.type_message not in TEXT_TYPES and not ctx.is_media:
+            return {"status": "ignored", "reason": "unsupported message type"}
+
+        ctx.text = (file_data(ctx.message_data).get('caption') or '') if ctx.is_media else extract_text(ctx.message_data)
+
+        # Di grup hanya respons jika bot di-mention, di-reply, atau pakai command prefix
+        if self.prefilter:
+            drop_reason, ctx.text = self.prefilter.check_group(ctx.data, ctx.text)
+            if drop_reason:
+                return {"status": "ignored", "reason": drop_reason}
+
+        # Skip empty messages (media tanpa caption tetap diproses)
+        if not ctx.is_media and not ctx.text.strip():
+            return {"status": "ignored", "reason": "empty message"}
+
+        # Skip bot's own messages
+        if ctx.sender == self.bot_sender(ctx):
+            return {"status": "ignored", "reason": "bot message"}
+        return None
+
+
+class KnowledgeCacheStage(Stage):
+    """Answer directly from the knowledge base when the match is very confident (no LLM call)"""
+
+    name = "cache"
+
+    def __init__(self, knowledge_base: Callable[[MessageContext], object], min_confidence: float = 0.8,
+                 decorate: Callable[[MessageContext, str], str] = None):
+        self.knowledge_base = knowledge_base
+        self.min_confidence = min_confidence
+        self.decorate = decorate
+
+    def process(self, ctx: MessageContext) -> Optional[Dict]:
+        if ctx.response is not None:
+            return None
+        answer = self.knowledge_base(ctx).answer(ctx.text, self.min_confidence)
+        if answer:
+            ctx.response = self.decorate(ctx, answer) if self.decorate else answer
+            ctx.usage['source'] = 'kb'
+        return None
+
+
+class RateLimiter:
+    """Sliding one-minute window of messages per key (bounded number of keys)"""
+
+    def __init__(self, max_per_minute: int = 10, window: float = 60.0, max_keys: int = 10000):
+        self.max_per_minute = max_per_minute
+        self.window = window
+        self.max_keys = max_keys
+        self._hits: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str) -> bool:
+        """Count one message for key. Returns True if key is over the limit (message not counted)"""
+        now = time.time()
+        with self._lock:
+            hits = self._hits.pop(key, None) or deque()
+            while hits and now - hits[0] >= self.window:
+                hits.popleft()
+            limited = len(hits) >= self.max_per_minute
+            if not limited:
+                hits.append(now)
+            self._hits[key] = hits
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+        return limited
+
+
+class RateLimitStage(Stage):
+    """Reject chats sending too fast; exempt(ctx) lets privileged users through"""
+
+    name = "rate_limit"
+    MESSAGE = "Anda mengirim pesan terlalu cepat. Silakan tunggu sebentar."
+
+    def __init__(self, is_limited: Callable[[str], bool], notify: Callable[[MessageContext, str], object],
+                 exempt: Callable[[MessageContext], bool] = None):
+        self.is_limited = is_limited
+        self.notify = notify
+        self.exempt = exempt
+
+    def process(self, ctx: MessageContext) -> Optional[Dict]:
+        if self.exempt and self.exempt(ctx):
+            return None
+        if self.is_limited(ctx.chat_key):
+            metrics.incr('pipeline.rate_limited')
+            self.notify(ctx, self.MESSAGE)
+            return {"status": "rate_limited"}
+        return None
+
+
+# ===== PIPELINE FACTORY =====
+
+def build_message_pipeline(generate: Callable[[MessageContext], Optional[Dict]],
+                           deliver: Callable[[MessageContext], Optional[Dict]], *,
+                           bot_sender: Callable[[MessageContext], str],
+                           notify: Callable[[MessageContext, str], object],
+                           is_limited: Callable[[str], bool],
+                           auth: Callable[[MessageContext], Optional[Dict]] = None,
+                           rate_limit_exempt: Callable[[MessageContext], bool] = None,
+                           tenant: Callable[[MessageContext], Optional[Dict]] = None,
+                           before_generate: List[Stage] = (),
+                           knowledge_base: Callable[[MessageContext], object] = None,
+                           kb_confidence: float = 0.8,
+                           decorate_kb_answer: Callable[[MessageContext, str], str] = None,
+                           history: Callable[[MessageContext], Optional[Dict]] = None,
+                           prefilter=None, body_key: str = None, log_payload: bool = False,
+                           media: bool = True, name: str = "messages") -> Pipeline:
+    """Build the message pipeline shared by app.py and bot.py.
+
+    parse -> [tenant] -> filter -> [auth] -> rate_limit -> [before_generate] -> [cache] -> generate
+    -> [history] -> deliver
+    Pemanggil hanya menyediakan stage yang berbeda (generate, deliver, history, dst);
+    parse (dengan prefilter), filter grup, rate limit dan jawaban langsung knowledge base
+    (jika knowledge_base diberikan) selalu sama.
+    """
+    stages: List[Stage] = [ParseStage(prefilter, body_key=body_key, log_payload=log_payload)]
+    if tenant:
+        stages.append(FunctionStage("tenant", tenant))
+    stages.append(FilterStage(bot_sender, prefilter, media=media))
+    if auth:
+        stages.append(FunctionStage("auth", auth))
+    stages.append(RateLimitStage(is_limited, notify, exempt=rate_limit_exempt))
+    stages.extend(before_generate)
+    if knowledge_base:
+        stages.append(KnowledgeCacheStage(knowledge_base, kb_confidence, decorate_kb_answer))
+    stages.append(FunctionStage("generate", generate))
+    if history:
+        stages.append(FunctionStage("history", history))
+    stages.append(FunctionStage("deliver", deliver))
+    return Pipeline(stages, name=name)
@@ -0,0 +1,107 @@
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# typeWebhook yang tidak perlu diproses sama sekali
+DROP_WEBHOOK_TYPES = {
+    'outgoingMessageReceived': 'outgoing',
+    'outgoingAPIMessageReceived': 'outgoing',
+    'outgoingMessageStatus': 'ack',
+    'stateInstanceChanged': 'status',
+    'statusInstanceChanged': 'status',
+    'deviceInfo': 'status',
+    'incomingCall': 'call',
+    'incomingBlock': 'status',
+    'quotaExceeded': 'status',
+}
+
+_TYPE_WEBHOOK_RE = re.compile(rb'"typeWebhook"\s*:\s*"([^"]*)"')
+_STATUS_BROADCAST_RE = re.compile(rb'"chatId"\s*:\s*"status@broadcast"')
+
+
+def extract_text(message_data: Dict) -> str:
+    """Extract text from textMessage, extendedTextMessage or quotedMessage payloads"""
+    type_message = message_data.get('typeMessage')
+    if type_message == 'textMessage':
+        return message_data.get('textMessageData', {}).get('textMessage', '')
+    if type_message in ('extendedTextMessage', 'quotedMessage'):
+        return message_data.get('extendedTextMessageData', {}).get('text', '')
+    return ''
+
+
+class WebhookPreFilter:
+    """Cheap pre-filter for webhook notifications and group chats"""
+
+    def __init__(self, command_prefixes: List[str] = None):
+        self.command_prefixes = [p for p in (command_prefixes or ['/']) if p]
+
+    def drop(self, reason: str) -> str:
+        """Count a dropped notification and return the reason"""
+        metrics.incr(f'prefilter.dropped.{reason}')
+        return reason
+
+    def check_raw(self, raw: bytes) -> Optional[str]:
+        """Check raw webhook body without full JSON parse, return drop reason or None"""
+        match = _TYPE_WEBHOOK_RE.search(raw or b'')
+        if not match:
+            return self.drop('invalid')
+
+        type_webhook = match.group(1).decode('utf-8', 'replace')
+        if type_webhook != 'incomingMessageReceived':
+            return self.drop(DROP_WEBHOOK_TYPES.get(type_webhook, 'other'))
+
+        # Update status WhatsApp (story) juga masuk sebagai incomingMessageReceived
+        if _STATUS_BROADCAST_RE.search(raw):
+            return self.drop('status')
+
+        return None
+
+    def check_data(self, data: Dict) -> Optional[str]:
+        """Same checks as check_raw for an already parsed webhook (e.g. bot.py process_message)"""
+        type_webhook = (data or {}).get('typeWebhook')
+        if not type_webhook:
+            return self.drop('invalid')
+        if type_webhook != 'incomingMessageReceived':
+            return self.drop(DROP_WEBHOOK_TYPES.get(type_webhook, 'other'))
+        if data.get('senderData', {}).get('chatId') == 'status@broadcast':
+            return self.drop('status')
+        return None
+
+    def check_group(self, data: Dict, text: str) -> Tuple[Optional[str], str]:
+        """Check whether a group message addresses the bot.
+
+        Returns (drop_reason, text). Di grup bot hanya merespons jika di-mention,
+        di-reply, atau pesan diawali command prefix; mention dibuang dari text.
+        """
+        chat_id = data.get('senderData', {}).get('chatId', '')
+        if not chat_id.endswith('@g.us'):
+            return None, text
+
+        bot_id = data.get('instanceData', {}).get('wid', '')
+        bot_number = bot_id.split('@')[0]
+        message_data = data.get('messageData', {})
+
+        # Di-mention: "@628xxx" di teks atau ada di mentionedJidList
+        extended = message_data.get('extendedTextMessageData', {})
+        mentioned = extended.get('mentionedJidList') or message_data.get('mentionedJidList') or []
+        if bot_number and (bot_id in mentioned or f"@{bot_number}" in text):
+            metrics.incr('prefilter.group.mention')
+            return None, text.replace(f"@{bot_number}", '').strip()
+
+        # Reply ke pesan bot
+        quoted = message_data.get('quotedMessage', {})
+        if bot_id and quoted.get('participant') == bot_id:
+            metrics.incr('prefilter.group.reply')
+            return None, text
+
+        # Command prefix
+        stripped = text.lstrip()
+        if any(stripped.startswith(prefix) for prefix in self.command_prefixes):
+            metrics.incr('prefilter.group.command')
+            return None, text
+
+        return self.drop('group_not_addressed'), text
@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame, thread_name: str) -> str:
+    """Collapsed-stack line (root first, ';' separated) for one thread's current frame"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.append(thread_name)
+    names.reverse()
+    return ';'.join(name.replace(';', ':') for name in names)
+
+
+class SamplingProfiler:
+    """On-demand wall-clock sampling profiler for all threads.
+
+    Tidak ada hook/trace yang terpasang saat tidak berjalan - overhead nol.
+    Saat berjalan, satu thread mengambil sys._current_frames() setiap interval
+    dan hasilnya ditulis dalam format collapsed stack (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, directory: str = 'profiles', interval: float = 0.01, max_duration: float = 120.0):
+        self.directory = directory
+        self.interval = interval
+        self.max_duration = max_duration
+
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        self.last_output: Optional[str] = None
+        self._on_done: Optional[Callable[[str], None]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float, on_done: Callable[[str], None] = None) -> bool:
+        """Start sampling for duration seconds. Returns False if already running"""
+        with self._lock:
+            if self.running:
+                return False
+            self.duration = max(0.1, min(duration, self.max_duration))
+            self.samples = Counter()
+            self.sample_count = 0
+            self.started_at = time.time()
+            self._on_done = on_done
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        logger.info(f"Profiler started for {self.duration:.0f}s (interval {self.interval * 1000:.0f}ms)")
+        return True
+
+    def stop(self, wait: float = 5.0) -> Optional[str]:
+        """Stop sampling early and return the output path"""
+        thread = self._thread
+        if thread is None:
+            return self.last_output
+        self._stop.set()
+        thread.join(wait)
+        return self.last_output
+
+    def _run(self):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + self.duration
+        overhead = 0.0
+
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            tick = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.samples[collapse_stack(frame, names.get(thread_id, f"thread-{thread_id}"))] += 1
+            self.sample_count += 1
+            overhead += time.perf_counter() - tick
+            self._stop.wait(self.interval)
+
+        metrics.observe('profiler.sample_cost', overhead / max(1, self.sample_count))
+        self.last_output = self.write()
+        if self._on_done:
+            try:
+                self._on_done(self.last_output)
+            except Exception as e:
+                logger.error(f"Error in profiler callback: {str(e)}")
+
+    def write(self) -> str:
+        """Write collapsed stacks ("frame;frame;frame count" per line) to the profile directory"""
+        os.makedirs(self.directory, exist_ok=True)
+        name = time.strftime('profile-%Y%m%d-%H%M%S', time.localtime(self.started_at or time.time()))
+        path = os.path.join(self.directory, f"{name}-{os.getpid()}.collapsed")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Profiler wrote {self.sample_count} samples ({len(self.samples)} stacks) to {path}")
+        return path
+
+    def top(self, limit: int = 5) -> List[str]:
+        """Leaf functions with the most samples (quick summary for chat replies)"""
+        leaves = Counter()
+        for stack, count in list(self.samples.items()):
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [f"{count / total:.0%} {name}" for name, count in leaves.most_common(limit)]
+
+    def outputs(self) -> List[str]:
+        """Profile files written so far, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name for name in os.listdir(self.directory) if name.endswith('.collapsed')), reverse=True)
+
+    def get_state(self) -> Dict:
+        """Profiler state for status endpoints"""
+        return {
+            'running': self.running,
+            'started_at': self.started_at,
+            'duration': self.duration,
+            'interval': self.interval,
+            'samples': self.sample_count,
+            'stacks': len(self.samples),
+            'last_output': self.last_output
+        }
@@ -0,0 +1,211 @@
+import re
+import time
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+from config import Config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Arm A/B test: "routed" memakai pilihan router, "control" selalu model default role
+ARM_ROUTED = "routed"
+ARM_CONTROL = "control"
+
+# Tier model hasil routing
+TIER_FAST = "fast"
+TIER_DEFAULT = "default"
+TIER_STRONG = "strong"
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+INDONESIAN_WORDS = {
+    "yang", "dan", "di", "ke", "dari", "ini", "itu", "apa", "bagaimana", "kenapa", "mengapa",
+    "saya", "aku", "kamu", "tidak", "bisa", "ada", "dengan", "untuk", "tolong", "dong", "ya", "sih"
+}
+ENGLISH_WORDS = {
+    "the", "and", "is", "are", "what", "how", "why", "you", "can", "please", "with", "for",
+    "this", "that", "do", "does", "i", "my", "of", "to"
+}
+
+GREETINGS = {
+    "halo", "hallo", "hai", "hi", "hello", "hey", "pagi", "siang", "sore", "malam", "assalamualaikum",
+    "makasih", "terima", "kasih", "thanks", "thank", "ok", "oke", "sip", "mantap", "test", "ping"
+}
+REASONING_WORDS = {
+    "kenapa", "mengapa", "bagaimana", "jelaskan", "bandingkan", "analisis", "analisa", "buatkan",
+    "rancang", "why", "how", "explain", "compare", "analyze", "design", "write", "tulis"
+}
+FACTUAL_WORDS = {
+    "apa", "siapa", "kapan", "dimana", "mana", "berapa", "what", "who", "when", "where", "which"
+}
+CODE_MARKERS = ("```", "def ", "function", "traceback", "error:", "exception", "select ", "import ")
+
+
+def detect_language(words) -> str:
+    """Guess message language from common function words"""
+    indonesian = sum(1 for word in words if word in INDONESIAN_WORDS)
+    english = sum(1 for word in words if word in ENGLISH_WORDS)
+    if english > indonesian:
+        return "en"
+    return "id" if indonesian else "unknown"
+
+
+def classify_question(text: str, words) -> str:
+    """Classify a message: greeting, code, reasoning, factual or chat"""
+    lowered = text.lower()
+    if any(marker in lowered for marker in CODE_MARKERS):
+        return "code"
+    if words and len(words) <= 4 and all(word in GREETINGS for word in words):
+        return "greeting"
+    if any(word in REASONING_WORDS for word in words):
+        return "reasoning"
+    if any(word in FACTUAL_WORDS for word in words) or text.rstrip().endswith('?'):
+        return "factual"
+    return "chat"
+
+
+def extract_features(text: str, depth: int = 0) -> Dict:
+    """Cheap local features used for routing (no model calls)"""
+    words = _WORD_RE.findall(text.lower())
+    return {
+        "words": len(words),
+        "chars": len(text),
+        "language": detect_language(words),
+        "question_type": classify_question(text, words),
+        "depth": depth
+    }
+
+
+class Route:
+    """Routing decision for one message"""
+
+    def __init__(self, model: str, max_tokens: int, tier: str, arm: str, features: Dict):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.tier = tier
+        self.arm = arm
+        self.features = features
+
+    def __repr__(self):
+        return f"Route({self.tier}:{self.model}, arm={self.arm}, max_tokens={self.max_tokens})"
+
+
+class ModelRouter:
+    """Pick a fast or strong model per message from local features and per-role rules.
+
+    Aturan routing per role ada di USER_ROLES[role]["routing"]:
+        fast_model, fast_max_tokens, fast_max_words, fast_types, fast_languages,
+        max_fast_depth, strong_model, strong_types
+    Role tanpa "routing" (mis. admin/VIP) selalu memakai ai_model.
+    """
+
+    def __init__(self, enabled: bool = True, control_share: float = 0.0,
+                 depth_window: float = 1800.0, max_chats: int = 10000):
+        self.enabled = enabled
+        self.control_share = control_share
+        self.depth_window = depth_window
+        self.max_chats = max_chats
+
+        # Kedalaman percakapan per chat: (jumlah pesan, waktu pesan terakhir), LRU
+        self._depth: "OrderedDict[str, tuple]" = OrderedDict()
+        self._arms: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Config = None) -> 'ModelRouter':
+        """Build router from Config"""
+        config = config or Config
+        return cls(
+            enabled=config.ROUTER_ENABLED,
+            control_share=config.ROUTER_AB_CONTROL_SHARE,
+            depth_window=config.ROUTER_DEPTH_WINDOW_SECONDS
+        )
+
+    def conversation_depth(self, chat_key: str) -> int:
+        """Count this message in the chat's conversation and return the depth before it"""
+        now = time.time()
+        with self._lock:
+            count, last = self._depth.pop(chat_key, (0, 0.0))
+            if now - last > self.depth_window:
+                count = 0
+            self._depth[chat_key] = (count + 1, now)
+            while len(self._depth) > self.max_chats:
+                self._depth.popitem(last=False)
+        return count
+
+    def arm_for(self, chat_key: str) -> str:
+        """Sticky A/B assignment per chat (same chat always lands in the same arm)"""
+        if self.control_share <= 0:
+            return ARM_ROUTED
+        bucket = zlib.crc32(chat_key.encode('utf-8')) % 10000 / 10000
+        return ARM_CONTROL if bucket < self.control_share else ARM_ROUTED
+
+    def route(self, text: str, chat_key: str, user_config: Dict, max_tokens: int) -> Route:
+        """Choose model and max_tokens for one message"""
+        features = extract_features(text, self.conversation_depth(chat_key))
+        rules = user_config.get("routing")
+        default_model = user_config["ai_model"]
+
+        if not self.enabled or not rules:
+            return self._decide(default_model, max_tokens, TIER_DEFAULT, ARM_ROUTED, features, user_config)
+
+        arm = self.arm_for(chat_key)
+        if arm == ARM_CONTROL:
+            return self._decide(default_model, max_tokens, TIER_DEFAULT, arm, features, user_config)
+
+        question_type = features["question_type"]
+        if (rules.get("strong_model") and question_type in rules.get("strong_types", ())):
+            return self._decide(rules["strong_model"], max_tokens, TIER_STRONG, arm, features, user_config)
+
+        if (rules.get("fast_model")
+                and question_type in rules.get("fast_types", ("greeting", "chat", "factual"))
+                and features["words"] <= rules.get("fast_max_words", 12)
+                and features["language"] in rules.get("fast_languages", (features["language"],))
+                and features["depth"] <= rules.get("max_fast_depth", 3)):
+            fast_tokens = min(max_tokens, rules.get("fast_max_tokens", max_tokens))
+            return self._decide(rules["fast_model"], fast_tokens, TIER_FAST, arm, features, user_config)
+
+        return self._decide(default_model, max_tokens, TIER_DEFAULT, arm, features, user_config)
+
+    def _decide(self, model: str, max_tokens: int, tier: str, arm: str, features: Dict, user_config: Dict) -> Route:
+        metrics.incr(f'router.tier.{tier}')
+        metrics.incr(f'router.{user_config.get("role", "unknown")}.{tier}')
+        route = Route(model, max_tokens, tier, arm, features)
+        logger.debug(f"{route} for {features}")
+        return route
+
+    def record(self, route: Route, latency: float, tokens: int = 0, error: bool = False):
+        """Record the outcome of a routed call in its A/B arm"""
+        metrics.observe(f'router.arm.{route.arm}.latency', latency)
+        metrics.observe(f'router.tier.{route.tier}.latency', latency)
+        if error:
+            metrics.incr(f'router.arm.{route.arm}.errors')
+        with self._lock:
+            stats = self._arms.setdefault(route.arm, {'requests': 0, 'errors': 0, 'tokens': 0, 'latency': 0.0})
+            stats['requests'] += 1
+            stats['errors'] += int(error)
+            stats['tokens'] += tokens
+            stats['latency'] += latency
+
+    def get_state(self) -> Dict:
+        """Per-arm latency, token and error statistics for status endpoints"""
+        with self._lock:
+            arms = {arm: dict(stats) for arm, stats in self._arms.items()}
+        for arm, stats in arms.items():
+            requests = stats['requests'] or 1
+            stats.update({
+                'avg_latency': round(stats.pop('latency') / requests, 3),
+                'avg_tokens': round(stats['tokens'] / requests, 1),
+                'error_rate': round(stats['errors'] / requests, 4),
+                'latency_p95': round(metrics.percentile(f'router.arm.{arm}.latency', 95), 3)
+            })
+        return {
+            'enabled': self.enabled,
+            'control_share': self.control_share,
+            'tracked_chats': len(self._depth),
+            'arms': arms
+        }
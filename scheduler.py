@@ -0,0 +1,511 @@
+import os
+import re
+import math
+import time
+import uuid
+import queue
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Status pesan terjadwal: pending -> sending -> sent (atau failed / cancelled)
+STATE_PENDING = "pending"
+STATE_SENDING = "sending"
+STATE_SENT = "sent"
+STATE_FAILED = "failed"
+STATE_CANCELLED = "cancelled"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled (
+    id TEXT PRIMARY KEY,
+    tenant TEXT NOT NULL DEFAULT 'default',
+    chat_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    due_at REAL NOT NULL,
+    state TEXT NOT NULL,
+    created_by TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scheduled_due ON scheduled (state, due_at);
+CREATE INDEX IF NOT EXISTS idx_scheduled_updated ON scheduled (state, updated_at);
+CREATE INDEX IF NOT EXISTS idx_scheduled_chat ON scheduled (chat_id, state);
+"""
+
+
+class TimerWheel:
+    """Hierarchical timer wheel (levels x slots, like the Linux kernel timer wheel).
+
+    add() O(1): level dipilih dari jarak ke tick sekarang, slot dari bit tick
+    jatuh tempo. advance() memproses tick satu per satu; saat level bawah
+    berputar penuh, satu slot level atas di-cascade ke bawah (amortized O(1)
+    per entry per level). Entry di luar jangkauan wheel disimpan di overflow.
+    """
+
+    def __init__(self, tick: float = 1.0, slot_bits: int = 8, levels: int = 4, start: float = None):
+        self.tick = tick
+        self.slot_bits = slot_bits
+        self.levels = levels
+        self.mask = (1 << slot_bits) - 1
+        self.wheel = [[[] for _ in range(1 << slot_bits)] for _ in range(levels)]
+        self.overflow: List[Tuple[int, object]] = []
+        self.current = self.tick_of(time.time() if start is None else start)
+        self.size = 0
+
+    def tick_of(self, when: float) -> int:
+        return int(when // self.tick)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, due: float, item):
+        """Insert item due at epoch seconds (overdue items fire on the next tick)"""
+        # Dibulatkan ke atas: tidak pernah fire sebelum waktunya, paling lambat satu tick
+        self._insert(max(math.ceil(due / self.tick), self.current), item)
+        self.size += 1
+
+    def _insert(self, due_tick: int, item):
+        delta = due_tick - self.current
+        for level in range(self.levels):
+            if delta < 1 << (self.slot_bits * (level + 1)):
+                slot = (due_tick >> (self.slot_bits * level)) & self.mask
+                self.wheel[level][slot].append((due_tick, item))
+                return
+        self.overflow.append((due_tick, item))
+
+    def _cascade(self, level: int):
+        slot = (self.current >> (self.slot_bits * level)) & self.mask
+        entries, self.wheel[level][slot] = self.wheel[level][slot], []
+        for due_tick, item in entries:
+            self._insert(due_tick, item)
+
+    def advance(self, now: float = None) -> List:
+        """Process every tick up to now and return the items that became due"""
+        target = self.tick_of(time.time() if now is None else now)
+        due = []
+        while self.current <= target:
+            # Level bawah berputar penuh di tick ini -> turunkan slot level atas (dari yang tertinggi)
+            rolled = 0
+            while rolled + 1 < self.levels and self.current & ((1 << (self.slot_bits * (rolled + 1))) - 1) == 0:
+                rolled += 1
+            if self.overflow and self.current & ((1 << (self.slot_bits * self.levels)) - 1) == 0:
+                entries, self.overflow = self.overflow, []
+                for due_tick, item in entries:
+                    self._insert(due_tick, item)
+            for level in range(rolled, 0, -1):
+                self._cascade(level)
+
+            slot = self.current & self.mask
+            entries = self.wheel[0][slot]
+            if entries:
+                self.wheel[0][slot] = []
+                due.extend(item for _, item in entries)
+            self.current += 1
+        self.size -= len(due)
+        return due
+
+    def next_tick_at(self) -> float:
+        """Epoch seconds at which the next unprocessed tick starts"""
+        return self.current * self.tick
+
+
+class ScheduleStore:
+    """Durable SQLite store of scheduled sends (source of truth for the timer wheel)"""
+
+    def __init__(self, path: str = 'schedule.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if self.path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Koneksi SQLite tidak boleh dipakai lintas fork (gunicorn --preload)
+                self._connect()
+            return self._conn.execute(sql, params)
+
+    def add(self, schedule_id: str, chat_id: str, message: str, due_at: float,
+            tenant: str = 'default', created_by: Optional[str] = None):
+        """Store one pending send"""
+        now = time.time()
+        self._execute(
+            "INSERT INTO scheduled (id, tenant, chat_id, message, due_at, state, created_by, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (schedule_id, tenant, chat_id, message, due_at, STATE_PENDING, created_by, now, now)
+        )
+
+    def due_between(self, start: float, end: float) -> List[Tuple[str, float, str]]:
+        """(id, due_at, tenant) of pending sends due in [start, end)"""
+        rows = self._execute("SELECT id, due_at, tenant FROM scheduled WHERE state = ? AND due_at >= ? AND due_at < ?",
+                             (STATE_PENDING, start, end)).fetchall()
+        return [(row['id'], row['due_at'], row['tenant']) for row in rows]
+
+    def touched_since(self, since: float, due_before: float) -> List[Tuple[str, float, str]]:
+        """(id, due_at, tenant) of pending sends added/rescheduled since a time and due before a time"""
+        rows = self._execute("SELECT id, due_at, tenant FROM scheduled WHERE state = ? AND updated_at >= ? AND due_at < ?",
+                             (STATE_PENDING, since, due_before)).fetchall()
+        return [(row['id'], row['due_at'], row['tenant']) for row in rows]
+
+    def claim(self, schedule_id: str, due_before: float) -> Optional[Dict]:
+        """Atomically take a due send (only one worker wins; cancelled/rescheduled ones are skipped)"""
+        cursor = self._execute(
+            "UPDATE scheduled SET state = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE id = ? AND state = ? AND due_at < ?",
+            (STATE_SENDING, time.time(), schedule_id, STATE_PENDING, due_before)
+        )
+        if cursor.rowcount != 1:
+            return None
+        row = self._execute("SELECT * FROM scheduled WHERE id = ?", (schedule_id,)).fetchone()
+        return dict(row) if row else None
+
+    def renew(self, schedule_ids: List[str]) -> int:
+        """Refresh updated_at of sends still being sent by this process (recover_stale tidak mengambilnya)"""
+        if not schedule_ids:
+            return 0
+        cursor = self._execute(
+            f"UPDATE scheduled SET updated_at = ? WHERE state = ? AND id IN ({', '.join('?' * len(schedule_ids))})",
+            (time.time(), STATE_SENDING, *schedule_ids)
+        )
+        return cursor.rowcount
+
+    def mark_sent(self, schedule_id: str):
+        self._execute("UPDATE scheduled SET state = ?, updated_at = ? WHERE id = ?",
+                      (STATE_SENT, time.time(), schedule_id))
+
+    def reschedule(self, schedule_id: str, due_at: float, error: str):
+        """Put a failed send back to pending for a later retry"""
+        self._execute("UPDATE scheduled SET state = ?, due_at = ?, error = ?, updated_at = ? WHERE id = ?",
+                      (STATE_PENDING, due_at, error, time.time(), schedule_id))
+
+    def mark_failed(self, schedule_id: str, error: str):
+        self._execute("UPDATE scheduled SET state = ?, error = ?, updated_at = ? WHERE id = ?",
+                      (STATE_FAILED, error, time.time(), schedule_id))
+
+    def cancel(self, schedule_id: str, chat_id: Optional[str] = None) -> bool:
+        """Cancel a pending send (optionally only if it belongs to chat_id)"""
+        sql = "UPDATE scheduled SET state = ?, updated_at = ? WHERE id = ? AND state = ?"
+        params = (STATE_CANCELLED, time.time(), schedule_id, STATE_PENDING)
+        if chat_id:
+            sql += " AND chat_id = ?"
+            params += (chat_id,)
+        return self._execute(sql, params).rowcount == 1
+
+    def pending_for(self, chat_id: str, tenant: str = 'default') -> List[Dict]:
+        """Pending sends of one chat, soonest first"""
+        rows = self._execute("SELECT * FROM scheduled WHERE chat_id = ? AND tenant = ? AND state = ? ORDER BY due_at",
+                             (chat_id, tenant, STATE_PENDING)).fetchall()
+        return [dict(row) for row in rows]
+
+    def recover_stale(self, lease: float, max_attempts: int) -> int:
+        """Return sends stuck in 'sending' (worker crashed mid-send) to pending, or fail them"""
+        now = time.time()
+        self._execute("UPDATE scheduled SET state = ?, error = 'too many attempts', updated_at = ? "
+                      "WHERE state = ? AND updated_at < ? AND attempts >= ?",
+                      (STATE_FAILED, now, STATE_SENDING, now - lease, max_attempts))
+        return self._execute("UPDATE scheduled SET state = ?, due_at = ?, updated_at = ? "
+                             "WHERE state = ? AND updated_at < ?",
+                             (STATE_PENDING, now, now, STATE_SENDING, now - lease)).rowcount
+
+    def purge(self, older_than: float = 86400.0) -> int:
+        """Delete finished sends older than older_than seconds"""
+        cursor = self._execute("DELETE FROM scheduled WHERE state IN (?, ?, ?) AND updated_at < ?",
+                               (STATE_SENT, STATE_FAILED, STATE_CANCELLED, time.time() - older_than))
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Number of scheduled sends per state"""
+        rows = self._execute("SELECT state, COUNT(*) AS n FROM scheduled GROUP BY state").fetchall()
+        return {row['state']: row['n'] for row in rows}
+
+
+class Scheduler:
+    """Sends messages at a later time: SQLite store + in-memory timer wheel.
+
+    Store menyimpan semua pesan terjadwal; wheel hanya memuat yang jatuh tempo
+    dalam horizon ke depan (dimuat ulang setiap load_interval lewat query
+    berindeks), sehingga jutaan pesan jauh di masa depan tidak memakan memori.
+    Thread wheel hanya memindahkan entry yang jatuh tempo ke antrian; satu
+    thread dispatcher per tenant yang mengklaim (aman untuk banyak worker) dan
+    mengirim lewat send(entry) - boleh blocking karena throttling, dan tenant
+    yang upstream-nya mati tidak menahan pengingat tenant lain.
+
+    Selama is_available(tenant) False pesan tidak diklaim (tetap pending,
+    dicoba lagi setiap defer_delay detik). Pesan yang sedang dikirim
+    diperpanjang lease-nya, jadi worker lain tidak mengembalikannya ke pending
+    (dan mengirim ulang) walau menunggu throttle lebih lama dari lease.
+    """
+
+    def __init__(self, store: ScheduleStore, send: Callable[[Dict], bool], tick: float = 1.0,
+                 horizon: float = 3600.0, load_interval: float = 30.0, retry_delay: float = 60.0,
+                 max_attempts: int = 3, lease: float = 600.0, enabled: bool = True,
+                 is_available: Callable[[str], bool] = None, defer_delay: float = 5.0):
+        self.store = store
+        self.send = send
+        self.tick = tick
+        self.load_interval = load_interval
+        # Horizon harus lebih panjang dari interval load, supaya tidak ada pesan yang terlewat
+        self.horizon = max(horizon, 2 * load_interval)
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.enabled = enabled
+        self.is_available = is_available
+        self.defer_delay = defer_delay
+
+        self.wheel = TimerWheel(tick)
+        self.stopped = threading.Event()
+        self.loaded_until = 0.0
+        self._last_load = 0.0
+        self._known = set()
+        self._dispatchers: Dict[str, queue.Queue] = {}
+        self._sending = set()
+        self._last_renew = 0.0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, store: ScheduleStore, send: Callable[[Dict], bool], config: Config = None,
+                    is_available: Callable[[str], bool] = None) -> 'Scheduler':
+        """Build from Config"""
+        config = config or Config
+        return cls(
+            store, send,
+            tick=config.SCHEDULER_TICK_SECONDS,
+            horizon=config.SCHEDULER_HORIZON_SECONDS,
+            load_interval=config.SCHEDULER_LOAD_INTERVAL,
+            retry_delay=config.SCHEDULER_RETRY_SECONDS,
+            max_attempts=config.SCHEDULER_MAX_ATTEMPTS,
+            lease=config.SCHEDULER_LEASE_SECONDS,
+            enabled=config.SCHEDULER_ENABLED,
+            is_available=is_available
+        )
+
+    def _add_to_wheel(self, schedule_id: str, due_at: float, tenant: str):
+        with self._lock:
+            if schedule_id in self._known:
+                return
+            self._known.add(schedule_id)
+            self.wheel.add(due_at, (schedule_id, due_at, tenant))
+
+    def _queue_for(self, tenant: str) -> queue.Queue:
+        """Ready queue of a tenant; its dispatcher thread is started on first use"""
+        with self._lock:
+            ready = self._dispatchers.get(tenant)
+            if ready is None:
+                ready = self._dispatchers[tenant] = queue.Queue()
+                threading.Thread(target=self._run_dispatcher, args=(ready,), name=f"scheduler-dispatch-{tenant}",
+                                 daemon=True).start()
+            return ready
+
+    def schedule(self, chat_id: str, message: str, due_at: float, tenant: str = 'default',
+                 created_by: Optional[str] = None) -> str:
+        """Store a send for due_at (epoch seconds) and return its id"""
+        schedule_id = uuid.uuid4().hex[:10]
+        self.store.add(schedule_id, chat_id, message, due_at, tenant, created_by)
+        metrics.incr('scheduler.scheduled')
+        # Di dalam horizon yang sudah dimuat: langsung ke wheel; selebihnya dimuat loader nanti
+        if due_at < self.loaded_until:
+            self._add_to_wheel(schedule_id, due_at, tenant)
+        return schedule_id
+
+    def cancel(self, schedule_id: str, chat_id: Optional[str] = None) -> bool:
+        """Cancel a pending send (the wheel entry is skipped when it fires)"""
+        cancelled = self.store.cancel(schedule_id, chat_id)
+        if cancelled:
+            metrics.incr('scheduler.cancelled')
+        return cancelled
+
+    def load(self, now: float = None) -> int:
+        """Move sends due within the horizon from the store into the wheel"""
+        now = time.time() if now is None else now
+        until = now + self.horizon
+        self.store.recover_stale(self.lease, self.max_attempts)
+        # Baru dijadwalkan/dijadwal ulang (juga oleh worker lain) dengan due di horizon lama
+        rows = self.store.touched_since(self._last_load - 1.0, self.loaded_until) if self.loaded_until else []
+        rows += self.store.due_between(self.loaded_until, until)
+        self._last_load = now
+        self.loaded_until = until
+        for schedule_id, due_at, tenant in rows:
+            self._add_to_wheel(schedule_id, due_at, tenant)
+        metrics.set_gauge('scheduler.wheel_size', len(self.wheel))
+        return len(rows)
+
+    def start(self):
+        """Start the wheel thread (per process, after fork); dispatchers start per tenant on first use"""
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self.stopped.clear()
+        with self._lock:
+            self._dispatchers = {}
+        self._thread = threading.Thread(target=self._run_wheel, name="scheduler-wheel", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        with self._lock:
+            for ready in self._dispatchers.values():
+                ready.put(None)
+
+    def _renew_sending(self):
+        # Perpanjang lease pesan yang sedang menunggu throttle / dikirim di proses ini
+        if time.monotonic() - self._last_renew < self.lease / 3:
+            return
+        self._last_renew = time.monotonic()
+        with self._lock:
+            sending = list(self._sending)
+        self.store.renew(sending)
+
+    def _run_wheel(self):
+        next_load = 0.0
+        while not self.stopped.is_set():
+            try:
+                if time.monotonic() >= next_load:
+                    self.load()
+                    next_load = time.monotonic() + self.load_interval
+                self._renew_sending()
+                with self._lock:
+                    due = self.wheel.advance()
+                    for schedule_id, _, _ in due:
+                        self._known.discard(schedule_id)
+                fired_at = time.time()
+                for schedule_id, due_at, tenant in due:
+                    metrics.observe('scheduler.fire_jitter', fired_at - due_at)
+                    self._queue_for(tenant).put((schedule_id, due_at, tenant))
+            except Exception as e:
+                logger.error(f"Error in scheduler wheel: {str(e)}")
+            self.stopped.wait(max(0.0, self.wheel.next_tick_at() - time.time()))
+
+    def _run_dispatcher(self, ready: queue.Queue):
+        while not self.stopped.is_set():
+            entry = ready.get()
+            if entry is None:
+                break
+            schedule_id, due_at, tenant = entry
+            try:
+                self._dispatch(schedule_id, due_at, tenant)
+            except Exception as e:
+                logger.error(f"Error sending scheduled message {schedule_id}: {str(e)}")
+
+    def _dispatch(self, schedule_id: str, due_at: float, tenant: str):
+        if self.is_available is not None and not self.is_available(tenant):
+            # Upstream tenant mati: jangan klaim, coba lagi nanti (jatah percobaan tidak berkurang)
+            metrics.incr('scheduler.deferred')
+            self._add_to_wheel(schedule_id, time.time() + self.defer_delay, tenant)
+            return
+
+        row = self.store.claim(schedule_id, time.time() + self.tick)
+        if row is None:
+            return  # Dibatalkan, dijadwal ulang, atau sudah diambil worker lain
+
+        with self._lock:
+            self._sending.add(schedule_id)
+        try:
+            sent = self.send(row)
+        finally:
+            with self._lock:
+                self._sending.discard(schedule_id)
+
+        if sent:
+            self.store.mark_sent(schedule_id)
+            metrics.incr('scheduler.sent')
+            metrics.observe('scheduler.send_delay', time.time() - row['due_at'])
+        elif row['attempts'] >= self.max_attempts:
+            self.store.mark_failed(schedule_id, 'send failed')
+            metrics.incr('scheduler.failed')
+            logger.warning(f"Scheduled message {schedule_id} to {row['chat_id']} failed after {row['attempts']} attempts")
+        else:
+            retry_at = time.time() + self.retry_delay
+            self.store.reschedule(schedule_id, retry_at, 'send failed')
+            metrics.incr('scheduler.retried')
+            if retry_at < self.loaded_until:
+                self._add_to_wheel(schedule_id, retry_at, tenant)
+
+    def pending(self, chat_id: str, tenant: str = 'default') -> List[Dict]:
+        """Pending sends of one chat"""
+        return self.store.pending_for(chat_id, tenant)
+
+    def get_state(self) -> Dict:
+        """Scheduler state for status endpoints"""
+        return {
+            'enabled': self.enabled,
+            'tick': self.tick,
+            'horizon': self.horizon,
+            'wheel_size': len(self.wheel),
+            'ready_queue': sum(ready.qsize() for ready in list(self._dispatchers.values())),
+            'sending': len(self._sending),
+            'fire_jitter_p99': round(metrics.percentile('scheduler.fire_jitter', 99), 3),
+            'send_delay_p99': round(metrics.percentile('scheduler.send_delay', 99), 3),
+            'store': self.store.counts()
+        }
+
+
+# ===== REMINDER PARSING =====
+
+_DURATION_UNITS = {
+    's': 1, 'detik': 1,
+    'm': 60, 'menit': 60,
+    'h': 3600, 'j': 3600, 'jam': 3600,
+    'd': 86400, 'hari': 86400,
+}
+_DURATION = re.compile(r'^((?:\d+\s*(?:detik|menit|jam|hari|s|m|h|j|d)(?![a-z])\s*)+)(.*)$', re.IGNORECASE | re.DOTALL)
+_DURATION_PART = re.compile(r'(\d+)\s*(detik|menit|jam|hari|s|m|h|j|d)(?![a-z])', re.IGNORECASE)
+_CLOCK = re.compile(r'^(?:(besok|tomorrow|\d{4}-\d{2}-\d{2})\s+)?(\d{1,2})[:.](\d{2})\b\s*(.*)$', re.IGNORECASE | re.DOTALL)
+
+
+def parse_reminder(text: str, now: float = None, utc_offset: float = 7.0) -> Tuple[float, str]:
+    """Parse "<when> <message>" into (due_at epoch seconds, message).
+
+    <when>: durasi relatif ("10m", "2 jam", "1h30m"), jam lokal ("14:30" = hari
+    ini atau besok jika sudah lewat), "besok 08:00", atau "2025-01-31 09:00".
+    Melempar ValueError jika format tidak dikenali.
+    """
+    now = time.time() if now is None else now
+    text = text.strip()
+
+    match = _DURATION.match(text)
+    if match:
+        seconds = sum(int(amount) * _DURATION_UNITS[unit.lower()] for amount, unit in _DURATION_PART.findall(match.group(1)))
+        due_at, message = now + seconds, match.group(2)
+    else:
+        match = _CLOCK.match(text)
+        if not match:
+            raise ValueError("format waktu tidak dikenali")
+        day, hour, minute, message = match.groups()
+        tz = timezone(timedelta(hours=utc_offset))
+        local_now = datetime.fromtimestamp(now, tz)
+        if day and day[0].isdigit():
+            date = datetime.strptime(day, '%Y-%m-%d').date()
+        else:
+            date = local_now.date() + timedelta(days=1 if day else 0)
+        try:
+            due = datetime(date.year, date.month, date.day, int(hour), int(minute), tzinfo=tz)
+        except ValueError:
+            raise ValueError("jam tidak valid")
+        if not day and due <= local_now:
+            due += timedelta(days=1)
+        due_at = due.timestamp()
+
+    message = message.strip()
+    if not message:
+        raise ValueError("isi pengingat kosong")
+    if due_at <= now:
+        raise ValueError("waktu sudah lewat")
+    return due_at, message
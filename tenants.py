@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from config import Config
+from knowledge import KnowledgeBase
+from broadcast import SendThrottle
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cache knowledge base per file - tenant dengan file FAQ yang sama berbagi index
+_knowledge_bases: Dict[str, KnowledgeBase] = {}
+_knowledge_lock = threading.Lock()
+
+
+def get_knowledge_base(path: Optional[str]) -> KnowledgeBase:
+    """Get the shared KnowledgeBase instance for a file path"""
+    key = path or ''
+    with _knowledge_lock:
+        kb = _knowledge_bases.get(key)
+        if kb is None:
+            kb = _knowledge_bases[key] = KnowledgeBase(path)
+        return kb
+
+
+class Tenant:
+    """One bot instance (WhatsApp number + persona) hosted in this process"""
+
+    def __init__(self, tenant_id: str, green_api_url: str, green_api_instance: str,
+                 green_api_token: str, openrouter_api_key: str, special_users: Dict[str, str],
+                 banned_users, user_roles: Dict[str, Dict], system_prompts: Dict[str, str] = None,
+                 knowledge_base_file: Optional[str] = None, max_inflight: int = 8):
+        self.tenant_id = tenant_id
+        self.green_api_url = green_api_url
+        self.green_api_instance = green_api_instance
+        self.green_api_token = green_api_token
+        self.openrouter_api_key = openrouter_api_key
+        self.special_users = special_users
+        self.banned_users = banned_users
+        self.user_roles = user_roles
+        self.system_prompts = system_prompts or {}
+        self.knowledge_base = get_knowledge_base(knowledge_base_file)
+        self.max_inflight = max_inflight
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        # Batas kirim per instance Green API, dipakai bersama pesan interaktif & broadcast
+        self.send_throttle = SendThrottle(Config.BROADCAST_RATE_PER_SECOND, Config.BROADCAST_BURST,
+                                          Config.BROADCAST_RESERVED_SHARE, Config.WEB_CONCURRENCY)
+
+    def get_green_api_url(self, endpoint: str) -> str:
+        """Generate Green API URL for specific endpoint"""
+        return f"{self.green_api_url}/waInstance{self.green_api_instance}/{endpoint}/{self.green_api_token}"
+
+    def try_acquire(self) -> bool:
+        """Take one LLM slot from this tenant's quota without blocking"""
+        if self._slots.acquire(blocking=False):
+            return True
+        metrics.incr(f'tenant.{self.tenant_id}.quota_rejected')
+        return False
+
+    def release(self):
+        """Return an LLM slot"""
+        self._slots.release()
+
+    def get_info(self) -> Dict:
+        """Tenant information without secrets"""
+        return {
+            'tenant_id': self.tenant_id,
+            'green_api_instance': self.green_api_instance,
+            'special_users': len(self.special_users),
+            'banned_users': len(self.banned_users),
+            'roles': list(self.user_roles.keys()),
+            'knowledge_base': self.knowledge_base.path,
+            'max_inflight': self.max_inflight
+        }
+
+
+class TenantRegistry:
+    """Tenants hosted in this process, routed by webhook path or Green API instance id"""
+
+    def __init__(self, default: Tenant):
+        self.default = default
+        self.tenants: Dict[str, Tenant] = {default.tenant_id: default}
+        self._by_instance: Dict[str, Tenant] = {}
+        if default.green_api_instance:
+            self._by_instance[str(default.green_api_instance)] = default
+
+    def add(self, tenant: Tenant):
+        """Register a tenant"""
+        self.tenants[tenant.tenant_id] = tenant
+        if tenant.green_api_instance:
+            self._by_instance[str(tenant.green_api_instance)] = tenant
+
+    def get(self, tenant_id: Optional[str]) -> Optional[Tenant]:
+        """Get tenant by id (None = default tenant)"""
+        if not tenant_id:
+            return self.default
+        return self.tenants.get(tenant_id)
+
+    def by_instance(self, instance_id) -> Tenant:
+        """Get tenant by Green API idInstance, falling back to the default tenant"""
+        return self._by_instance.get(str(instance_id), self.default)
+
+    def load_file(self, path: str, base_roles: Dict[str, Dict], base_prompts: Dict[str, str]) -> List[str]:
+        """Load tenants from a JSON file.
+
+        Format: {"tenants": [{"id": ..., "green_api_instance": ..., "green_api_token": ...,
+        "special_users": {...}, "user_roles": {...}, "system_prompts": {...}}]}.
+        user_roles/system_prompts yang tidak diisi memakai konfigurasi default.
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        loaded = []
+        for entry in data.get('tenants', []):
+            roles = {name: dict(role) for name, role in base_roles.items()}
+            for name, overrides in entry.get('user_roles', {}).items():
+                roles.setdefault(name, {}).update(overrides)
+
+            tenant = Tenant(
+                tenant_id=entry['id'],
+                green_api_url=entry.get('green_api_url', self.default.green_api_url),
+                green_api_instance=str(entry['green_api_instance']),
+                green_api_token=entry['green_api_token'],
+                openrouter_api_key=entry.get('openrouter_api_key', self.default.openrouter_api_key),
+                special_users=entry.get('special_users', {}),
+                banned_users=set(entry.get('banned_users', [])),
+                user_roles=roles,
+                system_prompts={**base_prompts, **entry.get('system_prompts', {})},
+                knowledge_base_file=entry.get('knowledge_base_file', self.default.knowledge_base.path),
+                max_inflight=entry.get('max_inflight', Config.TENANT_MAX_INFLIGHT)
+            )
+            self.add(tenant)
+            loaded.append(tenant.tenant_id)
+
+        logger.info(f"Loaded {len(loaded)} tenant(s) from {path}: {', '.join(loaded)}")
+        return loaded
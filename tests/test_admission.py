@@ -0,0 +1,81 @@
+"""Tests for LLM admission control.
+
+Usage: python -m pytest tests (atau python -m unittest discover tests)
+"""
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, MODE_SHED  # noqa: E402
+
+
+class AdmitTest(unittest.TestCase):
+    def test_concurrent_admits_never_exceed_max_inflight(self):
+        controller = AdmissionController(max_inflight=4, degrade_inflight=2)
+        barrier = threading.Barrier(32)
+        admitted = []
+        lock = threading.Lock()
+
+        def request():
+            barrier.wait()
+            admission = controller.admit(priority=4)
+            with lock:
+                admitted.append(admission)
+
+        threads = [threading.Thread(target=request) for _ in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        served = [admission for admission in admitted if admission.mode != MODE_SHED]
+        self.assertEqual(len(served), 4)
+        self.assertEqual(controller.inflight, 4)
+
+        for admission in admitted:
+            admission.release()
+            admission.release()
+        self.assertEqual(controller.inflight, 0)
+
+    def test_track_does_not_count_admitted_slot_twice(self):
+        controller = AdmissionController(max_inflight=4)
+        admission = controller.admit(priority=4)
+        with controller.track(admission):
+            self.assertEqual(controller.inflight, 1)
+        admission.release()
+        self.assertEqual(controller.inflight, 0)
+
+
+class RunningLatencyTest(unittest.TestCase):
+    def test_slow_protected_call_does_not_shed_basic_traffic(self):
+        controller = AdmissionController(shed_latency=20.0, degrade_latency=10.0, protected_priority=2)
+        vip = controller.admit(priority=1)
+        premium = controller.admit(priority=3)
+        with controller.track(vip), controller.track(premium):
+            # Kedua panggilan sudah berjalan 30 detik (lebih dari shed_latency)
+            controller._started = {token: (started - 30, priority)
+                                   for token, (started, priority) in controller._started.items()}
+            self.assertLess(controller.upstream_latency(4), 1.0)
+            self.assertNotEqual(controller.decide(priority=4), MODE_SHED)
+            # Premium sendiri melihat panggilan premium yang lambat
+            self.assertGreaterEqual(controller.upstream_latency(3), 30)
+            self.assertEqual(controller.decide(priority=3), MODE_SHED)
+            self.assertGreaterEqual(controller.upstream_latency(), 30)
+        vip.release()
+        premium.release()
+
+    def test_slow_call_at_same_priority_still_sheds(self):
+        controller = AdmissionController(shed_latency=20.0)
+        basic = controller.admit(priority=4)
+        with controller.track(basic):
+            controller._started = {token: (started - 30, priority)
+                                   for token, (started, priority) in controller._started.items()}
+            self.assertEqual(controller.admit(priority=4).mode, MODE_SHED)
+        basic.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+"""Tests for analytics export redaction.
+
+Usage: python -m pytest tests (atau python -m unittest discover tests)
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import redact_text  # noqa: E402
+
+
+class RedactTextTest(unittest.TestCase):
+    def test_phone_numbers_are_redacted(self):
+        for text, expected in (("hubungi 0812-3456-7890 ya", "hubungi [NUMBER] ya"),
+                               ("+62 812 3456 7890", "[NUMBER]"),
+                               ("wa 628123456789.", "wa [NUMBER]."),
+                               ("kantor (021) 555-1234", "kantor [NUMBER]"),
+                               ("+1 (415) 555-2671", "[NUMBER]"),
+                               ("08123456789 jam 10:30", "[NUMBER] jam 10:30")):
+            self.assertEqual(redact_text(text), expected)
+
+    def test_dates_times_amounts_and_order_numbers_are_kept(self):
+        for text in ("rapat 2024-05-01 10:30",
+                     "tgl 01-05-2024 jam 09.15",
+                     "total Rp 1.500.000",
+                     "order #12345678901",
+                     "invoice INV-2024050112",
+                     "resi 1234 5678 9012",
+                     "kode 0123"):
+            self.assertEqual(redact_text(text), text)
+
+    def test_chat_ids_and_emails_are_redacted(self):
+        self.assertEqual(redact_text("dari 628123456789@c.us ke a.b@contoh.co.id"), "dari [CHAT] ke [EMAIL]")
+        self.assertIsNone(redact_text(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
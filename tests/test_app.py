@@ -0,0 +1,78 @@
+"""Tests for the LLM request path in app.py.
+
+Usage: python -m pytest tests (atau python -m unittest discover tests)
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+# app.py membuat store & direktori saat import - arahkan ke direktori sementara
+_directory = tempfile.mkdtemp(prefix='app-test-')
+for _name, _value in (('JOB_STORE_PATH', 'jobs.db'), ('SCHEDULE_STORE_PATH', 'schedule.db'),
+                      ('BROADCAST_DIR', 'broadcasts'), ('MEDIA_SPOOL_DIR', 'media_spool'),
+                      ('EXPORT_DIR', 'exports'), ('PROFILER_DIR', 'profiles'),
+                      ('TRACE_FILE', os.path.join('traces', 'spans.jsonl'))):
+    setattr(Config, _name, os.path.join(_directory, _value))
+Config.TRACING_ENABLED = False
+
+import app  # noqa: E402
+from health import BREAKER_HALF_OPEN  # noqa: E402
+
+
+class OpenRouterOk:
+    status_code = 200
+    text = ''
+
+    def json(self):
+        return {'choices': [{'message': {'content': 'jawaban llm'}}], 'usage': {'total_tokens': 10}}
+
+
+class HalfOpenBreakerTest(unittest.TestCase):
+    CHAT = '628111111111@c.us'
+
+    def setUp(self):
+        self.breaker = app.health.breaker('openrouter')
+        for _ in range(self.breaker.failure_threshold):
+            self.breaker.record(False, 'test')
+        # Recovery timeout sudah lewat: request berikutnya boleh menjadi percobaan half-open
+        self.breaker.opened_at = time.monotonic() - self.breaker.recovery_timeout - 1
+        self.post = mock.patch.object(app.http_session, 'post', return_value=OpenRouterOk())
+        self.calls = self.post.start()
+
+    def tearDown(self):
+        self.post.stop()
+        self.breaker.record(True)
+
+    def assert_trial_still_available(self):
+        self.calls.assert_not_called()
+        self.assertFalse(self.breaker.is_open())
+
+        # Request berikutnya yang benar-benar diterima mengambil percobaan dan menutup breaker
+        usage = {}
+        self.assertIn('jawaban llm', app.get_ai_response('halo', self.CHAT, usage=usage))
+        self.assertEqual(usage['source'], 'llm')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_shed_request_does_not_take_the_trial(self):
+        with mock.patch.object(app.admission, 'max_inflight', 0):
+            usage = {}
+            app.get_ai_response('halo', self.CHAT, usage=usage)
+            self.assertEqual(usage['source'], 'fallback')
+        self.assertNotEqual(self.breaker.state, BREAKER_HALF_OPEN)
+        self.assert_trial_still_available()
+
+    def test_tenant_quota_rejection_does_not_take_the_trial(self):
+        with mock.patch.object(app.default_tenant, 'try_acquire', return_value=False):
+            app.get_ai_response('halo', self.CHAT)
+        self.assert_trial_still_available()
+
+
+if __name__ == '__main__':
+    unittest.main()
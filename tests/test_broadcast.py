@@ -0,0 +1,78 @@
+"""Tests for resumable broadcasts shared by several workers.
+
+Usage: python -m pytest tests (atau python -m unittest discover tests)
+"""
+import os
+import sys
+import tempfile
+import time
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcast import BroadcastManager, SendThrottle, STATE_RUNNING, STATE_STOPPED  # noqa: E402
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.02)
+
+
+class SharedBroadcastTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.sent = []
+        self.tenant = types.SimpleNamespace(
+            tenant_id='default', special_users={f"62{i}@c.us": 'vip' for i in range(100)}, banned_users={},
+            send_throttle=SendThrottle(rate=50, burst=1, reserved_share=0.0))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def manager(self):
+        # Satu manager per "worker"; state bersama hanya lewat direktori broadcast
+        return BroadcastManager(self.directory.name, lambda chat_id, message, tenant: self.sent.append(chat_id) or True,
+                                lambda tenant_id: self.tenant)
+
+    def test_other_worker_reads_progress_and_stops(self):
+        runner, other = self.manager(), self.manager()
+        broadcast_id = runner.start(self.tenant, 'role:vip', 'halo', None).broadcast_id
+        wait_until(lambda: len(self.sent) >= 5)
+
+        # Worker lain yang kalah flock tidak menyimpan objek "running" basi
+        other.resume_all()
+        time.sleep(0.1)
+        self.assertEqual(other.broadcasts, {})
+        status = other.get(broadcast_id)[0]
+        self.assertEqual(status.state, STATE_RUNNING)
+        self.assertGreaterEqual(status.offset, 5)
+
+        other.stop(broadcast_id)
+        wait_until(lambda: other.get(broadcast_id)[0].state == STATE_STOPPED)
+        stopped_at = len(self.sent)
+        self.assertEqual(other.get(broadcast_id)[0].offset, stopped_at)
+        self.assertLess(stopped_at, 100)
+
+        other.resume(broadcast_id)
+        wait_until(lambda: len(self.sent) == 100 and not other.broadcasts)
+        self.assertEqual(len(set(self.sent)), 100)
+
+
+class SendThrottleTest(unittest.TestCase):
+    def test_reserved_share_must_leave_room_for_bulk(self):
+        for share in (1.0, 1.5, -0.1):
+            with self.assertRaises(ValueError):
+                SendThrottle(reserved_share=share)
+
+    def test_rate_is_split_across_workers(self):
+        throttle = SendThrottle(rate=4.0, burst=8.0, reserved_share=0.3, workers=4)
+        self.assertEqual((throttle.rate, throttle.burst), (1.0, 2.0))
+        self.assertEqual(SendThrottle(rate=1.0, burst=5.0, workers=10).burst, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
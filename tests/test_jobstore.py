@@ -0,0 +1,102 @@
+"""Tests for the durable job store.
+
+Usage: python -m pytest tests (atau python -m unittest discover tests)
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobstore import JobStore, STATE_GENERATED  # noqa: E402
+
+LEASE = 0.3
+
+
+class JobLeaseTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'jobs.db')
+        self.store = JobStore(self.path, renew_interval=LEASE / 3)
+        # Worker gunicorn lain yang menjalankan recovery pada database yang sama
+        self.other_worker = JobStore(self.path, renew_interval=LEASE / 3)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_job_held_longer_than_lease_is_not_reclaimed(self):
+        self.store.receive('job-1', '628123@c.us', 'halo')
+        with self.store.leased('job-1'):
+            time.sleep(LEASE * 3)
+            self.assertEqual(self.other_worker.claim_unfinished(LEASE), [])
+            self.assertEqual(self.store.claim_unfinished(LEASE), [])
+            self.store.mark_generated('job-1', 'balasan lambat')
+            time.sleep(LEASE * 3)
+            self.assertEqual(self.other_worker.claim_unfinished(LEASE), [])
+
+    def test_abandoned_job_is_reclaimed_once(self):
+        self.store.receive('job-2', '628123@c.us', 'halo')
+        self.store.mark_generated('job-2', 'balasan')
+        time.sleep(LEASE * 1.5)
+
+        claimed = self.other_worker.claim_unfinished(LEASE)
+        self.assertEqual([job['id'] for job in claimed], ['job-2'])
+        self.assertEqual(claimed[0]['state'], STATE_GENERATED)
+        # Job yang diklaim di-hold: tidak diklaim ulang walau pengiriman melewati lease
+        time.sleep(LEASE * 3)
+        self.assertEqual(self.store.claim_unfinished(LEASE), [])
+        self.assertEqual(self.other_worker.claim_unfinished(LEASE), [])
+        self.other_worker.release('job-2')
+
+    def test_purge_keeps_jobs_finished_after_watermark(self):
+        for job_id in ('job-3', 'job-4'):
+            self.store.receive(job_id, '628123@c.us', 'halo')
+            self.store.mark_sent(job_id)
+        self.store._execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 100, 'job-3'))
+        self.store._execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 50, 'job-4'))
+
+        # Watermark export berada di antara keduanya: hanya job-3 yang sudah diekspor
+        self.assertEqual(self.store.purge(10, before=time.time() - 75), 1)
+        self.assertEqual(self.store.purge(10, before=0.0), 0)
+        self.assertEqual(self.store.purge(10), 1)
+
+
+
+class JobKeyTest(unittest.TestCase):
+    def test_same_message_id_is_deduped_per_tenant(self):
+        store = JobStore(':memory:')
+        for tenant in ('toko', 'klinik'):
+            self.assertTrue(store.receive(JobStore.job_key(tenant, 'MSG1'), '1203@g.us', 'halo', tenant))
+        self.assertFalse(store.receive(JobStore.job_key('toko', 'MSG1'), '1203@g.us', 'halo', 'toko'))
+
+    def test_migrate_prefixes_existing_ids(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jobs.db')
+            store = JobStore(path)
+            store.receive('MSG1', '628123@c.us', 'halo', 'toko')
+            store._conn.execute("PRAGMA user_version = 0")
+            store._conn.execute("UPDATE jobs SET id = 'MSG1'")
+
+            migrated = JobStore(path)
+            self.assertIsNotNone(migrated.get('toko:MSG1'))
+            self.assertIsNone(migrated.get('MSG1'))
+            # Migrasi kedua (worker lain) tidak memberi prefix dua kali
+            migrated._conn.execute("PRAGMA user_version = 0")
+            self.assertIsNotNone(JobStore(path).get('toko:MSG1'))
+
+
+class SecretTest(unittest.TestCase):
+    def test_secret_is_created_once_and_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jobs.db')
+            salt = JobStore(path).secret('export_salt')
+            self.assertEqual(len(salt), 32)
+            # Worker lain (koneksi lain) mendapat salt yang sama; default hanya dipakai saat pertama
+            self.assertEqual(JobStore(path).secret('export_salt', 'legacy'), salt)
+            self.assertEqual(JobStore(path).secret('other', 'legacy'), 'legacy')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Tests for the BM25 knowledge base.
+
+Usage: python -m pytest tests (atau python -m unittest discover tests)
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge import KnowledgeBase  # noqa: E402
+from pipeline import KnowledgeCacheStage, MessageContext  # noqa: E402
+
+FAQ = """# FAQ toko
+Kami menerima pembayaran lewat transfer bank dan e-wallet.
+
+Q: Jam buka toko?
+A: Toko buka setiap hari pukul 08.00-21.00.
+
+Q: Berapa ongkos kirim ke luar kota?
+A: Ongkos kirim luar kota dihitung dari berat paket, mulai Rp 15.000.
+
+Q: Bagaimana cara retur barang rusak?
+A: Kirim foto barang rusak dan nomor pesanan, retur diproses 3 hari kerja.
+"""
+
+
+class KnowledgeBaseTest(unittest.TestCase):
+    def setUp(self):
+        self.kb = KnowledgeBase()
+        self.kb.load_text(FAQ)
+
+    def test_ranks_matching_entry_first(self):
+        for query, expected in (("jam buka toko", "Jam buka toko?"),
+                                ("ongkos kirim ke Surabaya berapa", "Berapa ongkos kirim ke luar kota?"),
+                                ("barang saya rusak, bisa retur?", "Bagaimana cara retur barang rusak?"),
+                                ("bayar pakai e-wallet", "")):
+            results = self.kb.search(query)
+            self.assertEqual(results[0][2].question, expected, query)
+            scores = [score for score, _, _ in results]
+            self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_unrelated_or_stopword_query_finds_nothing(self):
+        self.assertEqual(self.kb.search("cuaca Jakarta"), [])
+        self.assertEqual(self.kb.search("apa itu ya"), [])
+
+    def test_direct_answer_respects_confidence_threshold(self):
+        answer = "Toko buka setiap hari pukul 08.00-21.00."
+        self.assertEqual(self.kb.answer("jam buka toko", min_confidence=0.8), answer)
+
+        # Term yang tidak ada di dokumen menurunkan confidence di bawah ambang
+        confidence = self.kb.search("jam buka toko cabang Bandung", k=1)[0][1]
+        self.assertLess(confidence, 0.8)
+        self.assertIsNone(self.kb.answer("jam buka toko cabang Bandung", min_confidence=0.8))
+        self.assertEqual(self.kb.answer("jam buka toko cabang Bandung", min_confidence=confidence), answer)
+        self.assertIsNone(self.kb.answer("jam buka toko cabang Bandung", min_confidence=confidence + 0.01))
+
+    def test_direct_answer_needs_enough_terms(self):
+        self.assertEqual(self.kb.search("retur", k=1)[0][1], 1.0)
+        self.assertIsNone(self.kb.answer("retur"))
+
+    def test_cache_stage_answers_without_llm(self):
+        stage = KnowledgeCacheStage(lambda ctx: self.kb, min_confidence=0.8,
+                                    decorate=lambda ctx, answer: f"[FAQ] {answer}")
+        ctx = MessageContext(text="ongkos kirim luar kota")
+        self.assertIsNone(stage.process(ctx))
+        self.assertTrue(ctx.response.startswith("[FAQ] Ongkos kirim luar kota"))
+        self.assertEqual(ctx.usage['source'], 'kb')
+
+        ctx = MessageContext(text="bisa kirim ke luar negeri?")
+        stage.process(ctx)
+        self.assertIsNone(ctx.response)
+        self.assertNotIn('source', ctx.usage)
+
+
+if __name__ == '__main__':
+    unittest.main()
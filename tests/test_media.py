@@ -0,0 +1,54 @@
+"""Tests for media ingestion.
+
+Usage: python -m pytest tests (atau python -m unittest discover tests)
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media import MediaPipeline, MediaSpool, check_media_url  # noqa: E402
+from metrics import metrics  # noqa: E402
+
+ALLOWED = ('green-api.com',)
+
+
+class FailingSession:
+    """Session that records requests; any download in these tests is a bug"""
+
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        raise AssertionError(f"unexpected download of {url}")
+
+
+class MediaUrlTest(unittest.TestCase):
+    def test_rejected_url_is_never_fetched(self):
+        session = FailingSession()
+        with tempfile.TemporaryDirectory() as directory:
+            pipeline = MediaPipeline(MediaSpool(directory), session, allowed_hosts=ALLOWED)
+            for url in ("http://169.254.169.254/latest/meta-data/",
+                        "https://169.254.169.254/latest/meta-data/",
+                        "http://media.green-api.com/file.jpg",
+                        "https://green-api.com.evil.example/file.jpg",
+                        "https://evilgreen-api.com/file.jpg",
+                        "https://user@localhost/file.jpg",
+                        "file:///etc/passwd"):
+                rejected = metrics.counters['media.url_rejected']
+                with self.assertRaises(ValueError, msg=url):
+                    pipeline.ingest({'typeMessage': 'imageMessage', 'fileMessageData': {'downloadUrl': url}})
+                self.assertEqual(metrics.counters['media.url_rejected'], rejected + 1)
+        self.assertEqual(session.urls, [])
+
+    def test_green_api_hosts_are_allowed(self):
+        for url in ("https://green-api.com/f.jpg", "https://sw-media-out.storage1.ir.green-api.com/f.jpg",
+                    "https://MEDIA.Green-API.com./f.jpg"):
+            self.assertEqual(check_media_url(url, ALLOWED), url)
+
+
+if __name__ == '__main__':
+    unittest.main()
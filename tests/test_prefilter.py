@@ -0,0 +1,104 @@
+"""Tests for the webhook pre-filter.
+
+Usage: python -m pytest tests (atau python -m unittest discover tests)
+"""
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import FilterStage, MessageContext, ParseStage, Pipeline  # noqa: E402
+from prefilter import WebhookPreFilter  # noqa: E402
+
+BOT = '628000000000@c.us'
+USER = '628111111111@c.us'
+GROUP = '120363000000000000@g.us'
+
+
+def webhook(type_webhook='incomingMessageReceived', chat_id=USER, sender=USER, text='halo', **message_data):
+    message_data = message_data or {'typeMessage': 'textMessage', 'textMessageData': {'textMessage': text}}
+    return {
+        'typeWebhook': type_webhook,
+        'instanceData': {'idInstance': 1, 'wid': BOT, 'typeInstance': 'whatsapp'},
+        'timestamp': None,
+        'idMessage': 'BAE5F4886F6F2D05',
+        'senderData': {'chatId': chat_id, 'sender': sender, 'senderName': 'Budi'},
+        'messageData': message_data,
+    }
+
+
+def extended(text, mentioned=None, quoted_participant=None):
+    message_data = {'typeMessage': 'extendedTextMessage',
+                    'extendedTextMessageData': {'text': text, 'mentionedJidList': mentioned or []}}
+    if quoted_participant:
+        message_data['quotedMessage'] = {'participant': quoted_participant}
+    return message_data
+
+
+class PreFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.prefilter = WebhookPreFilter(['/', '!'])
+
+    def filter_stage(self, data, prefilter=None):
+        """Result of the full ParseStage + FilterStage path (None = message is processed)"""
+        pipeline = Pipeline([ParseStage(), FilterStage(lambda ctx: BOT, prefilter=prefilter)])
+        result = pipeline.run(MessageContext(data=data))
+        return None if result == {"status": "ok"} else result['reason']
+
+    def prefilter_reason(self, data):
+        """Drop reason from the raw-body check, asserting the parsed-data check agrees"""
+        reason = self.prefilter.check_raw(json.dumps(data).encode())
+        self.assertEqual(self.prefilter.check_data(data), reason)
+        return reason
+
+    def test_drops_match_filter_stage(self):
+        cases = {
+            'ack': webhook('outgoingMessageStatus', message_data={}),
+            # Pesan bot sendiri (dari HP maupun API) datang sebagai outgoing*
+            'outgoing': webhook('outgoingAPIMessageReceived', sender=BOT),
+            'status': webhook(chat_id='status@broadcast'),
+        }
+        for expected, data in cases.items():
+            self.assertEqual(self.prefilter_reason(data), expected)
+            # FilterStage tanpa prefilter juga membuang notifikasi yang sama
+            self.assertIsNotNone(self.filter_stage(data), expected)
+
+    def test_bot_sender_is_dropped_by_filter_stage(self):
+        data = webhook(sender=BOT)
+        self.assertIsNone(self.prefilter_reason(data))
+        self.assertEqual(self.filter_stage(data, self.prefilter), 'bot message')
+
+    def test_group_message_not_addressed_to_bot(self):
+        data = webhook(chat_id=GROUP, text='ada yang tahu jadwal besok?')
+        self.assertIsNone(self.prefilter_reason(data))
+        self.assertEqual(self.prefilter.check_group(data, 'ada yang tahu jadwal besok?')[0], 'group_not_addressed')
+        self.assertEqual(self.filter_stage(data, self.prefilter), 'group_not_addressed')
+
+    def test_valid_text_messages_are_never_dropped(self):
+        bot_number = BOT.split('@')[0]
+        cases = [
+            webhook(text='halo, jam buka toko?'),
+            webhook(**extended('lanjut ya')),
+            webhook(**extended('ini balasan', quoted_participant=USER)),
+            # Teks yang mirip field webhook tidak boleh mengecoh regex raw body
+            webhook(text='"typeWebhook": "outgoingMessageStatus", "chatId": "status@broadcast"'),
+            webhook(chat_id=GROUP, **extended(f'@{bot_number} tolong cek', mentioned=[BOT])),
+            webhook(chat_id=GROUP, **extended('setuju', quoted_participant=BOT)),
+            webhook(chat_id=GROUP, text='/help'),
+            webhook(chat_id=GROUP, text='  !status'),
+        ]
+        for data in cases:
+            self.assertIsNone(self.prefilter_reason(data), data['messageData'])
+            self.assertIsNone(self.filter_stage(data, self.prefilter), data['messageData'])
+
+    def test_mention_is_stripped_from_group_text(self):
+        bot_number = BOT.split('@')[0]
+        ctx = MessageContext(data=webhook(chat_id=GROUP, **extended(f'@{bot_number} harga paket?')))
+        Pipeline([ParseStage(), FilterStage(lambda ctx: BOT, prefilter=self.prefilter)]).run(ctx)
+        self.assertEqual(ctx.text, 'harga paket?')
+
+
+if __name__ == '__main__':
+    unittest.main()
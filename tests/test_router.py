@@ -0,0 +1,92 @@
+"""Tests for per-message model routing and A/B arms.
+
+Usage: python -m pytest tests (atau python -m unittest discover tests)
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import (ARM_CONTROL, ARM_ROUTED, TIER_DEFAULT, TIER_FAST, TIER_STRONG,  # noqa: E402
+                    ModelRouter)
+
+USER_CONFIG = {
+    'role': 'basic',
+    'ai_model': 'default-model',
+    'routing': {
+        'fast_model': 'fast-model',
+        'fast_max_tokens': 150,
+        'fast_max_words': 8,
+        'max_fast_depth': 2,
+        'strong_model': 'strong-model',
+        'strong_types': ('code',),
+    },
+}
+
+
+class ArmTest(unittest.TestCase):
+    def test_arm_is_sticky_per_chat(self):
+        chats = [f"default:62812{i:07d}@c.us" for i in range(2000)]
+        first = {chat: ModelRouter(control_share=0.3).arm_for(chat) for chat in chats}
+        # Instance lain (worker lain / setelah restart) memberi arm yang sama
+        router = ModelRouter(control_share=0.3)
+        for _ in range(3):
+            self.assertEqual({chat: router.arm_for(chat) for chat in chats}, first)
+
+        control = sum(arm == ARM_CONTROL for arm in first.values()) / len(chats)
+        self.assertAlmostEqual(control, 0.3, delta=0.05)
+
+    def test_no_control_share_routes_everyone(self):
+        router = ModelRouter(control_share=0.0)
+        self.assertEqual({router.arm_for(f"chat-{i}") for i in range(100)}, {ARM_ROUTED})
+
+    def test_control_arm_always_uses_role_model(self):
+        router = ModelRouter(control_share=1.0)
+        route = router.route("halo", "default:628111@c.us", USER_CONFIG, 500)
+        self.assertEqual((route.arm, route.tier, route.model, route.max_tokens),
+                         (ARM_CONTROL, TIER_DEFAULT, 'default-model', 500))
+
+
+class TierTest(unittest.TestCase):
+    def setUp(self):
+        self.router = ModelRouter()
+
+    def route(self, text, chat_key='default:628111@c.us'):
+        return self.router.route(text, chat_key, USER_CONFIG, 500)
+
+    def test_short_message_uses_fast_model(self):
+        route = self.route("halo kak")
+        self.assertEqual((route.tier, route.model, route.max_tokens), (TIER_FAST, 'fast-model', 150))
+
+    def test_long_message_uses_default_model(self):
+        route = self.route("saya mau pesan sepuluh kotak kue untuk acara kantor hari sabtu depan")
+        self.assertGreater(route.features['words'], 8)
+        self.assertEqual((route.tier, route.model, route.max_tokens), (TIER_DEFAULT, 'default-model', 500))
+
+    def test_deep_conversation_leaves_fast_tier(self):
+        tiers = [self.route("oke lanjut").tier for _ in range(5)]
+        self.assertEqual(tiers, [TIER_FAST, TIER_FAST, TIER_FAST, TIER_DEFAULT, TIER_DEFAULT])
+        # Chat lain mulai dari kedalaman 0
+        self.assertEqual(self.route("oke lanjut", 'default:628222@c.us').tier, TIER_FAST)
+
+    def test_depth_resets_after_window(self):
+        for _ in range(5):
+            self.route("oke lanjut")
+        # Pesan terakhir lebih lama dari depth_window: percakapan dianggap baru
+        count, last = self.router._depth['default:628111@c.us']
+        self.router._depth['default:628111@c.us'] = (count, last - self.router.depth_window - 1)
+        route = self.route("oke lanjut")
+        self.assertEqual((route.features['depth'], route.tier), (0, TIER_FAST))
+
+    def test_strong_type_uses_strong_model(self):
+        route = self.route("kenapa error: list index out of range?")
+        self.assertEqual((route.tier, route.model), (TIER_STRONG, 'strong-model'))
+
+    def test_role_without_rules_uses_its_model(self):
+        route = self.router.route("halo", 'default:628111@c.us', {'role': 'vip', 'ai_model': 'vip-model'}, 800)
+        self.assertEqual((route.tier, route.model, route.max_tokens), (TIER_DEFAULT, 'vip-model', 800))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Tests for the timer wheel and reminder parsing.
+
+Usage: python -m pytest tests (atau python -m unittest discover tests)
+"""
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import TimerWheel, parse_reminder  # noqa: E402
+
+WIB = timezone(timedelta(hours=7))
+# Rabu 15 Januari 2025 10:00 WIB
+NOW = datetime(2025, 1, 15, 10, 0, tzinfo=WIB).timestamp()
+
+
+def fire_ticks(wheel, until):
+    """Advance one tick at a time and return {item: tick it fired at}"""
+    fired = {}
+    for tick in range(wheel.current, until + 1):
+        for item in wheel.advance(tick):
+            fired[item] = tick
+    return fired
+
+
+class TimerWheelTest(unittest.TestCase):
+    def test_every_delay_fires_on_its_tick_in_a_small_wheel(self):
+        # 3 level x 4 slot: jangkauan 64 tick, jadi batas level dan overflow sering dilewati
+        for start in (0, 3, 15, 62, 63, 64, 101):
+            wheel = TimerWheel(slot_bits=2, levels=3, start=start)
+            for delay in range(0, 300):
+                wheel.add(start + delay, delay)
+            fired = fire_ticks(wheel, start + 300)
+            self.assertEqual(fired, {delay: start + delay for delay in range(0, 300)}, start)
+            self.assertEqual(len(wheel), 0)
+
+    def test_fires_across_level_boundaries_of_default_wheel(self):
+        start = 250
+        wheel = TimerWheel(start=start)
+        due = [255, 256, 257, 511, 512, 65535, 65536, 65537, 65536 + 256, 70000]
+        for tick in due:
+            wheel.add(tick, tick)
+        self.assertEqual(fire_ticks(wheel, 70001), {tick: tick for tick in due})
+
+    def test_overflow_beyond_top_level_is_cascaded_back(self):
+        wheel = TimerWheel(slot_bits=2, levels=2, start=5)
+        wheel.add(5 + 16, 'batas')
+        wheel.add(5 + 100, 'jauh')
+        wheel.add(5 + 1000, 'sangat jauh')
+        self.assertEqual(len(wheel.overflow), 3)
+        self.assertEqual(fire_ticks(wheel, 1100), {'batas': 21, 'jauh': 105, 'sangat jauh': 1005})
+
+    def test_rounds_up_and_never_fires_early(self):
+        wheel = TimerWheel(tick=1.0, start=100)
+        wheel.add(105.0, 'tepat')
+        wheel.add(105.2, 'pecahan')
+        self.assertEqual(wheel.advance(104.9), [])
+        self.assertEqual(wheel.advance(105.0), ['tepat'])
+        self.assertEqual(wheel.advance(105.9), [])
+        self.assertEqual(wheel.advance(106.0), ['pecahan'])
+
+    def test_past_and_current_tick_fire_on_next_advance(self):
+        wheel = TimerWheel(start=100)
+        wheel.advance(100.5)  # tick 100 sudah diproses
+        wheel.add(90, 'lewat')
+        wheel.add(100.2, 'tick ini')
+        wheel.add(100.7, 'akhir tick ini')
+        self.assertEqual(len(wheel), 3)
+        self.assertEqual(sorted(wheel.advance(101.0)), ['akhir tick ini', 'lewat', 'tick ini'])
+        self.assertEqual(len(wheel), 0)
+
+
+class ParseReminderTest(unittest.TestCase):
+    def test_relative_durations(self):
+        self.assertEqual(parse_reminder("5m minum obat", NOW), (NOW + 300, "minum obat"))
+        self.assertEqual(parse_reminder("2j rapat tim", NOW), (NOW + 7200, "rapat tim"))
+        self.assertEqual(parse_reminder("1h30m  angkat jemuran ", NOW), (NOW + 5400, "angkat jemuran"))
+        self.assertEqual(parse_reminder("2 jam 15 menit cek oven", NOW), (NOW + 8100, "cek oven"))
+        self.assertEqual(parse_reminder("1 hari bayar listrik", NOW), (NOW + 86400, "bayar listrik"))
+
+    def test_clock_times(self):
+        at = lambda *args: datetime(*args, tzinfo=WIB).timestamp()  # noqa: E731
+        self.assertEqual(parse_reminder("14:30 telepon ibu", NOW), (at(2025, 1, 15, 14, 30), "telepon ibu"))
+        # Jam yang sudah lewat hari ini berarti besok
+        self.assertEqual(parse_reminder("09.00 absen", NOW), (at(2025, 1, 16, 9, 0), "absen"))
+        self.assertEqual(parse_reminder("besok 08:00 olahraga", NOW), (at(2025, 1, 16, 8, 0), "olahraga"))
+        self.assertEqual(parse_reminder("2025-02-01 07:15 bayar sewa", NOW), (at(2025, 2, 1, 7, 15), "bayar sewa"))
+
+    def test_invalid_text(self):
+        for text in ("5m", "2j   ", "nanti sore beli beras", "5 minggu lagi", "25:00 tidur",
+                     "2024-12-31 09:00 sudah lewat", "besok", ""):
+            with self.assertRaises(ValueError, msg=text):
+                parse_reminder(text, NOW)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from config import Config
+from metrics import metrics, _percentile
+
+
+class AdaptiveTimeouts:
+    """Per-upstream/model timeouts computed from rolling latency percentiles.
+
+    Latency disimpan ternormalisasi terhadap reference_tokens, lalu timeout =
+    percentile * skala(max_tokens) * multiplier, dibatasi floor & ceiling.
+    """
+
+    def __init__(self, percentile: float = 99.0, multiplier: float = 1.5, floor: float = 2.0,
+                 ceiling: float = 60.0, default: float = 30.0, window: int = 200,
+                 min_samples: int = 20, reference_tokens: int = 500):
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.floor = floor
+        self.ceiling = ceiling
+        self.default = default
+        self.window = window
+        self.min_samples = min_samples
+        self.reference_tokens = reference_tokens
+
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Config = None) -> 'AdaptiveTimeouts':
+        """Build from Config"""
+        config = config or Config
+        return cls(
+            percentile=config.TIMEOUT_PERCENTILE,
+            multiplier=config.TIMEOUT_MULTIPLIER,
+            floor=config.TIMEOUT_FLOOR_SECONDS,
+            ceiling=config.TIMEOUT_CEILING_SECONDS,
+            default=config.TIMEOUT_DEFAULT_SECONDS,
+            min_samples=config.TIMEOUT_MIN_SAMPLES,
+            reference_tokens=config.TIMEOUT_REFERENCE_TOKENS
+        )
+
+    @staticmethod
+    def key(upstream: str, model: Optional[str] = None) -> str:
+        """Metrics/window key for an upstream and model"""
+        return f"{upstream}:{model}" if model else upstream
+
+    def scale(self, max_tokens: Optional[int]) -> float:
+        """Latency scale for a token budget (half fixed overhead, half proportional)"""
+        if not max_tokens:
+            return 1.0
+        return 0.5 + 0.5 * max_tokens / self.reference_tokens
+
+    def _compute(self, key: str, max_tokens: Optional[int] = None) -> Optional[float]:
+        """Timeout from the rolling window, None while there are too few samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        value = _percentile(samples, self.percentile) * self.scale(max_tokens) * self.multiplier
+        return min(self.ceiling, max(self.floor, value))
+
+    def timeout(self, upstream: str, model: Optional[str] = None, max_tokens: Optional[int] = None) -> float:
+        """Get the timeout in seconds for the next call"""
+        key = self.key(upstream, model)
+        value = self._compute(key, max_tokens)
+        if value is None:
+            value = min(self.ceiling, max(self.floor, self.default))
+            metrics.incr(f'timeout.{key}.default')
+        metrics.observe(f'timeout.{key}.chosen', value)
+        return value
+
+    def record(self, upstream: str, model: Optional[str], latency: float,
+               max_tokens: Optional[int] = None, timed_out: bool = False):
+        """Record the observed latency of a call.
+
+        Untuk call yang timeout, latency adalah batas bawah (timeout yang dipakai),
+        sehingga percentile ikut naik dan timeout berikutnya lebih longgar.
+        """
+        key = self.key(upstream, model)
+        with self._lock:
+            window = self._samples.get(key)
+            if window is None:
+                window = self._samples[key] = deque(maxlen=self.window)
+            window.append(latency / self.scale(max_tokens))
+
+        metrics.observe(f'timeout.{key}.latency', latency)
+        metrics.incr(f'timeout.{key}.expired' if timed_out else f'timeout.{key}.ok')
+
+    @contextmanager
+    def track(self, upstream: str, model: Optional[str] = None, max_tokens: Optional[int] = None):
+        """Yield the timeout to use for one call and record its outcome"""
+        timeout = self.timeout(upstream, model, max_tokens)
+        start = time.monotonic()
+        try:
+            yield timeout
+        except Exception as e:
+            # requests.exceptions.ReadTimeout/ConnectTimeout, openai.error.Timeout, dst.
+            if 'Timeout' in type(e).__name__:
+                self.record(upstream, model, timeout, max_tokens, timed_out=True)
+            else:
+                metrics.incr(f'timeout.{self.key(upstream, model)}.error')
+            raise
+        else:
+            self.record(upstream, model, time.monotonic() - start, max_tokens)
+
+    def get_state(self) -> Dict:
+        """Current timeout per key (at reference token budget)"""
+        with self._lock:
+            keys = list(self._samples)
+        state = {}
+        for key in keys:
+            value = self._compute(key)
+            state[key] = round(value, 2) if value is not None else None
+        return state
+
+
+# Instance global yang dipakai bersama oleh app.py dan bot.py
+timeouts = AdaptiveTimeouts.from_config()
@@ -0,0 +1,327 @@
+import os
+import re
+import glob
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+from config import Config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Span aktif di thread/context saat ini (thread baru mulai tanpa span)
+_current: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class _Trace:
+    """Spans of one request, buffered until the root span ends (tail sampling)"""
+
+    __slots__ = ('trace_id', 'spans', 'sampled', 'error')
+
+    def __init__(self, sampled: bool):
+        self.trace_id = _new_id(128)
+        self.spans: List['Span'] = []
+        self.sampled = sampled
+        self.error = False
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'remote', 'timestamp',
+                 '_started', 'duration', 'tags')
+
+    def __init__(self, trace: _Trace, name: str, parent: Optional['Span'] = None,
+                 kind: Optional[str] = None, remote: Optional[str] = None, tags: Dict = None):
+        self.trace = trace
+        self.span_id = _new_id(64)
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.kind = kind
+        self.remote = remote
+        self.timestamp = time.time()
+        self._started = time.perf_counter()
+        self.duration = 0.0
+        self.tags = {key: str(value) for key, value in (tags or {}).items() if value is not None}
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def tag(self, key: str, value):
+        """Attach a tag (stored as string)"""
+        if value is not None:
+            self.tags[key] = str(value)
+
+    def set_error(self, message: str):
+        """Mark the span (and so the whole trace) as failed"""
+        self.tags['error'] = str(message)[:300]
+        self.trace.error = True
+
+    def to_zipkin(self, service_name: str) -> Dict:
+        """Zipkin v2 JSON span"""
+        span = {
+            'traceId': self.trace.trace_id,
+            'id': self.span_id,
+            'name': self.name,
+            'timestamp': int(self.timestamp * 1_000_000),
+            'duration': max(1, int(self.duration * 1_000_000)),
+            'localEndpoint': {'serviceName': service_name},
+            'tags': self.tags
+        }
+        if self.parent_id:
+            span['parentId'] = self.parent_id
+        if self.kind:
+            span['kind'] = self.kind
+        if self.remote:
+            span['remoteEndpoint'] = {'serviceName': self.remote}
+        return span
+
+
+class _NoopSpan:
+    """Returned when tracing is off or there is no active trace"""
+
+    trace_id = None
+
+    def tag(self, key: str, value):
+        pass
+
+    def set_error(self, message: str):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class TraceLogFilter(logging.Filter):
+    """Add %(trace_id)s to log records ("[<trace id>] " inside a trace, "" otherwise)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = _current.get()
+        record.trace_id = f"[{span.trace_id}] " if span is not None else ""
+        return True
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Tracer:
+    """Lightweight request tracing with tail sampling and a background file exporter.
+
+    Span satu request disimpan di memori sampai root span selesai, lalu trace
+    disimpan jika terpilih sampling (sample_rate), error, atau lebih lambat dari
+    slow_threshold. Export berjalan di thread terpisah ke file JSON lines
+    (satu span Zipkin v2 per baris) yang di-rotate berdasarkan ukuran; jika
+    antrian penuh trace dibuang (tidak pernah memblok request).
+
+    Setiap proses menulis ke filenya sendiri (spans.<pid>.jsonl): rotasi
+    RotatingFileHandler tidak aman jika beberapa worker gunicorn menulis ke
+    file yang sama. File worker yang sudah mati dibatasi backup_count file.
+    """
+
+    def __init__(self, path: str = 'traces/spans.jsonl', sample_rate: float = 0.05,
+                 slow_threshold: float = 8.0, max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5, queue_size: int = 1000, service_name: str = 'whatsapp-bot',
+                 enabled: bool = True, max_spans: int = 256):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue_size = queue_size
+        self.service_name = service_name
+        self.enabled = enabled
+        self.max_spans = max_spans
+
+        self.exported = 0
+        self._queue: Optional[queue.Queue] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Config = None) -> 'Tracer':
+        """Build from Config"""
+        config = config or Config
+        return cls(
+            path=config.TRACE_FILE,
+            sample_rate=config.TRACE_SAMPLE_RATE,
+            slow_threshold=config.TRACE_SLOW_SECONDS,
+            max_bytes=int(config.TRACE_MAX_MB * 1024 * 1024),
+            backup_count=config.TRACE_BACKUP_COUNT,
+            queue_size=config.TRACE_QUEUE_SIZE,
+            service_name=config.TRACE_SERVICE_NAME,
+            enabled=config.TRACING_ENABLED
+        )
+
+    @staticmethod
+    def current_trace_id() -> Optional[str]:
+        """Trace id of the active span, if any"""
+        span = _current.get()
+        return span.trace_id if span is not None else None
+
+    @staticmethod
+    def tag(key: str, value):
+        """Tag the active span (no-op outside a trace)"""
+        span = _current.get()
+        if span is not None:
+            span.tag(key, value)
+
+    @contextmanager
+    def trace(self, name: str, kind: Optional[str] = 'SERVER', **tags):
+        """Start a trace (root span); inside an existing trace this is just a child span"""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        if _current.get() is not None:
+            with self.span(name, **tags) as span:
+                yield span
+            return
+
+        trace = _Trace(random.random() < self.sample_rate)
+        root = Span(trace, name, kind=kind, tags=tags)
+        token = _current.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.set_error(f"{type(e).__name__}: {str(e)}")
+            raise
+        finally:
+            root.duration = time.perf_counter() - root._started
+            _current.reset(token)
+            trace.spans.append(root)
+            self._finish(trace, root)
+
+    @contextmanager
+    def span(self, name: str, kind: Optional[str] = None, remote: Optional[str] = None, **tags):
+        """Child span of the active span (no-op outside a trace)"""
+        parent = _current.get()
+        if parent is None:
+            yield NOOP_SPAN
+            return
+
+        span = Span(parent.trace, name, parent, kind, remote, tags)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(f"{type(e).__name__}: {str(e)}")
+            raise
+        finally:
+            span.duration = time.perf_counter() - span._started
+            _current.reset(token)
+            if len(span.trace.spans) < self.max_spans:
+                span.trace.spans.append(span)
+
+    def _finish(self, trace: _Trace, root: Span):
+        """Keep the trace if sampled, failed or slow"""
+        if trace.error:
+            reason = 'error'
+        elif root.duration >= self.slow_threshold:
+            reason = 'slow'
+        elif trace.sampled:
+            reason = 'sampled'
+        else:
+            metrics.incr('tracing.dropped_unsampled')
+            return
+        root.tag('sampling.reason', reason)
+        metrics.incr(f'tracing.kept.{reason}')
+
+        try:
+            self._exporter().put_nowait(trace.spans)
+        except queue.Full:
+            metrics.incr('tracing.dropped_queue_full')
+
+    def process_path(self, pid: int = None) -> str:
+        """Trace file of one process: <path>.<pid><ext>"""
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.{pid or os.getpid()}{ext}"
+
+    def _prune(self):
+        # Batasi file milik worker yang sudah berhenti (restart/scale down) ke backup_count file terbaru
+        root, ext = os.path.splitext(self.path)
+        pattern = re.compile(re.escape(root) + r'\.(\d+)' + re.escape(ext) + r'(\.\d+)?$')
+        stale = []
+        for path in glob.glob(f"{glob.escape(root)}.*{glob.escape(ext)}*"):
+            match = pattern.match(path)
+            if match and not _pid_alive(int(match.group(1))):
+                stale.append(path)
+        stale.sort(key=lambda path: os.path.getmtime(path), reverse=True)
+        for path in stale[self.backup_count:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _exporter(self) -> queue.Queue:
+        # Thread exporter dibuat per proses saat pertama dipakai (aman untuk fork)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(self.queue_size)
+                threading.Thread(target=self._run, args=(self._queue,), name="trace-exporter",
+                                 daemon=True).start()
+            return self._queue
+
+    def _run(self, spans_queue: queue.Queue):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            self._prune()
+        except OSError as e:
+            logger.warning(f"Error pruning old trace files: {str(e)}")
+        handler = RotatingFileHandler(self.process_path(), maxBytes=self.max_bytes, backupCount=self.backup_count,
+                                      encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+        while True:
+            spans = spans_queue.get()
+            try:
+                for span in spans:
+                    record = logging.makeLogRecord({'msg': json.dumps(span.to_zipkin(self.service_name),
+                                                                      ensure_ascii=False)})
+                    handler.handle(record)
+                self.exported += 1
+            except Exception as e:
+                logger.error(f"Error exporting trace: {str(e)}")
+            finally:
+                spans_queue.task_done()
+
+    def flush(self):
+        """Wait until every queued trace has been written"""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def get_state(self) -> Dict:
+        """Tracer state for status endpoints"""
+        return {
+            'enabled': self.enabled,
+            'path': self.process_path(),
+            'sample_rate': self.sample_rate,
+            'slow_threshold': self.slow_threshold,
+            'exported_traces': self.exported,
+            'queued': self._queue.qsize() if self._queue is not None else 0
+        }
+
+
+# Instance global yang dipakai bersama oleh app.py, bot.py dan pipeline.py
+tracer = Tracer.from_config()